@@ -0,0 +1,3 @@
+"""
+Headless HTTP API for the medical chatbot
+"""
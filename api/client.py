@@ -0,0 +1,267 @@
+"""
+Client for the headless API
+
+RemoteChatService and RemoteDiagnosisService have the same interface as the
+in-process services, so the Streamlit UI can switch to the API by setting
+CHATBOT_API_URL without any other change.
+"""
+import functools
+import io
+import json
+import os
+import threading
+import time
+
+import httpx
+from openai import RateLimitError
+
+from config.settings import Config, WORKSPACE_ROOT
+from services.chat_service import ChatService
+from services.diagnosis_service import DiagnosisService
+from utils.tracing import get_tracer
+
+def _local_paths(image_paths):
+    """Convert project-relative reference image paths from the API to local paths"""
+    if not image_paths:
+        return None
+    return [os.path.join(WORKSPACE_ROOT, *path.split("/")) for path in image_paths]
+
+class APIClient:
+    """Thin HTTP client for the chatbot API"""
+
+    def __init__(self, base_url, timeout=120.0):
+        """
+        Initialize the client
+
+        Args:
+            base_url: Base URL of the API, e.g. http://127.0.0.1:8000
+            timeout: Request timeout in seconds
+        """
+        self._client = httpx.Client(base_url=base_url.rstrip("/"), timeout=timeout)
+        self._health = None
+        self._health_lock = threading.Lock()
+
+    def _raise_for_status(self, response):
+        """Raise on error responses, mapping 429 to the OpenAI rate-limit error"""
+        if response.status_code < 400:
+            return
+        try:
+            body = response.json()
+            message = body.get("error", response.text)
+        except ValueError:
+            body, message = None, response.text
+        if response.status_code == 429:
+            raise RateLimitError(message, response=response, body=body)
+        raise RuntimeError(f"API error {response.status_code}: {message}")
+
+    def post_json(self, path, payload):
+        """
+        POST a JSON payload
+
+        Args:
+            path: Endpoint path
+            payload: JSON-serializable request body
+
+        Returns:
+            Decoded JSON response
+        """
+        response = self._client.post(path, json=payload)
+        self._raise_for_status(response)
+        return response.json()
+
+    def stream_events(self, path, **request_kwargs):
+        """
+        POST a request and iterate over the server-sent events of the response
+
+        Args:
+            path: Endpoint path
+            request_kwargs: Extra arguments for httpx (json, files, ...)
+
+        Yields:
+            Tuple of (event name, decoded data)
+        """
+        headers = {"Accept": "text/event-stream"}
+        with self._client.stream("POST", path, headers=headers, **request_kwargs) as response:
+            if response.status_code >= 400:
+                response.read()
+                self._raise_for_status(response)
+
+            event, data = None, []
+            for line in response.iter_lines():
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data.append(line[len("data:"):].strip())
+                elif not line and event is not None:
+                    yield event, json.loads("\n".join(data)) if data else None
+                    event, data = None, []
+
+    def health(self, max_age=0.0):
+        """
+        Get the API's health status
+
+        Args:
+            max_age: Seconds a previous result (or error) may be reused for,
+                so that callers on every UI rerun do not each hit /health
+
+        Returns:
+            Decoded health response
+        """
+        with self._health_lock:
+            if self._health is not None and time.monotonic() - self._health[0] < max_age:
+                result = self._health[1]
+            else:
+                try:
+                    response = self._client.get("/health")
+                    self._raise_for_status(response)
+                    result = response.json()
+                except Exception as e:
+                    result = e
+                self._health = (time.monotonic(), result)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+class RemoteChatService:
+    """Chat service that answers through the API, with the interface of ChatService"""
+
+    def __init__(self, api_client):
+        """
+        Initialize the service
+
+        Args:
+            api_client: APIClient to send the requests with
+        """
+        self.api = api_client
+
+    prepare_messages_for_api = staticmethod(ChatService.prepare_messages_for_api)
+
+    def generate_response(self, messages, user_query: str = ""):
+        """
+        Generate a response through the API, raising on errors
+
+        Args:
+            messages: List of conversation messages
+            user_query: Current user query for RAG context retrieval
+
+        Returns:
+            Tuple of (response_text, list_of_image_paths_or_None)
+        """
+        try:
+            data = self.api.post_json("/chat", {"messages": messages, "query": user_query})
+        except RateLimitError:
+            ChatService.record_rate_limit()
+            raise
+        return data["response"], _local_paths(data["images"])
+
+    def send_message(self, messages, user_query: str = ""):
+        """
+        Generate a response through the API, returning errors as the response text
+
+        Args:
+            messages: List of conversation messages
+            user_query: Current user query for RAG context retrieval
+
+        Returns:
+            Tuple of (response_text, list_of_image_paths_or_None)
+        """
+        try:
+            with get_tracer().span("chat.send_message"):
+                return self.generate_response(messages, user_query=user_query)
+        except Exception as e:
+            return f"Lỗi khi gọi API: {str(e)}", None
+
+class RemoteDiagnosisService:
+    """Diagnosis service that runs the pipeline through the API, with the interface of DiagnosisService"""
+
+    def __init__(self, api_client):
+        """
+        Initialize the service
+
+        Args:
+            api_client: APIClient to send the requests with
+        """
+        self.api = api_client
+
+    add_diagnosis_to_chat = staticmethod(DiagnosisService.add_diagnosis_to_chat)
+
+    def _diagnose(self, image, image_bytes, progress_callback, partial_callback):
+        """
+        Run the diagnosis through the API, relaying its streamed partial results
+
+        Returns:
+            Tuple of (success, response_message, diagnosis_images, primary_disease)
+        """
+        report_progress = progress_callback or (lambda message: None)
+        report_partial = partial_callback or (lambda **fields: None)
+
+        if image_bytes is None:
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG")
+            image_bytes = buffer.getvalue()
+
+        try:
+            for event, data in self.api.stream_events("/diagnose", files={"image": ("upload", image_bytes)}):
+                if event == "progress":
+                    report_progress(data["message"])
+                elif event == "images":
+                    report_partial(images=_local_paths(data["images"]))
+                elif event in ("predictions", "text"):
+                    report_partial(**data)
+                elif event == "done":
+                    return (data["success"], data["response"], _local_paths(data["images"]),
+                            data.get("primary_disease"))
+        except Exception as e:
+            return False, f"Lỗi khi tạo báo cáo: {str(e)}", None, None
+        return False, "Lỗi khi tạo báo cáo: kết nối tới API bị gián đoạn", None, None
+
+    def process_image_diagnosis(self, image, chat_history, image_bytes=None, progress_callback=None,
+                                partial_callback=None):
+        """
+        Run the diagnosis through the API
+
+        Args:
+            image: PIL Image object
+            chat_history: Current chat history
+            image_bytes: Optional raw uploaded file bytes (sent as is)
+            progress_callback: Optional function called with progress messages
+            partial_callback: Optional function called with partial results
+
+        Returns:
+            Tuple of (success: bool, response_message: str, diagnosis_images: list or None)
+        """
+        return self._diagnose(image, image_bytes, progress_callback, partial_callback)[:3]
+
+    def run_diagnosis_job(self, image, image_bytes=None, progress_callback=None, partial_callback=None):
+        """
+        Run the diagnosis through the API as a background job
+
+        Args:
+            image: PIL Image object, closed once the request is done
+            image_bytes: Optional raw uploaded file bytes (sent as is)
+            progress_callback: Optional function called with progress messages
+            partial_callback: Optional function called with partial results
+
+        Returns:
+            Tuple of (success, response_message, diagnosis_images, primary_disease)
+        """
+        try:
+            with get_tracer().span("diagnosis.job") as span:
+                result = self._diagnose(image, image_bytes, progress_callback, partial_callback)
+                span.set_attribute("success", result[0])
+        finally:
+            image.close()
+        return result
+
+    def is_model_loaded(self):
+        """Check if the API has its vision model loaded"""
+        try:
+            return self.api.health(max_age=Config.API_HEALTH_CACHE_SECONDS)["vision_model_loaded"]
+        except Exception as e:
+            print(f"Error checking API health: {str(e)}")
+            return False
+
+@functools.lru_cache(maxsize=None)
+def get_api_client():
+    """Get the process-wide API client"""
+    return APIClient(Config.API_URL, timeout=Config.API_TIMEOUT)
@@ -0,0 +1,306 @@
+"""
+Headless ASGI API for chat and diagnosis
+
+Exposes the service layer without Streamlit, so other frontends can use the
+bot and the backend can be scaled out as a multi-worker server. The Streamlit
+UI becomes one client of it when CHATBOT_API_URL is set (see api.client).
+
+Run with:
+    python -m api.server --workers 4
+    uvicorn api.server:app --workers 4 --host 0.0.0.0 --port 8000
+
+Endpoints:
+    GET  /health       Liveness, startup status and knowledge base health
+    GET  /ready        Readiness probe: 200 once every resource is initialized
+    GET  /metrics      Prometheus metrics of the worker serving the request
+    POST /chat         {"messages": [...], "query": "..."} -> {"response", "images"}
+    POST /chat/stream  Same request, answer streamed as server-sent events
+    POST /diagnose     Multipart upload with an "image" field -> diagnosis;
+                       streamed as server-sent events if the client accepts
+                       text/event-stream
+
+Reference image paths are returned relative to the project root and are
+served by the API under the same path.
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import queue
+import threading
+
+from openai import RateLimitError
+from PIL import Image
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+
+from config.settings import Config, WORKSPACE_ROOT
+from services.startup import get_startup_orchestrator
+from utils.metrics import CONTENT_TYPE, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+startup = get_startup_orchestrator()
+
+UPLOAD_OVERHEAD_BYTES = 64 * 1024
+
+def _error(status_code, message):
+    """Build a JSON error response"""
+    return JSONResponse({"error": message}, status_code=status_code)
+
+def _sse(event, data):
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _public_paths(image_paths):
+    """Convert absolute reference image paths to project-relative paths"""
+    if not image_paths:
+        return None
+    return [os.path.relpath(path, WORKSPACE_ROOT).replace(os.sep, "/") for path in image_paths]
+
+def _parse_chat_request(body):
+    """
+    Validate a chat request body
+
+    Args:
+        body: Decoded JSON body
+
+    Returns:
+        Tuple of (messages, query); the query defaults to the last user message
+
+    Raises:
+        ValueError: If the body is malformed
+    """
+    messages = body.get("messages") if isinstance(body, dict) else None
+    if not isinstance(messages, list) or not messages:
+        raise ValueError("'messages' must be a non-empty list")
+    for message in messages:
+        if (not isinstance(message, dict) or message.get("role") not in ("user", "assistant")
+                or not isinstance(message.get("content"), str)):
+            raise ValueError("each message needs a 'role' (user or assistant) and a string 'content'")
+
+    query = body.get("query")
+    if query is None:
+        query = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+    if not isinstance(query, str):
+        raise ValueError("'query' must be a string")
+
+    messages = [{"role": m["role"], "content": m["content"]} for m in messages]
+    return messages, query
+
+async def _get_service(name):
+    """
+    Get an initialized service of this worker
+
+    Returns:
+        Tuple of (service, None), or (None, error response) if it is unavailable
+    """
+    try:
+        return await run_in_threadpool(startup.get, name), None
+    except Exception as e:
+        return None, _error(503, str(e))
+
+async def health(request):
+    """Report liveness, per-resource startup status and the knowledge base health of this worker"""
+    rag_service = startup.peek("rag_service")
+    knowledge_base = await run_in_threadpool(rag_service.health_check) if rag_service is not None else None
+    return JSONResponse({
+        "status": "ok",
+        "vision_model_loaded": startup.peek("diagnosis_service") is not None,
+        "startup": startup.readiness(),
+        "knowledge_base": knowledge_base,
+    })
+
+async def ready(request):
+    """Readiness probe: 503 until every resource of this worker is initialized"""
+    readiness = startup.readiness()
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
+async def metrics(request):
+    """Expose this worker's metrics in the Prometheus text format"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+async def chat(request):
+    """Answer a chat turn"""
+    try:
+        messages, query = _parse_chat_request(await request.json())
+    except ValueError as e:
+        return _error(400, str(e))
+
+    service, error = await _get_service("chat_service")
+    if error is not None:
+        return error
+    try:
+        response, images = await run_in_threadpool(service.generate_response, messages, user_query=query)
+    except RateLimitError as e:
+        return _error(429, str(e))
+    except Exception as e:
+        logger.exception("Chat request failed")
+        return _error(502, f"Lỗi khi gọi API: {str(e)}")
+    return JSONResponse({"response": response, "images": _public_paths(images)})
+
+async def chat_stream(request):
+    """
+    Answer a chat turn as server-sent events
+
+    Events: "images" (reference images, sent before the answer), "text" (the
+    answer so far), then "done" with the final answer, or "error".
+    """
+    try:
+        messages, query = _parse_chat_request(await request.json())
+    except ValueError as e:
+        return _error(400, str(e))
+
+    service, error = await _get_service("chat_service")
+    if error is not None:
+        return error
+
+    def events():
+        try:
+            system_prompt, images = service.prepare_system_prompt(query)
+            yield _sse("images", {"images": _public_paths(images)})
+            response = ""
+            for response in service.stream_response(messages, system_prompt):
+                yield _sse("text", {"text": response})
+            yield _sse("done", {"response": response, "images": _public_paths(images)})
+        except RateLimitError as e:
+            yield _sse("error", {"error": str(e), "status": 429})
+        except Exception as e:
+            logger.exception("Chat stream failed")
+            yield _sse("error", {"error": f"Lỗi khi gọi API: {str(e)}", "status": 502})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+async def diagnose(request):
+    """Diagnose an uploaded skin image"""
+    # Reject oversized bodies before they are parsed; the allowance covers
+    # the multipart boundaries and part headers
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > Config.API_MAX_UPLOAD_BYTES + UPLOAD_OVERHEAD_BYTES:
+        return _error(413, "image is too large")
+
+    async with request.form(max_files=1) as form:
+        upload = form.get("image")
+        if upload is None or isinstance(upload, str):
+            return _error(400, "expected a multipart file field named 'image'")
+        # Bodies without a length are spooled to disk by the parser; never
+        # read more than the limit into memory
+        image_bytes = await upload.read(Config.API_MAX_UPLOAD_BYTES + 1)
+
+    if len(image_bytes) > Config.API_MAX_UPLOAD_BYTES:
+        return _error(413, "image is too large")
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        image.load()
+    except Exception:
+        return _error(400, "could not decode the uploaded image")
+
+    service, error = await _get_service("diagnosis_service")
+    if error is not None:
+        return error
+
+    if "text/event-stream" in request.headers.get("accept", ""):
+        return StreamingResponse(_diagnosis_events(service, image, image_bytes), media_type="text/event-stream")
+
+    partial = {}
+    success, response, images, primary_disease = await run_in_threadpool(
+        service.run_diagnosis_job, image, image_bytes=image_bytes,
+        partial_callback=lambda **fields: partial.update(fields)
+    )
+    return JSONResponse({
+        "success": success,
+        "response": response,
+        "images": _public_paths(images),
+        "predictions": partial.get("predictions"),
+        "primary_disease": primary_disease,
+    })
+
+def _diagnosis_events(service, image, image_bytes):
+    """
+    Run the diagnosis pipeline and yield its progress as server-sent events
+
+    Events: "progress", "predictions", "images" and "text" as the pipeline
+    publishes them, then "done" with the final result.
+    """
+    events = queue.Queue()
+
+    def publish(**fields):
+        for name, value in fields.items():
+            if name == "images":
+                events.put(_sse("images", {"images": _public_paths(value)}))
+            else:
+                events.put(_sse(name, {name: value}))
+
+    def run():
+        try:
+            success, response, images, primary_disease = service.run_diagnosis_job(
+                image, image_bytes=image_bytes,
+                progress_callback=lambda message: events.put(_sse("progress", {"message": message})),
+                partial_callback=publish
+            )
+            events.put(_sse("done", {
+                "success": success,
+                "response": response,
+                "images": _public_paths(images),
+                "primary_disease": primary_disease,
+            }))
+        except Exception as e:
+            logger.exception("Diagnosis failed")
+            events.put(_sse("done", {"success": False, "response": f"Lỗi khi tạo báo cáo: {str(e)}",
+                                     "images": None, "primary_disease": None}))
+        finally:
+            events.put(None)
+
+    threading.Thread(target=run, name="api-diagnosis", daemon=True).start()
+    while True:
+        event = events.get()
+        if event is None:
+            return
+        yield event
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # Initialize every resource of this worker concurrently in the background
+    startup.start()
+    yield
+
+def create_app():
+    """Create the ASGI application"""
+    return Starlette(
+        routes=[
+            Route("/health", health, methods=["GET"]),
+            Route("/ready", ready, methods=["GET"]),
+            Route("/metrics", metrics, methods=["GET"]),
+            Route("/chat", chat, methods=["POST"]),
+            Route("/chat/stream", chat_stream, methods=["POST"]),
+            Route("/diagnose", diagnose, methods=["POST"]),
+            Mount(
+                "/database/disease_images",
+                StaticFiles(directory=os.path.join(WORKSPACE_ROOT, "database", "disease_images"), check_dir=False)
+            ),
+        ],
+        lifespan=lifespan
+    )
+
+app = create_app()
+
+def main():
+    """Run the API under uvicorn"""
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=Config.API_HOST)
+    parser.add_argument("--port", type=int, default=Config.API_PORT)
+    parser.add_argument("--workers", type=int, default=Config.API_WORKERS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    uvicorn.run("api.server:app", host=args.host, port=args.port, workers=args.workers)
+
+if __name__ == "__main__":
+    main()
@@ -6,12 +6,18 @@ import streamlit as st
 from PIL import Image
 
 # Import custom modules
+from api.client import RemoteChatService, RemoteDiagnosisService, get_api_client
 from config.settings import Config
-from models.ai_models import ModelManager
-from services.chat_service import ChatService
-from services.diagnosis_service import DiagnosisService
+from models.lazy_loader import get_lazy_model_manager
+from services.job_manager import get_job_manager
+from services.prefetch import get_prefetch_manager
+from services.startup import get_startup_orchestrator
 from ui.components import UIComponents
 from utils.helpers import SessionManager, ErrorHandler
+from utils.image_assets import get_thumbnail_cache
+from utils.metrics import SESSION_ACTIVITY, start_metrics_server
+from utils.token_usage import get_usage_ledger, session_scope
+from utils.tracing import get_tracer
 
 class MedicalChatbot:
     """Main Medical Chatbot Application Class"""
@@ -30,9 +36,17 @@ class MedicalChatbot:
         self.ui_components = UIComponents()
         self.error_handler = ErrorHandler()
         
-        # Initialize services and models
-        self.model_manager = ModelManager()
-        self.chat_service = ChatService()
+        # Initialize services; either use the headless API or the
+        # process-wide in-process services, loading the vision stack lazily
+        self.startup = get_startup_orchestrator()
+        self.model_loader = get_lazy_model_manager()
+        if Config.API_URL:
+            api_client = get_api_client()
+            self.chat_service = RemoteChatService(api_client)
+            self.diagnosis_service = RemoteDiagnosisService(api_client)
+        else:
+            self.chat_service = self.startup.get("chat_service")
+            self.diagnosis_service = None
         
         # Setup
         self._setup_application()
@@ -42,118 +56,264 @@ class MedicalChatbot:
         # Initialize session state
         self.session_manager.initialize_session()
         
-        # Initialize models
-        self.model_manager.initialize_models()
+        # Persist messages added by the previous run and keep the session
+        # within its memory budget
+        self.session_manager.persist_messages()
+        self.session_manager.enforce_memory_budget()
         
-        # Get vision model
-        vision_model = self.model_manager.get_vision_model()
+        # Start pre-generating reference image thumbnails (once per process)
+        get_thumbnail_cache()
         
-        # Initialize diagnosis service
-        self.diagnosis_service = DiagnosisService(vision_model)
+        # Serve Prometheus metrics next to Streamlit (once per process)
+        if Config.METRICS_PORT:
+            start_metrics_server(Config.METRICS_HOST, Config.METRICS_PORT)
+        SESSION_ACTIVITY.touch(self.session_manager.get_session_id())
     
-    def _handle_regular_chat(self):
-        """Handle regular chat interactions with RAG support"""
-        prompt, diagnosis_clicked = self.ui_components.render_chat_input_with_diagnosis()
+    def _get_diagnosis_service(self):
+        """
+        Get the diagnosis service, waiting for the vision stack if needed
         
-        # Handle diagnosis button click
-        if diagnosis_clicked:
-            self.session_manager.set_diagnosis_mode(True)
-            st.rerun()
+        Returns:
+            DiagnosisService or None if the model could not be loaded
+        """
+        if self.diagnosis_service is None:
+            with st.spinner("Đang tải model chẩn đoán..."):
+                try:
+                    self.diagnosis_service = self.startup.get("diagnosis_service")
+                except RuntimeError as e:
+                    print(f"Error loading diagnosis service: {str(e)}")
+                    return None
+        return self.diagnosis_service
+    
+    @staticmethod
+    def _quick_question(disease):
+        """Get the quick follow-up question offered after a diagnosis"""
+        return f"cho tôi thông tin bệnh {disease}"
+    
+    def _prefetch_quick_question(self, disease):
+        """
+        Start generating the quick question's answer in the background
         
-        if prompt:
+        Args:
+            disease: Primary disease of the diagnosis just added to the chat
+        """
+        question = self._quick_question(disease)
+        messages = self.session_manager.get_messages() + [{"role": "user", "content": question}]
+        get_prefetch_manager().start(
+            self.session_manager.get_session_id(), question,
+            self.chat_service.generate_response,
+            self.chat_service.prepare_messages_for_api(messages), user_query=question
+        )
+    
+    def _respond_to_prompt(self, prompt, container, spinner_text="Đang suy nghĩ...", use_prefetch=False):
+        """
+        Add a user prompt to the chat and render the assistant's answer
+        
+        Args:
+            prompt: User message text
+            container: Container below the chat history that new turns are written to
+            spinner_text: Text shown while waiting for the answer
+            use_prefetch: Serve a prefetched answer for this prompt if there is one
+        """
+        tracer = get_tracer()
+        prefetch_manager = get_prefetch_manager()
+        session_id = self.session_manager.get_session_id()
+        
+        with tracer.span("ui.chat_turn", session_id=session_id) as turn_span, session_scope(session_id):
             # Add user message
-            self.session_manager.add_message("user", prompt)
+            self._add_live_message("user", prompt)
             
             # Display user message
-            with st.chat_message("user"):
+            with container.chat_message("user"):
                 st.markdown(prompt)
             
             # Get response from GPT-OSS with RAG enhancement
-            with st.chat_message("assistant"):
-                with st.spinner("Đang suy nghĩ..."):
-                    messages = self.session_manager.get_messages()
-                    api_messages = self.chat_service.prepare_messages_for_api(messages)
-                    # Pass the user query for RAG context retrieval
-                    response, relevant_images = self.chat_service.send_message(api_messages, user_query=prompt)
+            with container.chat_message("assistant"):
+                with st.spinner(spinner_text):
+                    prefetched = None
+                    if use_prefetch:
+                        with tracer.span("ui.prefetch_claim"):
+                            prefetched = prefetch_manager.claim(
+                                session_id, prompt, timeout=Config.PREFETCH_CLAIM_TIMEOUT
+                            )
+                    else:
+                        # The user went another way; don't keep the speculative answer
+                        prefetch_manager.discard(session_id)
+                    turn_span.set_attribute("prefetched", prefetched is not None)
                     
-                    # Display relevant disease images first if available
-                    if relevant_images:
-                        st.markdown("**Hình ảnh minh họa:**")
-                        self.ui_components.render_disease_images(relevant_images)
+                    if prefetched is not None:
+                        response, relevant_images = prefetched
+                    else:
+                        messages = self.session_manager.get_messages()
+                        api_messages = self.chat_service.prepare_messages_for_api(messages)
+                        # Pass the user query for RAG context retrieval
+                        response, relevant_images = self.chat_service.send_message(api_messages, user_query=prompt)
                     
-                    # Display text response
-                    st.markdown(response)
+                    with tracer.span("ui.render"):
+                        # Display relevant disease images first if available
+                        if relevant_images:
+                            st.markdown("**Hình ảnh minh họa:**")
+                            self.ui_components.render_disease_images(relevant_images)
+                        
+                        # Display text response
+                        st.markdown(response)
                     
                     # Add assistant response to history
-                    self.session_manager.add_message("assistant", response)
+                    self._add_live_message("assistant", response, images=relevant_images)
+            
+            # Full reruns are rare now, so keep the budget in check per turn
+            self.session_manager.enforce_memory_budget()
     
-    def _handle_diagnosis_mode(self):
-        """Handle diagnosis mode interactions"""
-        vision_model = self.model_manager.get_vision_model()
+    def _add_live_message(self, role, content, images=None):
+        """Add a message to the chat history and to the turns shown since the last full run"""
+        self.session_manager.add_message(role, content, images=images)
+        st.session_state.live_messages.append(self.session_manager.get_messages()[-1])
+    
+    @st.fragment
+    def _handle_regular_chat(self, live_container):
+        """
+        Handle regular chat interactions with RAG support
         
-        if not vision_model.is_loaded():
-            self.error_handler.display_error(Config.MODEL_LOAD_ERROR)
-            self.session_manager.set_diagnosis_mode(False)
-            return
+        Runs as a fragment: submitting a message reruns only this function,
+        and the new turn is written to live_container (created outside the
+        fragment), so the chat history is not re-executed or re-sent.
+        
+        Streamlit clears what a fragment wrote outside itself on every
+        fragment rerun, and only lets it write there at all if it already did
+        during the full run. So every run claims the slot and redraws the
+        turns added since the last full run before handling the new one.
+        
+        Args:
+            live_container: Container below the chat history for new turns
+        """
+        live = live_container.container()
+        with live:
+            self.ui_components.render_chat_history(st.session_state.live_messages)
+        
+        # Offer the quick follow-up question after a diagnosis
+        quick_question_disease = st.session_state.quick_question_disease
+        if quick_question_disease:
+            popup = st.empty()
+            with popup.container():
+                question_clicked = self.ui_components.render_quick_question_popup(quick_question_disease)
+            if question_clicked:
+                popup.empty()
+                st.session_state.quick_question_disease = None
+                self._respond_to_prompt(
+                    self._quick_question(quick_question_disease), live, "Đang tìm thông tin...",
+                    use_prefetch=True
+                )
+        
+        prompt, diagnosis_clicked = self.ui_components.render_chat_input_with_diagnosis()
+        
+        # Handle diagnosis button click
+        if diagnosis_clicked:
+            self.session_manager.set_diagnosis_mode(True)
+            st.rerun()
+        
+        if prompt:
+            st.session_state.quick_question_disease = None
+            self._respond_to_prompt(prompt, live)
+    
+    @st.fragment
+    def _handle_diagnosis_mode(self):
+        """Handle diagnosis mode interactions (runs as a fragment)"""
+        if self.diagnosis_service is None:
+            # Load the vision stack while the user picks an image
+            self.model_loader.on_diagnosis_intent()
         
         # Show file uploader
         uploaded_file = self.ui_components.render_file_uploader()
         
         if uploaded_file is not None:
-            image = Image.open(uploaded_file)
-            
-            # Add user message to chat
-            self.diagnosis_service.add_diagnosis_to_chat(image, self.session_manager.get_messages())
+            diagnosis_service = self._get_diagnosis_service()
+            if diagnosis_service is None:
+                self.error_handler.display_error(Config.MODEL_LOAD_ERROR)
+                self.session_manager.set_diagnosis_mode(False)
+                return
             
-            # Process diagnosis
-            with st.spinner("Đang phân tích ảnh..."):
-                success, response_message, diagnosis_images = self.diagnosis_service.process_image_diagnosis(
-                    image, self.session_manager.get_messages()
+            session_id = self.session_manager.get_session_id()
+            with get_tracer().span("ui.diagnosis_submit", session_id=session_id):
+                image_bytes = uploaded_file.getvalue()
+                image = Image.open(uploaded_file)
+                
+                # Add user message to chat (stored as a compact thumbnail)
+                diagnosis_service.add_diagnosis_to_chat(
+                    image, self.session_manager.get_messages(), image_bytes=image_bytes
                 )
                 
-                if success:
-                    # Display results in chat and get primary disease name
-                    primary_disease = self.diagnosis_service.display_diagnosis_in_chat(
-                        image, response_message, self.session_manager.get_messages(), diagnosis_images
-                    )
-                    
-                    # Show quick question popup if a disease was identified
-                    if primary_disease:
-                        question_clicked = self.ui_components.render_quick_question_popup(primary_disease)
-                        
-                        if question_clicked:
-                            # Add the quick question to chat and process it
-                            quick_question = f"cho tôi thông tin bệnh {primary_disease}"
-                            self.session_manager.add_message("user", quick_question)
-                            
-                            # Process the quick question immediately
-                            with st.chat_message("user"):
-                                st.markdown(quick_question)
-                            
-                            with st.chat_message("assistant"):
-                                with st.spinner("Đang tìm thông tin..."):
-                                    messages = self.session_manager.get_messages()
-                                    api_messages = self.chat_service.prepare_messages_for_api(messages)
-                                    response, relevant_images = self.chat_service.send_message(api_messages, user_query=quick_question)
-                                    
-                                    # Display relevant disease images first if available
-                                    if relevant_images:
-                                        st.markdown("**Hình ảnh minh họa:**")
-                                        self.ui_components.render_disease_images(relevant_images)
-                                    
-                                    # Display text response
-                                    st.markdown(response)
-                                    
-                                    # Add assistant response to history
-                                    self.session_manager.add_message("assistant", response)
-                else:
-                    self.error_handler.display_error(response_message)
-                    self.session_manager.add_message("assistant", response_message)
+                # Run the pipeline in the background and poll for the result;
+                # its spans are added to this trace as they finish
+                st.session_state.diagnosis_job_id = get_job_manager().submit(
+                    diagnosis_service.run_diagnosis_job, image, image_bytes=image_bytes,
+                    session_id=session_id
+                )
+            st.session_state.quick_question_disease = None
+            get_prefetch_manager().discard(session_id)
             
             # Return to chat mode
+            self.session_manager.persist_messages()
             self.session_manager.set_diagnosis_mode(False)
             st.rerun()
     
+    @st.fragment(run_every=Config.DIAGNOSIS_POLL_INTERVAL)
+    def _render_diagnosis_job(self):
+        """Poll the background diagnosis job and show its progress or result"""
+        job_manager = get_job_manager()
+        job_id = st.session_state.diagnosis_job_id
+        job = job_manager.get(job_id) if job_id else None
+        
+        if job is None:
+            # Unknown or expired job
+            st.session_state.diagnosis_job_id = None
+            return
+        
+        if not job.is_finished():
+            partial = job.partial
+            with st.chat_message("assistant"):
+                # Predictions and reference images are shown as soon as
+                # inference finishes, then the explanation streams in
+                if partial.get("predictions"):
+                    self.ui_components.render_prediction_summary(partial["predictions"])
+                if partial.get("images"):
+                    st.markdown("**Hình ảnh minh họa bệnh tương tự:**")
+                    self.ui_components.render_disease_images(partial["images"])
+                if partial.get("text"):
+                    st.markdown(partial["text"] + " ▌")
+                else:
+                    st.markdown(f"⏳ {job.progress}")
+            return
+        
+        # Move the result into chat history, then rerun the whole app
+        st.session_state.diagnosis_job_id = None
+        job_manager.discard(job_id)
+        
+        if job.status == job.DONE:
+            success, response_message, diagnosis_images, primary_disease = job.result
+        else:
+            success, response_message, diagnosis_images, primary_disease = (
+                False, f"Lỗi khi tạo báo cáo: {job.error}", None, None
+            )
+        
+        if success:
+            self.session_manager.add_message("assistant", response_message, images=diagnosis_images)
+            st.session_state.quick_question_disease = primary_disease
+            if primary_disease:
+                self._prefetch_quick_question(primary_disease)
+        else:
+            self.session_manager.add_message("assistant", response_message)
+        st.rerun()
+    
+    @st.fragment(run_every=Config.TRACE_PANEL_REFRESH_INTERVAL)
+    def _render_trace_panel(self):
+        """Show the span waterfall and token usage of this session (debug panel)"""
+        session_id = self.session_manager.get_session_id()
+        trace = get_tracer().last_trace(session_id=session_id)
+        self.ui_components.render_trace_waterfall(trace)
+        self.ui_components.render_token_usage(
+            get_usage_ledger().session_totals(session_id), get_usage_ledger().recent(limit=1, session_id=session_id)
+        )
+    
     def run(self):
         """Main application loop"""
         # Render custom CSS
@@ -164,20 +324,50 @@ class MedicalChatbot:
         
         st.markdown("---")
         
+        # Page older messages back in from disk on request
+        if self.ui_components.render_load_older_button(self.session_manager.get_spilled_page_count()):
+            self.session_manager.load_older_messages()
+            st.rerun()
+        
         # Render chat history
         messages = self.session_manager.get_messages()
         self.ui_components.render_chat_history(messages)
         
+        # New turns are written here by the chat fragment until the next full run
+        live_container = st.container()
+        st.session_state.live_messages = []
+        
+        # Show progress of a running diagnosis job
+        if st.session_state.diagnosis_job_id:
+            self._render_diagnosis_job()
+        
         # Handle different modes
         if self.session_manager.get_diagnosis_mode():
             self._handle_diagnosis_mode()
         else:
-            self._handle_regular_chat()
+            self._handle_regular_chat(live_container)
+        
+        if Config.TRACE_DEBUG_PANEL:
+            with st.sidebar:
+                self._render_trace_panel()
+        
+        # Render sidebar (model status is None while the vision stack is loading)
+        if Config.API_URL:
+            self.ui_components.render_sidebar(self.diagnosis_service.is_model_loaded())
+            return
+        
+        model_manager = self.model_loader.get_model_manager()
+        if model_manager is not None:
+            vision_model = model_manager.get_vision_model()
+            self.ui_components.render_sidebar(vision_model.is_loaded(), vision_model.get_cache_stats())
+        elif self.model_loader.is_deferred():
+            self.ui_components.render_sidebar(None, deferred=True)
+        else:
+            self.ui_components.render_sidebar(None if not self.model_loader.is_ready() else False)
         
-        # Render sidebar
-        vision_model = self.model_manager.get_vision_model()
-        model_status = vision_model.is_loaded()
-        self.ui_components.render_sidebar(model_status)
+        # Preload the vision stack in the background once the page is rendered,
+        # if configured to; otherwise it starts when diagnosis mode is opened
+        self.model_loader.on_page_rendered()
 
 def main():
     """Application entry point"""
@@ -0,0 +1,6 @@
+"""
+Benchmarks for the medical chatbot
+
+Run them against a local OpenAI-compatible stub (benchmarks.stub_llm) so
+results measure this code base rather than the upstream model provider.
+"""
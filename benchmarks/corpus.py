@@ -0,0 +1,59 @@
+"""
+Query corpus replayed by the benchmarks
+
+One list per flow; the diagnosis flow replays the reference images.
+"""
+import os
+
+from config.settings import WORKSPACE_ROOT
+
+DISEASE_QUERIES = [
+    "Cho tôi thông tin về melanoma",
+    "Melanoma có nguy hiểm không?",
+    "Triệu chứng của bệnh vẩy nến là gì?",
+    "Chốc lở có lây không?",
+    "Cách điều trị nấm da như thế nào?",
+    "Bệnh zona thần kinh có nguy hiểm không?",
+    "Nguyên nhân gây ra bệnh chàm?",
+    "Mụn rộp môi điều trị bằng thuốc gì?",
+]
+
+HOSPITAL_QUERIES = [
+    "Tìm cơ sở da liễu ở quận Long Biên",
+    "Phòng khám da liễu tại quận Cầu Giấy",
+    "Bệnh viện da liễu ở quận Đống Đa",
+    "Cơ sở chữa trị da liễu tại Hoàn Kiếm",
+    "Phòng khám da liễu quận Tây Hồ",
+    "Bệnh viện da liễu Thanh Xuân",
+]
+
+SMALL_TALK_QUERIES = [
+    "Xin chào",
+    "Cảm ơn bạn nhiều",
+    "Bạn là ai?",
+    "Hôm nay trời đẹp quá",
+    "Tạm biệt nhé",
+]
+
+CHAT_FLOWS = {
+    "disease": DISEASE_QUERIES,
+    "hospital": HOSPITAL_QUERIES,
+    "small_talk": SMALL_TALK_QUERIES,
+}
+
+def diagnosis_images(limit=None):
+    """
+    Get the images replayed by the diagnosis flow
+
+    Args:
+        limit: Maximum number of images (default: all)
+
+    Returns:
+        Sorted list of image paths
+    """
+    directory = os.path.join(WORKSPACE_ROOT, "database", "disease_images")
+    paths = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith((".jpg", ".jpeg", ".png"))
+    )
+    return paths[:limit] if limit else paths
@@ -0,0 +1,365 @@
+"""
+End-to-end latency benchmark
+
+Replays the query corpus of the disease, hospital, small-talk and diagnosis
+flows through ChatService and DiagnosisService against the local stub LLM,
+and reports p50/p95/p99 per stage plus throughput for each number of
+concurrent sessions as JSON:
+
+    python -m benchmarks.e2e --sessions 1 4 8 --output before.json
+    python -m benchmarks.e2e --sessions 1 4 8 --baseline before.json
+
+Chat turns take the Streamlit UI's path by default: one non-streaming
+completion, as send_message makes it, so only its total is timed. With
+--chat-path stream they take the API's /chat/stream path instead, which
+streams the answer and is broken down into stages.
+
+Stages (milliseconds):
+    chat flows:  total; with --chat-path stream also retrieval (system
+                 prompt with RAG context), first_token and generation
+                 (request to last token)
+    diagnosis:   predict (inference and reference images), retrieval,
+                 first_token, generation, total
+
+Each session keeps its own conversation history, like a browser tab. The
+default NumPy vector store leaves the checked-in Chroma database untouched;
+with VECTOR_BACKEND=chroma run with CHROMA_MODE=snapshot (or http).
+"""
+import argparse
+import itertools
+import json
+import logging
+import platform
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from benchmarks.corpus import CHAT_FLOWS, diagnosis_images
+from benchmarks.stats import percentiles
+from benchmarks.stub_llm import StubLLMServer
+from config.settings import Config
+
+STAGES = {
+    "chat": ("retrieval", "first_token", "generation", "total"),
+    "diagnosis": ("predict", "retrieval", "first_token", "generation", "total"),
+}
+
+def run_chat_turn(chat_service, history, query, streaming=False):
+    """
+    Run one chat turn
+
+    Args:
+        chat_service: ChatService
+        history: Conversation history of the session (extended in place)
+        query: User message
+        streaming: Stream the answer like the API's /chat/stream instead of
+            making the UI's single completion
+
+    Returns:
+        Dictionary of stage durations in seconds
+    """
+    if not streaming:
+        return _run_ui_chat_turn(chat_service, history, query)
+
+    started = time.perf_counter()
+    system_prompt, _ = chat_service.prepare_system_prompt(query)
+    requested = time.perf_counter()
+
+    messages = history + [{"role": "user", "content": query}]
+    first_token = None
+    response = ""
+    for response in chat_service.stream_response(messages, system_prompt):
+        if first_token is None:
+            first_token = time.perf_counter()
+    finished = time.perf_counter()
+
+    history.extend([{"role": "user", "content": query}, {"role": "assistant", "content": response}])
+    return {
+        "retrieval": requested - started,
+        "first_token": (first_token or finished) - requested,
+        "generation": finished - requested,
+        "total": finished - started,
+    }
+
+def _run_ui_chat_turn(chat_service, history, query):
+    """
+    Run one chat turn like the UI's send_message, raising on errors instead
+    of answering with the error text so that they are counted
+    """
+    messages = chat_service.prepare_messages_for_api(history + [{"role": "user", "content": query}])
+    started = time.perf_counter()
+    response, _ = chat_service.generate_response(messages, user_query=query)
+    finished = time.perf_counter()
+
+    history.extend([{"role": "user", "content": query}, {"role": "assistant", "content": response}])
+    return {"total": finished - started}
+
+def run_diagnosis_turn(diagnosis_service, image_path):
+    """
+    Run one diagnosis through the pipelined workflow
+
+    Args:
+        diagnosis_service: DiagnosisService
+        image_path: Image to diagnose
+
+    Returns:
+        Dictionary of stage durations in seconds
+
+    Raises:
+        RuntimeError: If the diagnosis failed
+    """
+    return run_diagnosis(diagnosis_service, image_path)[0]
+
+def run_diagnosis(diagnosis_service, image_path):
+    """
+    Run one diagnosis like run_diagnosis_turn, also returning its result
+
+    Stage boundaries are taken from the pipeline's own progress and partial
+    result callbacks.
+
+    Args:
+        diagnosis_service: DiagnosisService
+        image_path: Image to diagnose
+
+    Returns:
+        Tuple of (stage durations in seconds, response text, primary disease)
+
+    Raises:
+        RuntimeError: If the diagnosis failed
+    """
+    marks = {}
+
+    def progress(message):
+        marks.setdefault(message, time.perf_counter())
+
+    def partial(**fields):
+        for name in fields:
+            marks.setdefault(name, time.perf_counter())
+
+    with open(image_path, 'rb') as f:
+        image_bytes = f.read()
+    image = Image.open(image_path)
+    image.load()
+
+    started = time.perf_counter()
+    success, response, _, primary_disease = diagnosis_service.run_diagnosis_job(
+        image, image_bytes=image_bytes, progress_callback=progress, partial_callback=partial
+    )
+    finished = time.perf_counter()
+    if not success:
+        raise RuntimeError(response)
+
+    retrieving = marks.get("Đang tra cứu thông tin...", marks.get("predictions", started))
+    requested = marks.get("Đang tạo báo cáo...", retrieving)
+    return {
+        "predict": retrieving - started,
+        "retrieval": requested - retrieving,
+        "first_token": marks.get("text", finished) - requested,
+        "generation": finished - requested,
+        "total": finished - started,
+    }, response, primary_disease
+
+def _session_turns(flows, session_index, turns):
+    """Interleave the flows' corpora for one session, offset per session"""
+    corpora = []
+    for flow in flows:
+        items = diagnosis_images() if flow == "diagnosis" else CHAT_FLOWS[flow]
+        corpora.append([(flow, item) for item in items])
+    mixed = [turn for group in itertools.zip_longest(*corpora) for turn in group if turn is not None]
+    offset = session_index * 3
+    return [mixed[(offset + i) % len(mixed)] for i in range(turns)]
+
+def run_load(services, flows, sessions, turns, streaming=False):
+    """
+    Replay the corpus with concurrent sessions
+
+    Args:
+        services: Dictionary with "chat" and, for the diagnosis flow, "diagnosis"
+        flows: Flows to replay
+        sessions: Number of concurrent sessions
+        turns: Turns per session
+        streaming: Stream chat answers (see run_chat_turn)
+
+    Returns:
+        Dictionary with throughput, errors and per-flow stage percentiles
+    """
+    samples = {flow: {} for flow in flows}
+    errors = {}
+    lock = threading.Lock()
+
+    def run_session(index):
+        history = []
+        for flow, item in _session_turns(flows, index, turns):
+            try:
+                if flow == "diagnosis":
+                    stages = run_diagnosis_turn(services["diagnosis"], item)
+                else:
+                    stages = run_chat_turn(services["chat"], history, item, streaming=streaming)
+            except Exception as e:
+                with lock:
+                    errors[str(e)[:200]] = errors.get(str(e)[:200], 0) + 1
+                continue
+            with lock:
+                for stage, seconds in stages.items():
+                    samples[flow].setdefault(stage, []).append(seconds)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions, thread_name_prefix="bench-session") as executor:
+        list(executor.map(run_session, range(sessions)))
+    wall = time.perf_counter() - started
+
+    completed = sum(len(stages.get("total", [])) for stages in samples.values())
+    return {
+        "sessions": sessions,
+        "turns": completed,
+        "errors": errors,
+        "wall_seconds": round(wall, 3),
+        "throughput_turns_per_second": round(completed / wall, 3) if wall else None,
+        "flows": {
+            flow: {
+                stage: percentiles(stages.get(stage, []))
+                for stage in STAGES["diagnosis" if flow == "diagnosis" else "chat"]
+            }
+            for flow, stages in samples.items()
+        },
+    }
+
+def build_services(flows, prediction_cache=False):
+    """
+    Build the services the way the app's startup does
+
+    Args:
+        flows: Flows to benchmark; the vision model is only loaded for "diagnosis"
+        prediction_cache: Keep the prediction cache, so replayed images skip
+            inference after their first diagnosis
+
+    Returns:
+        Tuple of (services dictionary, dictionary of skipped flows to the reason)
+    """
+    from services.chat_service import ChatService
+    from services.rag_service import RAGService
+
+    rag_service = RAGService()
+    rag_service.warm_up()
+    services = {"chat": ChatService(rag_service=rag_service)}
+    skipped = {}
+
+    if "diagnosis" in flows:
+        from models.ai_models import ModelManager
+        from models.prediction_cache import PredictionCache
+        from services.diagnosis_service import DiagnosisService
+
+        model_manager = ModelManager()
+        model_manager.initialize_models()
+        vision_model = model_manager.get_vision_model()
+        if not prediction_cache:
+            vision_model.prediction_cache = PredictionCache(max_entries=0)
+        if vision_model.is_loaded():
+            services["diagnosis"] = DiagnosisService(
+                vision_model, reference_index=model_manager.get_reference_index(),
+                chat_service=services["chat"]
+            )
+        else:
+            skipped["diagnosis"] = Config.MODEL_LOAD_ERROR
+    return services, skipped
+
+def compare(baseline, current):
+    """
+    Format the p50/p95 change of every stage against a baseline result
+
+    Args:
+        baseline: Result of an earlier run
+        current: Result of this run
+
+    Returns:
+        Printable report
+    """
+    lines = []
+    previous_runs = {run["sessions"]: run for run in baseline["runs"]}
+    for run in current["runs"]:
+        previous = previous_runs.get(run["sessions"])
+        if previous is None:
+            continue
+        lines.append(f"{run['sessions']} sessions: throughput "
+                     f"{previous['throughput_turns_per_second']} -> {run['throughput_turns_per_second']} turns/s")
+        for flow, stages in run["flows"].items():
+            for stage, stats in stages.items():
+                old = previous["flows"].get(flow, {}).get(stage, {})
+                if not stats.get("count") or not old.get("count"):
+                    continue
+                change = (stats["p95"] - old["p95"]) / old["p95"] * 100 if old["p95"] else 0.0
+                lines.append(f"  {flow:<10} {stage:<12} p50 {old['p50']:>9} -> {stats['p50']:>9} ms"
+                             f"   p95 {old['p95']:>9} -> {stats['p95']:>9} ms ({change:+.1f}%)")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--flows", nargs="+", default=["disease", "hospital", "small_talk", "diagnosis"],
+                        choices=["disease", "hospital", "small_talk", "diagnosis"])
+    parser.add_argument("--sessions", nargs="+", type=int, default=[1, 4],
+                        help="Concurrent session counts to measure")
+    parser.add_argument("--turns", type=int, default=12, help="Turns per session")
+    parser.add_argument("--warmup-turns", type=int, default=4, help="Untimed turns before measuring")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub time to first token (seconds)")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Stub token rate")
+    parser.add_argument("--response-tokens", type=int, default=120, help="Tokens per stub answer")
+    parser.add_argument("--chat-path", choices=["ui", "stream"], default="ui",
+                        help="Time chat turns as the UI makes them or as the API's /chat/stream does")
+    parser.add_argument("--prediction-cache", action="store_true",
+                        help="Let repeated diagnosis images hit the prediction cache")
+    parser.add_argument("--output", help="Write the JSON result to this file instead of stdout")
+    parser.add_argument("--baseline", help="Earlier JSON result to compare against")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    stub = StubLLMServer(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                         response_tokens=args.response_tokens).start()
+    # Services read the endpoint when they are built
+    Config.OPENROUTER_URL = stub.url
+
+    setup_started = time.perf_counter()
+    services, skipped = build_services(args.flows, prediction_cache=args.prediction_cache)
+    setup_seconds = time.perf_counter() - setup_started
+    flows = [flow for flow in args.flows if flow not in skipped]
+    for flow, reason in skipped.items():
+        print(f"Skipping {flow}: {reason}", file=sys.stderr)
+
+    streaming = args.chat_path == "stream"
+    if args.warmup_turns:
+        run_load(services, flows, 1, args.warmup_turns, streaming=streaming)
+
+    result = {
+        "config": {
+            "flows": flows,
+            "skipped": skipped,
+            "turns_per_session": args.turns,
+            "chat_path": args.chat_path,
+            "stub": {"latency": args.latency, "tokens_per_second": args.tokens_per_second,
+                     "response_tokens": args.response_tokens},
+            "prediction_cache": args.prediction_cache,
+            "vector_backend": services["chat"].rag_service.vector_backend,
+            "chroma_mode": Config.CHROMA_MODE,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+        },
+        "setup_seconds": round(setup_seconds, 3),
+        "runs": [run_load(services, flows, sessions, args.turns, streaming=streaming) for sessions in args.sessions],
+    }
+    stub.stop()
+
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            print(compare(json.load(f), result), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""
+Concurrent multi-user load generator
+
+Simulated users run scripted visits against the real ChatService,
+RAGService and DiagnosisService objects of one process, with the LLM
+replaced by the local stub, while the number of concurrent users ramps up.
+Each user picks a script, runs its steps with think time in between, and
+starts over until the level's duration is up:
+
+    diagnosis   upload an image, read the report while the quick question
+                ("cho tôi thông tin bệnh ...") is prefetched, click it,
+                then ask a free question
+    district    look up clinics in a district, then ask about a disease
+    chat        free chat: small talk and disease questions
+
+For every level it reports throughput, latency percentiles per step,
+errors, the prefetch hit rate and CPU utilization (process CPU time over
+wall time; staying near 1.0 while latency grows points at the GIL):
+
+    python -m benchmarks.load --users 1 4 8 16 --duration 30
+
+Shared objects are shared as in the app: one RAGService (vector store and
+embedder), one vision model (torch threads) and one prefetch manager. With
+VECTOR_BACKEND=chroma, run with CHROMA_MODE=snapshot (or http) to leave the
+checked-in Chroma database untouched.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.corpus import DISEASE_QUERIES, HOSPITAL_QUERIES, SMALL_TALK_QUERIES, diagnosis_images
+from benchmarks.e2e import build_services, run_chat_turn, run_diagnosis
+from benchmarks.stats import percentiles
+from benchmarks.stub_llm import StubLLMServer
+from config.settings import Config
+from services.prefetch import PrefetchManager
+from utils.token_usage import session_scope
+
+SCRIPTS = {
+    "diagnosis": ("diagnosis", "quick_question", "free_chat"),
+    "district": ("district_lookup", "free_chat"),
+    "chat": ("free_chat", "free_chat", "free_chat"),
+}
+
+STEPS = ("diagnosis", "quick_question", "district_lookup", "free_chat")
+
+# Stub answers name no disease, so the follow-up asks about this one instead
+FALLBACK_DISEASE = "Psoriasis"
+
+def follow_up_question(disease):
+    """Get the quick follow-up question the app offers after a diagnosis"""
+    return f"cho tôi thông tin bệnh {disease}"
+
+class User:
+    """One simulated user with its own conversation"""
+
+    def __init__(self, user_id, services, prefetch_manager, rng, think_time):
+        """
+        Initialize the user
+
+        Args:
+            user_id: Session identifier of the user
+            services: Dictionary with "chat" and optionally "diagnosis"
+            prefetch_manager: Prefetch manager shared by all users
+            rng: random.Random of this user
+            think_time: Mean seconds between steps
+        """
+        self.user_id = user_id
+        self.services = services
+        self.prefetch_manager = prefetch_manager
+        self.rng = rng
+        self.think_time = think_time
+        self.history = []
+        self.primary_disease = None
+
+    def think(self):
+        """Pause like a user reading the answer"""
+        if self.think_time:
+            time.sleep(self.rng.uniform(0.5, 1.5) * self.think_time)
+
+    def run_script(self, script, record):
+        """
+        Run the steps of a script, starting a new conversation
+
+        Args:
+            script: Script name from SCRIPTS
+            record: Function called with (step, stage durations or None, error or None, extra)
+        """
+        self.history = []
+        self.primary_disease = None
+        with session_scope(self.user_id):
+            for step in SCRIPTS[script]:
+                try:
+                    stages, extra = getattr(self, step)()
+                    record(step, stages, None, extra)
+                except Exception as e:
+                    record(step, None, f"{type(e).__name__}: {str(e)[:160]}", {})
+                    return
+                self.think()
+
+    def diagnosis(self):
+        path = self.rng.choice(diagnosis_images())
+        stages, response, primary_disease = run_diagnosis(self.services["diagnosis"], path)
+        self.primary_disease = primary_disease or FALLBACK_DISEASE
+        self.history.extend([
+            {"role": "user", "content": Config.DIAGNOSIS_USER_MESSAGE},
+            {"role": "assistant", "content": response},
+        ])
+        # The app prefetches the quick question while the user reads the report
+        question = follow_up_question(self.primary_disease)
+        self.prefetch_manager.start(
+            self.user_id, question, self.services["chat"].generate_response,
+            self.services["chat"].prepare_messages_for_api(self.history + [{"role": "user", "content": question}]),
+            user_query=question
+        )
+        return stages, {}
+
+    def quick_question(self):
+        if not self.primary_disease:
+            return self.free_chat()
+        question = follow_up_question(self.primary_disease)
+        started = time.perf_counter()
+        prefetched = self.prefetch_manager.claim(self.user_id, question, timeout=Config.PREFETCH_CLAIM_TIMEOUT)
+        if prefetched is None:
+            return run_chat_turn(self.services["chat"], self.history, question), {"prefetched": False}
+        self.history.extend([{"role": "user", "content": question},
+                             {"role": "assistant", "content": prefetched[0]}])
+        return {"total": time.perf_counter() - started}, {"prefetched": True}
+
+    def district_lookup(self):
+        return run_chat_turn(self.services["chat"], self.history, self.rng.choice(HOSPITAL_QUERIES)), {}
+
+    def free_chat(self):
+        query = self.rng.choice(DISEASE_QUERIES + SMALL_TALK_QUERIES)
+        return run_chat_turn(self.services["chat"], self.history, query), {}
+
+def run_level(services, users, duration, scripts, think_time=0.5, seed=0):
+    """
+    Run one concurrency level
+
+    Args:
+        services: Dictionary with "chat" and optionally "diagnosis"
+        users: Number of concurrent users
+        duration: Seconds after which users stop starting new scripts
+        scripts: Dictionary of script names to weights
+        think_time: Mean seconds between steps
+        seed: Random seed (each user gets seed + its index)
+
+    Returns:
+        Result dictionary with throughput, errors, prefetch hits and per-step percentiles
+    """
+    prefetch_manager = PrefetchManager(
+        max_workers=Config.PREFETCH_MAX_WORKERS,
+        max_in_flight=Config.PREFETCH_MAX_IN_FLIGHT,
+        ttl=Config.PREFETCH_TTL
+    )
+    names = list(scripts)
+    weights = [scripts[name] for name in names]
+    samples = {}
+    errors = {}
+    prefetch = {"hits": 0, "misses": 0}
+    completed = {"steps": 0, "scripts": 0}
+    lock = threading.Lock()
+
+    def record(step, stages, error, extra):
+        with lock:
+            if error is not None:
+                errors[error] = errors.get(error, 0) + 1
+                return
+            completed["steps"] += 1
+            for stage, seconds in stages.items():
+                samples.setdefault(step, {}).setdefault(stage, []).append(seconds)
+            if "prefetched" in extra:
+                prefetch["hits" if extra["prefetched"] else "misses"] += 1
+
+    def user_loop(index):
+        rng = random.Random(seed + index)
+        user = User(f"load-{users}-{index}", services, prefetch_manager, rng, think_time)
+        # Stagger arrivals over the first think time
+        time.sleep(rng.uniform(0, think_time))
+        while time.perf_counter() < deadline:
+            user.run_script(rng.choices(names, weights)[0], record)
+            with lock:
+                completed["scripts"] += 1
+
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    deadline = started + duration
+    with ThreadPoolExecutor(max_workers=users, thread_name_prefix="load-user") as executor:
+        list(executor.map(user_loop, range(users)))
+    wall = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    prefetch_manager.shutdown()
+
+    lookups = prefetch["hits"] + prefetch["misses"]
+    return {
+        "users": users,
+        "wall_seconds": round(wall, 2),
+        "scripts": completed["scripts"],
+        "steps": completed["steps"],
+        "throughput_steps_per_second": round(completed["steps"] / wall, 3) if wall else None,
+        "cpu_utilization": round(cpu / wall, 2) if wall else None,
+        "errors": errors,
+        "error_rate": round(sum(errors.values()) / (completed["steps"] + sum(errors.values())), 3)
+                      if completed["steps"] or errors else 0.0,
+        "prefetch_hit_rate": round(prefetch["hits"] / lookups, 3) if lookups else None,
+        "steps_by_type": {
+            step: {stage: percentiles(values) for stage, values in stages.items()}
+            for step, stages in samples.items()
+        },
+    }
+
+def format_table(levels):
+    """
+    Format the levels as a table of throughput and step latencies
+
+    Args:
+        levels: Results of run_level()
+
+    Returns:
+        Printable table; latencies are the p50/p95 of each step's total in milliseconds
+    """
+    steps = [step for step in STEPS if any(step in level["steps_by_type"] for level in levels)]
+    header = f"{'users':>5} {'steps/s':>8} {'cpu':>5} {'errors':>7} {'prefetch':>8}" + "".join(
+        f" {step + ' p50/p95':>26}" for step in steps)
+    lines = [header, "-" * len(header)]
+    for level in levels:
+        cells = []
+        for step in steps:
+            total = level["steps_by_type"].get(step, {}).get("total", {})
+            cells.append(f" {str(total.get('p50', '-')) + ' / ' + str(total.get('p95', '-')):>26}")
+        lines.append(
+            f"{level['users']:>5} {level['throughput_steps_per_second']:>8} {level['cpu_utilization']:>5} "
+            f"{sum(level['errors'].values()):>7} {str(level['prefetch_hit_rate']):>8}" + "".join(cells)
+        )
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", nargs="+", type=int, default=[1, 2, 4, 8], help="Concurrency levels, in order")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per level")
+    parser.add_argument("--think-time", type=float, default=0.5, help="Mean seconds between steps")
+    parser.add_argument("--mix", nargs="+", default=["diagnosis=1", "district=1", "chat=2"],
+                        help="Script weights as name=weight")
+    parser.add_argument("--torch-threads", type=int, help="torch.set_num_threads for the vision model")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub time to first token (seconds)")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Stub token rate")
+    parser.add_argument("--response-tokens", type=int, default=120, help="Tokens per stub answer")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    scripts = {}
+    for item in args.mix:
+        name, _, weight = item.partition("=")
+        if name not in SCRIPTS:
+            parser.error(f"unknown script '{name}', expected one of {', '.join(SCRIPTS)}")
+        scripts[name] = float(weight or 1)
+
+    logging.basicConfig(level=logging.WARNING)
+    stub = StubLLMServer(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                         response_tokens=args.response_tokens).start()
+    # Services read the endpoint when they are built
+    Config.OPENROUTER_URL = stub.url
+
+    services, skipped = build_services(["diagnosis"] if "diagnosis" in scripts else [])
+    if "diagnosis" not in services and "diagnosis" in scripts:
+        print(f"Skipping the diagnosis script: {skipped.get('diagnosis')}", file=sys.stderr)
+        del scripts["diagnosis"]
+    if args.torch_threads:
+        import torch
+        torch.set_num_threads(args.torch_threads)
+
+    levels = []
+    for users in args.users:
+        print(f"  {users} users for {args.duration:.0f} s...", file=sys.stderr)
+        levels.append(run_level(services, users, args.duration, scripts, think_time=args.think_time,
+                                seed=args.seed))
+    stub.stop()
+
+    print(format_table(levels))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                "config": {
+                    "scripts": scripts,
+                    "duration": args.duration,
+                    "think_time": args.think_time,
+                    "stub": {"latency": args.latency, "tokens_per_second": args.tokens_per_second,
+                             "response_tokens": args.response_tokens},
+                    "vector_backend": Config.VECTOR_BACKEND,
+                    "chroma_mode": Config.CHROMA_MODE,
+                    "torch_threads": args.torch_threads,
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "cpu_count": os.cpu_count(),
+                },
+                "levels": levels,
+            }, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+
+if __name__ == "__main__":
+    main()
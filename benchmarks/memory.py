@@ -0,0 +1,373 @@
+"""
+Memory profile of process startup and per-session growth
+
+Builds the service stack headlessly one component at a time and records
+RSS after each, so the fixed cost of a worker process can be attributed:
+
+    torch            torch and transformers imported
+    vision_model     DINOv2 loaded (ModelManager)
+    reference_index  visual similarity index of the reference images
+    tiktoken         tokenizer encoding
+    rag_service      vector store and lexical index (RAGService; NumPy or
+                     Chroma, see VECTOR_BACKEND)
+    embedder         ONNX embedding model (first query)
+    openai_client    ChatService and its OpenAI client
+    json_databases   disease and hospital JSON databases, held in memory
+
+It then simulates sessions against the local stub LLM: chat turns and
+image uploads, with every session's history kept alive like an open
+browser tab. It reports the RSS and heap slope per session and the
+allocation sites that grew most, from tracemalloc:
+
+    python -m benchmarks.memory --sessions 20 --output memory.json
+
+Components are built in sequence (the app builds them concurrently) so
+each delta belongs to one component. RSS is read from /proc and falls back
+to the peak RSS where that is unavailable; the heap only covers Python
+allocations, not the native memory of torch or ONNX Runtime.
+
+tracemalloc adds its own memory to every traced allocation, so it is only
+started for the sessions and the startup RSS is that of an untraced
+process. --trace-startup also traces the startup to attribute its Python
+heap, at the cost of an inflated startup RSS.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+
+from PIL import Image
+
+from benchmarks.corpus import diagnosis_images
+from benchmarks.e2e import _session_turns, run_chat_turn, run_diagnosis_turn
+from benchmarks.stub_llm import StubLLMServer
+from config.settings import Config, WORKSPACE_ROOT
+
+MB = 1024 * 1024
+
+def rss_bytes():
+    """Get the resident set size of this process"""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # Peak RSS; kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def sample_memory():
+    """
+    Measure the process after a garbage collection
+
+    Returns:
+        Dictionary with rss_mb and heap_mb (traced Python heap, 0 when not tracing)
+    """
+    gc.collect()
+    heap = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+    return {"rss_mb": round(rss_bytes() / MB, 2), "heap_mb": round(heap / MB, 2)}
+
+def _load_json_databases():
+    databases = {}
+    for name in ("diseases.json", "hospital_rag.json"):
+        with open(os.path.join(WORKSPACE_ROOT, "database", name), 'r', encoding='utf-8') as f:
+            databases[name] = json.load(f)
+    return databases
+
+def _startup_steps():
+    """Build steps in order: (name, dependencies, function of the built components)"""
+
+    def import_torch(built):
+        import torch
+        import transformers
+        return torch
+
+    def vision_model(built):
+        from models.ai_models import ModelManager
+        manager = ModelManager()
+        manager.initialize_models()
+        if not manager.get_vision_model().is_loaded():
+            raise RuntimeError(Config.MODEL_LOAD_ERROR)
+        return manager
+
+    def reference_index(built):
+        return built["vision_model"].get_reference_index()
+
+    def tokenizer(built):
+        from utils.token_usage import get_encoding
+        encoding = get_encoding()
+        if encoding is None:
+            raise RuntimeError(f"cannot load {Config.TOKEN_ENCODING}")
+        return encoding
+
+    def rag_service(built):
+        from services.rag_service import RAGService
+        return RAGService()
+
+    def embedder(built):
+        built["rag_service"].warm_up()
+        return built["rag_service"].embedding_function
+
+    def openai_client(built):
+        from services.chat_service import ChatService
+        return ChatService(rag_service=built["rag_service"])
+
+    return [
+        ("torch", (), import_torch),
+        ("vision_model", ("torch",), vision_model),
+        ("reference_index", ("vision_model",), reference_index),
+        ("tiktoken", (), tokenizer),
+        ("rag_service", (), rag_service),
+        ("embedder", ("rag_service",), embedder),
+        ("openai_client", ("rag_service",), openai_client),
+        ("json_databases", (), lambda built: _load_json_databases()),
+    ]
+
+def profile_startup(skip=()):
+    """
+    Build the components one by one, measuring memory after each
+
+    Args:
+        skip: Component names not to build
+
+    Returns:
+        Tuple of (built components by name, list of stage results)
+    """
+    built = {}
+    stages = []
+    previous = sample_memory()
+    stages.append({"stage": "python", **previous, "delta_rss_mb": 0.0, "delta_heap_mb": 0.0, "seconds": 0.0})
+
+    for name, dependencies, build in _startup_steps():
+        if name in skip:
+            continue
+        missing = [dependency for dependency in dependencies if dependency not in built]
+        started = time.perf_counter()
+        error = None
+        if missing:
+            error = f"skipped, needs {', '.join(missing)}"
+        else:
+            try:
+                built[name] = build(built)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+        seconds = time.perf_counter() - started
+        current = sample_memory()
+        stages.append({
+            "stage": name,
+            **current,
+            "delta_rss_mb": round(current["rss_mb"] - previous["rss_mb"], 2),
+            "delta_heap_mb": round(current["heap_mb"] - previous["heap_mb"], 2),
+            "seconds": round(seconds, 2),
+            "error": error,
+        })
+        previous = current
+        print(f"  {name}: {current['rss_mb']} MB RSS" + (f" ({error})" if error else ""), file=sys.stderr)
+    return built, stages
+
+def build_session_services(built):
+    """
+    Assemble the services the simulated sessions use
+
+    Args:
+        built: Components from profile_startup()
+
+    Returns:
+        Dictionary with "chat" and, if the vision model loaded, "diagnosis"
+    """
+    services = {}
+    if "openai_client" in built:
+        services["chat"] = built["openai_client"]
+    if "vision_model" in built and "chat" in services:
+        from services.diagnosis_service import DiagnosisService
+        services["diagnosis"] = DiagnosisService(
+            built["vision_model"].get_vision_model(), reference_index=built.get("reference_index"),
+            chat_service=services["chat"]
+        )
+    return services
+
+def run_session(services, index, turns, images):
+    """
+    Run one session's chat turns and image uploads
+
+    Args:
+        services: Services from build_session_services()
+        index: Session number (offsets the corpus)
+        turns: Chat turns
+        images: Image paths uploaded for diagnosis
+
+    Returns:
+        The session's chat history, as the app keeps it
+    """
+    history = []
+    for _, query in _session_turns(["disease", "hospital", "small_talk"], index, turns):
+        run_chat_turn(services["chat"], history, query)
+    if "diagnosis" in services:
+        for path in images:
+            with open(path, 'rb') as f:
+                image_bytes = f.read()
+            with Image.open(path) as image:
+                services["diagnosis"].add_diagnosis_to_chat(image, history, image_bytes=image_bytes)
+            run_diagnosis_turn(services["diagnosis"], path)
+    return history
+
+def slope(points):
+    """Least-squares slope of (x, y) points"""
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance if variance else None
+
+def profile_sessions(services, sessions, turns, images_per_session, warmup=1, top=15):
+    """
+    Simulate sessions and measure memory after each one
+
+    Args:
+        services: Services from build_session_services()
+        sessions: Number of measured sessions
+        turns: Chat turns per session
+        images_per_session: Images uploaded per session
+        warmup: Sessions run first and not measured (lazy initialization)
+        top: Number of allocation sites reported
+
+    Returns:
+        Result dictionary with the per-session points, slopes and top sites
+    """
+    images = diagnosis_images() if "diagnosis" in services else []
+    histories = []
+
+    def run(index):
+        session_images = [images[(index * images_per_session + i) % len(images)]
+                          for i in range(images_per_session)] if images else []
+        histories.append(run_session(services, index, turns, session_images))
+
+    for index in range(warmup):
+        run(index)
+
+    before = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+    points = [{"sessions": 0, **sample_memory()}]
+    for index in range(warmup, warmup + sessions):
+        run(index)
+        points.append({"sessions": index - warmup + 1, **sample_memory()})
+        print(f"  session {index - warmup + 1}: {points[-1]['rss_mb']} MB RSS", file=sys.stderr)
+
+    top_sites = []
+    if before is not None:
+        # Leave out tracemalloc's own bookkeeping and the import machinery
+        ignored = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib.*>")]
+        after = tracemalloc.take_snapshot().filter_traces(ignored)
+        for stat in after.compare_to(before.filter_traces(ignored), "lineno")[:top]:
+            frame = stat.traceback[0]
+            filename = frame.filename
+            if filename.startswith(WORKSPACE_ROOT):
+                filename = os.path.relpath(filename, WORKSPACE_ROOT)
+            top_sites.append({
+                "site": f"{filename}:{frame.lineno}",
+                "size_diff_kb": round(stat.size_diff / 1024, 1),
+                "count_diff": stat.count_diff,
+            })
+
+    rss_slope = slope([(point["sessions"], point["rss_mb"]) for point in points])
+    heap_slope = slope([(point["sessions"], point["heap_mb"]) for point in points])
+    return {
+        "sessions": sessions,
+        "turns_per_session": turns,
+        "images_per_session": images_per_session if images else 0,
+        "warmup_sessions": warmup,
+        "rss_mb_per_session": round(rss_slope, 3) if rss_slope is not None else None,
+        "heap_mb_per_session": round(heap_slope, 3) if heap_slope is not None else None,
+        "points": points,
+        "top_sites": top_sites,
+    }
+
+def format_report(stages, sessions):
+    """
+    Format the startup stages and session growth
+
+    Args:
+        stages: Stage results from profile_startup()
+        sessions: Result of profile_sessions() (or None)
+
+    Returns:
+        Printable report
+    """
+    header = f"{'stage':<16} {'RSS MB':>9} {'+RSS':>9} {'heap MB':>9} {'+heap':>8} {'s':>7}"
+    lines = [header, "-" * len(header)]
+    for stage in stages:
+        lines.append(
+            f"{stage['stage']:<16} {stage['rss_mb']:>9} {stage['delta_rss_mb']:>9} {stage['heap_mb']:>9} "
+            f"{stage['delta_heap_mb']:>8} {stage['seconds']:>7}" + (f"  {stage['error']}" if stage.get("error") else "")
+        )
+    if sessions is not None:
+        lines.append("")
+        lines.append(f"Fixed cost after {sessions['warmup_sessions']} warm-up session(s): "
+                     f"{sessions['points'][0]['rss_mb']} MB RSS; per session: "
+                     f"{sessions['rss_mb_per_session']} MB RSS, {sessions['heap_mb_per_session']} MB heap "
+                     f"({sessions['turns_per_session']} turns, {sessions['images_per_session']} images)")
+        if sessions["top_sites"]:
+            lines.append(f"Top allocation growth over {sessions['sessions']} sessions:")
+            for site in sessions["top_sites"]:
+                lines.append(f"  {site['size_diff_kb']:>10} KB {site['count_diff']:>8} blocks  {site['site']}")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20, help="Sessions to simulate")
+    parser.add_argument("--turns", type=int, default=4, help="Chat turns per session")
+    parser.add_argument("--images", type=int, default=1, help="Image uploads per session")
+    parser.add_argument("--warmup-sessions", type=int, default=1, help="Unmeasured sessions first")
+    parser.add_argument("--skip", nargs="+", default=[], help="Components not to build, e.g. vision_model")
+    parser.add_argument("--top", type=int, default=15, help="Allocation sites to report")
+    parser.add_argument("--frames", type=int, default=1, help="Stack frames tracemalloc keeps per allocation")
+    parser.add_argument("--trace-startup", action="store_true",
+                        help="Also trace the Python heap during startup (inflates the startup RSS)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Stub time to first token (seconds)")
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.trace_startup:
+        tracemalloc.start(args.frames)
+    stub = StubLLMServer(latency=args.latency, tokens_per_second=0).start()
+    # Services read the endpoint when they are built
+    Config.OPENROUTER_URL = stub.url
+
+    built, stages = profile_startup(skip=set(args.skip))
+    services = build_session_services(built)
+    sessions = None
+    if "chat" in services:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(args.frames)
+        sessions = profile_sessions(services, args.sessions, args.turns, args.images,
+                                    warmup=args.warmup_sessions, top=args.top)
+    else:
+        print("Skipping sessions: the chat service was not built", file=sys.stderr)
+    stub.stop()
+
+    print(format_report(stages, sessions))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                "config": {
+                    "vector_backend": Config.VECTOR_BACKEND,
+                    "chroma_mode": Config.CHROMA_MODE,
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "tracemalloc_frames": args.frames,
+                    "tracemalloc_startup": args.trace_startup,
+                },
+                "startup": stages,
+                "sessions": sessions,
+            }, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Retrieval quality vs latency benchmark
+
+Runs the labeled query set in benchmarks/data/retrieval_eval.json
+(Vietnamese and English queries mapped to the expected diseases or
+districts) through RAGService for every retrieval configuration, strategy
+(vector, BM25 lexical or hybrid) and backend, and reports:
+
+    recall@k      share of expected diseases among the top k distinct
+                  diseases of the retrieved chunks
+    mrr           mean reciprocal rank of the first expected disease
+    false ctx     share of vague or off-topic queries (no expected disease)
+                  that still got disease context
+    context       tokens of the context sent to the LLM (mean and p95)
+    latency       embedding, search and formatting time (p50/p95/p99)
+    skipped       share of hybrid queries answered without the vector search
+    routing       accuracy of the keyword routing and district extraction
+
+Disease retrieval is scored on every disease query, regardless of how the
+keyword router would route it; routing is scored separately.
+
+    python -m benchmarks.retrieval --n-results 3 5 8 --thresholds 0.6 0.7 0.8
+    python -m benchmarks.retrieval --modes numpy snapshot http --output retrieval.json
+    python -m benchmarks.retrieval --retrieval vector hybrid --n-results 5 --thresholds 0.7
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from benchmarks.stats import percentiles
+from config.settings import Config
+
+EVAL_SET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "retrieval_eval.json")
+
+def load_eval_set(path=EVAL_SET_PATH):
+    """
+    Load the labeled query set
+
+    Args:
+        path: JSON file with a list of {"query", "lang", "type", "expected" or "district"};
+            a disease query with an empty "expected" should get no context
+
+    Returns:
+        List of query dictionaries
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def rank_diseases(chunks):
+    """Get the distinct disease names of retrieved chunks, best first"""
+    ranked = []
+    for _, metadata in chunks:
+        if metadata["disease_name"] not in ranked:
+            ranked.append(metadata["disease_name"])
+    return ranked
+
+def score_ranking(ranked, expected, ks):
+    """
+    Score a ranking against the expected diseases
+
+    Args:
+        ranked: Distinct disease names, best first
+        expected: Expected disease names
+        ks: Cutoffs for recall@k
+
+    Returns:
+        Tuple of ({k: recall@k}, reciprocal rank)
+    """
+    expected_lower = {name.lower() for name in expected}
+    recall = {
+        k: len(expected_lower & {name.lower() for name in ranked[:k]}) / len(expected_lower)
+        for k in ks
+    }
+    reciprocal_rank = next(
+        (1.0 / rank for rank, name in enumerate(ranked, 1) if name.lower() in expected_lower), 0.0
+    )
+    return recall, reciprocal_rank
+
+def evaluate_config(service, items, n_results, distance_threshold, ks=(1, 3, 5), retrieval=None):
+    """
+    Score disease retrieval for one configuration
+
+    Args:
+        service: RAGService
+        items: Labeled queries (only "disease" queries are used)
+        n_results: Chunks retrieved per search
+        distance_threshold: Maximum cosine distance of kept chunks
+        ks: Cutoffs for recall@k
+        retrieval: "vector", "lexical" or "hybrid" (default: the service's)
+
+    Returns:
+        Result dictionary
+    """
+    queries = [item for item in items if item["type"] == "disease" and item["expected"]]
+    negatives = [item for item in items if item["type"] == "disease" and not item["expected"]]
+    recalls = {k: [] for k in ks}
+    reciprocal_ranks = []
+    by_language = {}
+    tokens = []
+    latencies = []
+    empty = 0
+    skipped = 0
+    misses = []
+    retrieval = retrieval or service.retrieval
+    service.retrieval = retrieval
+
+    for item in queries:
+        started = time.perf_counter()
+        chunks = service._query_disease_chunks(item["query"], n_results, distance_threshold)
+        context, _ = service._format_disease_context(chunks)
+        latencies.append(time.perf_counter() - started)
+
+        recall, reciprocal_rank = score_ranking(rank_diseases(chunks), item["expected"], ks)
+        for k in ks:
+            recalls[k].append(recall[k])
+        reciprocal_ranks.append(reciprocal_rank)
+        by_language.setdefault(item["lang"], []).append(reciprocal_rank)
+        tokens.append(len(service.tokenizer.encode(context)) if context else 0)
+        if context is None:
+            empty += 1
+        if reciprocal_rank == 0.0:
+            misses.append(item["query"])
+        if retrieval == "hybrid" and service.lexical_index is not None:
+            skipped += service._lexical_search(item["query"], n_results)[1] is not None
+
+    false_positives = []
+    for item in negatives:
+        chunks = service._query_disease_chunks(item["query"], n_results, distance_threshold)
+        if chunks:
+            false_positives.append({"query": item["query"], "diseases": rank_diseases(chunks)})
+
+    def mean(values):
+        return round(sum(values) / len(values), 3) if values else None
+
+    token_stats = sorted(tokens)
+    return {
+        "retrieval": retrieval,
+        "n_results": n_results,
+        "distance_threshold": distance_threshold,
+        "queries": len(queries),
+        "recall": {f"@{k}": mean(values) for k, values in recalls.items()},
+        "mrr": mean(reciprocal_ranks),
+        "mrr_by_language": {lang: mean(values) for lang, values in by_language.items()},
+        "empty_context_rate": round(empty / len(queries), 3) if queries else None,
+        "context_tokens": {
+            "mean": mean(tokens),
+            "p95": token_stats[int(0.95 * (len(token_stats) - 1))] if token_stats else None,
+        },
+        "latency": percentiles(latencies),
+        "vector_skipped_rate": round(skipped / len(queries), 3) if queries and retrieval == "hybrid" else None,
+        "misses": misses,
+        "negative_queries": len(negatives),
+        "false_context_rate": round(len(false_positives) / len(negatives), 3) if negatives else None,
+        "false_positives": false_positives,
+    }
+
+def evaluate_routing(service, items):
+    """
+    Score the keyword routing and district extraction
+
+    Args:
+        service: RAGService
+        items: Labeled queries
+
+    Returns:
+        Result dictionary with accuracy per query type and the misrouted queries
+    """
+    correct = {}
+    misrouted = []
+    districts_correct = 0
+    districts_total = 0
+
+    for item in items:
+        expected_route = item["type"] if item["type"] != "none" else None
+        route = service.route_query(item["query"])
+        correct.setdefault(item["type"], []).append(route == expected_route)
+        if route != expected_route:
+            misrouted.append({"query": item["query"], "expected": expected_route, "route": route})
+        if item["type"] == "hospital":
+            districts_total += 1
+            districts_correct += service._extract_district_from_query(item["query"]) == item["district"]
+
+    return {
+        "accuracy": {
+            query_type: round(sum(values) / len(values), 3) for query_type, values in correct.items()
+        },
+        "district_accuracy": round(districts_correct / districts_total, 3) if districts_total else None,
+        "misrouted": misrouted,
+    }
+
+def format_table(results):
+    """
+    Format configuration results as a comparison table
+
+    Args:
+        results: Results of evaluate_config() with a "backend" key added
+
+    Returns:
+        Printable table
+    """
+    header = (f"{'backend':<12} {'retrieval':<9} {'n':>3} {'thr':>5} {'R@1':>6} {'R@3':>6} {'R@5':>6} {'MRR':>6} "
+              f"{'empty':>6} {'false':>6} {'tok':>7} {'tok p95':>7} {'p50 ms':>8} {'p95 ms':>8} {'skipped':>7}")
+    lines = [header, "-" * len(header)]
+    for result in results:
+        recall = result["recall"]
+        lines.append(
+            f"{result['backend']:<12} {result['retrieval']:<9} {result['n_results']:>3} {result['distance_threshold']:>5} "
+            f"{recall.get('@1', '-'):>6} {recall.get('@3', '-'):>6} {recall.get('@5', '-'):>6} "
+            f"{result['mrr']:>6} {result['empty_context_rate']:>6} "
+            f"{str(result['false_context_rate'] if result['false_context_rate'] is not None else '-'):>6} "
+            f"{result['context_tokens']['mean']:>7} "
+            f"{result['context_tokens']['p95']:>7} {result['latency'].get('p50', '-'):>8} "
+            f"{result['latency'].get('p95', '-'):>8} {str(result['vector_skipped_rate'] if result['vector_skipped_rate'] is not None else '-'):>7}"
+        )
+    return "\n".join(lines)
+
+def build_service(backend):
+    """
+    Build a read-only RAGService for a backend
+
+    Args:
+        backend: "numpy" or a Chroma mode ("persistent", "snapshot" or "http")
+
+    Returns:
+        RAGService
+    """
+    from services.rag_service import RAGService
+
+    if backend == "numpy":
+        service = RAGService(writer=False, retrieval="hybrid", vector_backend="numpy")
+    else:
+        service = RAGService(mode=backend, writer=False, retrieval="hybrid", vector_backend="chroma")
+    health = service.health_check()
+    if not health["ok"]:
+        raise RuntimeError(f"{backend} knowledge base unavailable: {health['error']}")
+    service.warm_up()
+    return service
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=["numpy", Config.CHROMA_MODE],
+                        help="Backends to compare: numpy and/or Chroma modes")
+    parser.add_argument("--retrieval", nargs="+", default=[Config.RAG_RETRIEVAL],
+                        choices=["vector", "lexical", "hybrid"], help="Retrieval strategies to compare")
+    parser.add_argument("--n-results", nargs="+", type=int, default=[3, 5, 8])
+    parser.add_argument("--thresholds", nargs="+", type=float, default=[0.6, 0.7, 0.8])
+    parser.add_argument("--eval-set", default=EVAL_SET_PATH)
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    items = load_eval_set(args.eval_set)
+    results = []
+    routing = None
+    for backend in args.modes:
+        try:
+            service = build_service(backend)
+        except Exception as e:
+            print(f"Skipping {backend}: {e}", file=sys.stderr)
+            continue
+        if routing is None:
+            routing = evaluate_routing(service, items)
+        for retrieval in args.retrieval:
+            for n_results in args.n_results:
+                for threshold in args.thresholds:
+                    result = evaluate_config(service, items, n_results, threshold, retrieval=retrieval)
+                    result["backend"] = backend
+                    results.append(result)
+        service.close()
+
+    print(format_table(results))
+    if routing is not None:
+        print(f"\nRouting accuracy: {routing['accuracy']}, district accuracy: {routing['district_accuracy']}")
+        for miss in routing["misrouted"]:
+            print(f"  misrouted: {miss['query']!r} expected {miss['expected']}, got {miss['route']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                "config": {
+                    "eval_set": os.path.relpath(args.eval_set),
+                    "queries": len(items),
+                    "current": {"retrieval": Config.RAG_RETRIEVAL, "n_results": Config.RAG_N_RESULTS,
+                                "distance_threshold": Config.RAG_DISTANCE_THRESHOLD},
+                },
+                "routing": routing,
+                "results": results,
+            }, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Statistics shared by the benchmarks
+"""
+
+def percentiles(samples):
+    """
+    Summarize latency samples
+
+    Args:
+        samples: Durations in seconds
+
+    Returns:
+        Dictionary with count, mean, p50, p95, p99 and max in milliseconds
+    """
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def at(q):
+        # Linear interpolation between closest ranks
+        position = (len(ordered) - 1) * q
+        lower = int(position)
+        upper = min(lower + 1, len(ordered) - 1)
+        value = ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+        return round(value * 1000, 2)
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 2),
+        "p50": at(0.50),
+        "p95": at(0.95),
+        "p99": at(0.99),
+        "max": round(ordered[-1] * 1000, 2),
+    }
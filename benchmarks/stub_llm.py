@@ -0,0 +1,176 @@
+"""
+Local OpenAI-compatible stub for benchmarks
+
+Serves POST /v1/chat/completions, streamed or not, with a configurable time
+to first token and token rate, so the LLM's share of end-to-end latency is
+fixed and known. Run it standalone and point the app at it with
+OPENROUTER_URL=http://127.0.0.1:8002/v1:
+
+    python -m benchmarks.stub_llm --port 8002 --latency 0.5 --tokens-per-second 40
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Answer text is built from these words; content does not matter for timing
+_WORDS = (
+    "Bệnh", "da", "liễu", "này", "thường", "gặp", "ở", "người", "lớn", "và",
+    "cần", "được", "bác", "sĩ", "thăm", "khám", "trực", "tiếp", "để", "điều", "trị",
+)
+
+class StubLLMServer:
+    """OpenAI-compatible chat completions server with simulated latency"""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.2, tokens_per_second=50.0, response_tokens=120):
+        """
+        Initialize the server (call start() to serve)
+
+        Args:
+            host: Interface to bind
+            port: Port to bind; 0 picks a free port
+            latency: Seconds before the first token
+            tokens_per_second: Token rate after the first token (0 for no delay)
+            response_tokens: Number of tokens in every answer
+        """
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        """Base URL to pass to the OpenAI client"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        """Serve requests on a background thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving"""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _tokens(self):
+        return [_WORDS[i % len(_WORDS)] + " " for i in range(self.response_tokens)]
+
+    def _token_delay(self):
+        return 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                if self.path.rstrip("/") != "/v1/chat/completions":
+                    self.send_error(404)
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with stub._lock:
+                    stub.requests += 1
+
+                prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+                usage = {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": stub.response_tokens,
+                    "total_tokens": prompt_tokens + stub.response_tokens,
+                }
+                completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+                model = body.get("model", "stub")
+
+                time.sleep(stub.latency)
+                if body.get("stream"):
+                    include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+                    self._stream(completion_id, model, usage if include_usage else None)
+                else:
+                    time.sleep(stub._token_delay() * stub.response_tokens)
+                    self._send_json({
+                        "id": completion_id,
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": "".join(stub._tokens()).strip()},
+                            "finish_reason": "stop",
+                        }],
+                        "usage": usage,
+                    })
+
+            def _send_json(self, payload):
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, completion_id, model, usage):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+
+                def send(choices, **extra):
+                    chunk = {"id": completion_id, "object": "chat.completion.chunk",
+                             "created": int(time.time()), "model": model, "choices": choices}
+                    chunk.update(extra)
+                    self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+
+                for i, token in enumerate(stub._tokens()):
+                    if i:
+                        time.sleep(stub._token_delay())
+                    send([{"index": 0, "delta": {"content": token}, "finish_reason": None}])
+                send([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+                if usage is not None:
+                    send([], usage=usage)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--response-tokens", type=int, default=120)
+    args = parser.parse_args()
+
+    server = StubLLMServer(args.host, args.port, latency=args.latency,
+                           tokens_per_second=args.tokens_per_second, response_tokens=args.response_tokens)
+    print(f"Stub LLM serving on {server.url}")
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+"""
+Vision inference microbenchmark
+
+Loads the images in database/disease_images and times the VisionModel
+pipeline stage by stage: preprocessing (image processor), the forward pass
+and postprocessing (softmax, top-k labels, pooled embedding). It reports
+single-image latency and throughput for every combination of batch size,
+torch thread count and backend/precision available on this machine, as a
+comparison table and optionally as JSON (the batch size 1 rows are the
+single-image latency):
+
+    python -m benchmarks.vision --threads 1 2 4 --batch-sizes 1 4 8 --output vision.json
+
+Variants:
+    fp32          eager float32 (what the app runs)
+    bf16          eager bfloat16 (fast on CPUs with AVX512-BF16/AMX)
+    int8          dynamic int8 quantization of the Linear layers
+    fp32-compile  torch.compile (only with --compile; slow to warm up)
+    cuda-fp32, cuda-fp16   when a GPU is available
+
+Each row also reports how often its top-1 label agrees with the first
+configuration measured (fp32 by default), so a faster setting can be
+checked for accuracy drift before it is adopted.
+
+The stage rows run a copy of the pipeline so that its stages can be timed
+apart. For the app's model, a "predict" row per thread count also times
+VisionModel.predict itself on single images, with the prediction cache
+disabled, so the breakdown can be checked against what the app runs.
+"""
+import argparse
+import copy
+import json
+import os
+import platform
+import sys
+import time
+
+import torch
+from PIL import Image
+
+from benchmarks.corpus import diagnosis_images
+from benchmarks.stats import percentiles
+from config.settings import Config
+from models.reference_index import pop_captured_embedding, register_embedding_hook
+
+STAGES = ("preprocess", "forward", "postprocess", "total")
+
+def available_variants(compile_model=False):
+    """
+    List the backend/precision variants usable on this machine
+
+    Args:
+        compile_model: Include torch.compile variants
+
+    Returns:
+        List of variant names
+    """
+    variants = ["fp32", "bf16"]
+    if torch.backends.quantized.supported_engines and any(
+        engine != "none" for engine in torch.backends.quantized.supported_engines
+    ):
+        variants.append("int8")
+    if compile_model:
+        variants.append("fp32-compile")
+    if torch.cuda.is_available():
+        variants.extend(["cuda-fp32", "cuda-fp16"])
+    return variants
+
+def load_model(model_name=None):
+    """
+    Load the image processor and classification model
+
+    Args:
+        model_name: Model name or local path (default Config.VISION_MODEL,
+            loaded through the app's shared loader)
+
+    Returns:
+        Tuple of (processor, model)
+    """
+    if model_name is None or model_name == Config.VISION_MODEL:
+        from models.ai_models import _load_local_model
+        processor, model = _load_local_model()
+    else:
+        from transformers import AutoImageProcessor, AutoModelForImageClassification
+        processor = AutoImageProcessor.from_pretrained(model_name)
+        model = AutoModelForImageClassification.from_pretrained(model_name)
+        register_embedding_hook(model)
+    if model is None:
+        raise RuntimeError(Config.MODEL_LOAD_ERROR)
+    return processor, model.eval()
+
+def build_variant(model, variant):
+    """
+    Build a copy of the model for a variant
+
+    Args:
+        model: Loaded float32 model (left unchanged)
+        variant: Variant name from available_variants()
+
+    Returns:
+        Tuple of (model, input dtype, device)
+    """
+    variant_model = copy.deepcopy(model).eval()
+    if variant == "int8":
+        # Quantized modules cannot be cast; inputs stay float32
+        quantized = torch.ao.quantization.quantize_dynamic(variant_model, {torch.nn.Linear}, dtype=torch.qint8)
+        return quantized, torch.float32, "cpu"
+
+    device, dtype = "cpu", torch.float32
+    if variant == "bf16":
+        dtype = torch.bfloat16
+    elif variant.startswith("cuda"):
+        device = "cuda"
+        dtype = torch.float16 if variant == "cuda-fp16" else torch.float32
+    elif variant != "fp32" and variant != "fp32-compile":
+        raise ValueError(f"unknown variant '{variant}'")
+    variant_model = variant_model.to(device=device, dtype=dtype)
+    if variant == "fp32-compile":
+        variant_model = torch.compile(variant_model)
+    return variant_model, dtype, device
+
+def run_batch(processor, model, images, dtype, device, id2label, top_k=3):
+    """
+    Run the prediction pipeline on a batch, timing each stage
+
+    Args:
+        processor: Image processor
+        model: Classification model
+        images: List of PIL images
+        dtype: Model input dtype
+        device: Model device
+        id2label: Class index to label mapping
+        top_k: Number of labels kept per image
+
+    Returns:
+        Tuple of (stage durations in seconds, top-1 label of every image)
+    """
+    started = time.perf_counter()
+    inputs = processor(images=images, return_tensors="pt")
+    pixel_values = inputs["pixel_values"].to(device=device, dtype=dtype)
+    preprocessed = time.perf_counter()
+
+    with torch.no_grad():
+        logits = model(pixel_values=pixel_values).logits
+    if device == "cuda":
+        torch.cuda.synchronize()
+    forwarded = time.perf_counter()
+
+    probabilities = torch.nn.functional.softmax(logits, dim=-1).float().cpu().numpy()
+    pop_captured_embedding()
+    top_labels = []
+    for row in probabilities:
+        top = [id2label[int(i)] for i in row.argsort()[::-1][:top_k]]
+        top_labels.append(top[0])
+    finished = time.perf_counter()
+
+    return {
+        "preprocess": preprocessed - started,
+        "forward": forwarded - preprocessed,
+        "postprocess": finished - forwarded,
+        "total": finished - started,
+    }, top_labels
+
+def measure(processor, model, images, dtype, device, id2label, batch_size, warmup=2, min_batches=5):
+    """
+    Measure one configuration
+
+    Args:
+        processor: Image processor
+        model: Classification model
+        images: List of PIL images (cycled to fill batches)
+        dtype: Model input dtype
+        device: Model device
+        id2label: Class index to label mapping
+        batch_size: Images per forward pass
+        warmup: Untimed batches first
+        min_batches: Minimum number of timed batches
+
+    Returns:
+        Tuple of (result dictionary, top-1 labels of the images in order)
+    """
+    batches = []
+    n_batches = max(min_batches, -(-len(images) // batch_size))
+    for i in range(n_batches):
+        batches.append([images[(i * batch_size + j) % len(images)] for j in range(batch_size)])
+
+    for batch in batches[:warmup]:
+        run_batch(processor, model, batch, dtype, device, id2label)
+
+    samples = {stage: [] for stage in STAGES}
+    labels = []
+    for batch in batches:
+        stages, top_labels = run_batch(processor, model, batch, dtype, device, id2label)
+        for stage, seconds in stages.items():
+            samples[stage].append(seconds)
+        labels.extend(top_labels)
+
+    total = sum(samples["total"])
+    return {
+        "batch_size": batch_size,
+        "images": len(batches) * batch_size,
+        "throughput_images_per_second": round(len(batches) * batch_size / total, 2) if total else None,
+        "stages": {stage: percentiles(values) for stage, values in samples.items()},
+    }, labels[:len(images)]
+
+def measure_predict(vision_model, images, image_bytes=None, warmup=2, min_images=5):
+    """
+    Measure VisionModel.predict on single images
+
+    Args:
+        vision_model: Loaded VisionModel, with its prediction cache disabled
+        images: List of PIL images (cycled to fill min_images)
+        image_bytes: Optional raw file bytes of the images, passed like the app does
+        warmup: Untimed predictions first
+        min_images: Minimum number of timed predictions
+
+    Returns:
+        Tuple of (result dictionary, top-1 labels of the images in order)
+    """
+    count = max(min_images, len(images))
+    order = [i % len(images) for i in range(count)]
+
+    def predict(i):
+        predictions = vision_model.predict(images[i], image_bytes=image_bytes[i] if image_bytes else None)
+        if not predictions:
+            raise RuntimeError("VisionModel.predict returned no predictions")
+        return predictions[0]["class_label"]
+
+    for i in order[:warmup]:
+        predict(i)
+
+    samples = []
+    labels = []
+    for i in order:
+        started = time.perf_counter()
+        labels.append(predict(i))
+        samples.append(time.perf_counter() - started)
+
+    total = sum(samples)
+    return {
+        "batch_size": 1,
+        "images": count,
+        "throughput_images_per_second": round(count / total, 2) if total else None,
+        "stages": {stage: percentiles(samples if stage == "total" else []) for stage in STAGES},
+    }, labels[:len(images)]
+
+def run_matrix(processor, model, images, variants, threads, batch_sizes, warmup=2, min_batches=5,
+               vision_model=None, image_bytes=None):
+    """
+    Measure every variant, thread count and batch size
+
+    Args:
+        processor: Image processor
+        model: Loaded float32 model
+        images: List of PIL images
+        variants: Variant names
+        threads: torch.set_num_threads values
+        batch_sizes: Batch sizes
+        warmup: Untimed batches per configuration
+        min_batches: Minimum timed batches per configuration
+        vision_model: Optional VisionModel of the same model, measured as
+            "predict" rows after the variants
+        image_bytes: Optional raw file bytes of the images for the predict rows
+
+    Returns:
+        List of result dictionaries
+    """
+    id2label = model.config.id2label
+    reference_labels = None
+    results = []
+    for variant in variants:
+        try:
+            variant_model, dtype, device = build_variant(model, variant)
+        except Exception as e:
+            print(f"Skipping {variant}: {e}", file=sys.stderr)
+            continue
+        for num_threads in threads:
+            torch.set_num_threads(num_threads)
+            for batch_size in batch_sizes:
+                try:
+                    result, labels = measure(processor, variant_model, images, dtype, device, id2label,
+                                             batch_size, warmup=warmup, min_batches=min_batches)
+                except Exception as e:
+                    print(f"Skipping {variant}/{num_threads} threads/batch {batch_size}: {e}", file=sys.stderr)
+                    continue
+                if reference_labels is None:
+                    reference_labels = labels
+                agreement = sum(a == b for a, b in zip(labels, reference_labels)) / len(reference_labels)
+                result.update({"variant": variant, "threads": num_threads, "top1_agreement": round(agreement, 3)})
+                results.append(result)
+                print(f"  {variant} threads={num_threads} batch={batch_size}: "
+                      f"{result['throughput_images_per_second']} img/s", file=sys.stderr)
+        del variant_model
+
+    if vision_model is not None:
+        for num_threads in threads:
+            torch.set_num_threads(num_threads)
+            result, labels = measure_predict(vision_model, images, image_bytes=image_bytes, warmup=warmup,
+                                             min_images=min_batches)
+            reference_labels = reference_labels or labels
+            agreement = sum(a == b for a, b in zip(labels, reference_labels)) / len(reference_labels)
+            result.update({"variant": "predict", "threads": num_threads, "top1_agreement": round(agreement, 3)})
+            results.append(result)
+            print(f"  predict threads={num_threads}: {result['throughput_images_per_second']} img/s",
+                  file=sys.stderr)
+    return results
+
+def format_table(results):
+    """
+    Format results as a comparison table
+
+    Args:
+        results: Results from run_matrix()
+
+    Returns:
+        Printable table; latencies are per batch in milliseconds, "-" for
+        stages a row does not time
+    """
+    header = (f"{'variant':<13} {'thr':>3} {'batch':>5} {'img/s':>8} {'pre p50':>8} {'fwd p50':>8} "
+              f"{'fwd p95':>8} {'post p50':>8} {'total p50':>9} {'total p99':>9} {'top1':>5}")
+    lines = [header, "-" * len(header)]
+    for result in results:
+        stages = {stage: {"p50": "-", "p95": "-", "p99": "-", **stats} for stage, stats in result["stages"].items()}
+        lines.append(
+            f"{result['variant']:<13} {result['threads']:>3} {result['batch_size']:>5} "
+            f"{result['throughput_images_per_second']:>8} {stages['preprocess']['p50']:>8} "
+            f"{stages['forward']['p50']:>8} {stages['forward']['p95']:>8} {stages['postprocess']['p50']:>8} "
+            f"{stages['total']['p50']:>9} {stages['total']['p99']:>9} {result['top1_agreement']:>5}"
+        )
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="Model name or local path (default: the app's model)")
+    parser.add_argument("--variants", nargs="+", help="Variants to run (default: all available)")
+    parser.add_argument("--threads", nargs="+", type=int, default=[torch.get_num_threads()])
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 4, 8])
+    parser.add_argument("--images", type=int, help="Number of images to use (default: all)")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed batches per configuration")
+    parser.add_argument("--min-batches", type=int, default=5, help="Minimum timed batches per configuration")
+    parser.add_argument("--compile", action="store_true", help="Include torch.compile variants")
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    processor, model = load_model(args.model)
+    paths = diagnosis_images(args.images)
+    images = [Image.open(path).convert("RGB") for path in paths]
+    variants = args.variants or available_variants(args.compile)
+    print(f"{len(images)} images, variants {variants}", file=sys.stderr)
+
+    vision_model, image_bytes = None, None
+    if args.model is None or args.model == Config.VISION_MODEL:
+        from models.ai_models import VisionModel
+        from models.prediction_cache import PredictionCache
+
+        vision_model = VisionModel()
+        vision_model.load_model()
+        vision_model.prediction_cache = PredictionCache(max_entries=0)
+        image_bytes = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                image_bytes.append(f.read())
+
+    results = run_matrix(processor, model, images, variants, args.threads, args.batch_sizes,
+                         warmup=args.warmup, min_batches=args.min_batches, vision_model=vision_model,
+                         image_bytes=image_bytes)
+    print(format_table(results))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                "config": {
+                    "model": args.model or Config.VISION_MODEL,
+                    "images": len(images),
+                    "torch": torch.__version__,
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "processor": platform.processor(),
+                    "cpu_count": os.cpu_count(),
+                },
+                "results": results,
+            }, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,201 @@
 """
 Configuration settings for the medical chatbot application
+
+Settings are read from environment variables first, then from a TOML file:
+the path in CHATBOT_CONFIG if set, otherwise Streamlit's secrets.toml
+(project or home directory) so existing deployments keep working. Nothing
+here depends on Streamlit, so the service layer can run in any process.
 """
-import streamlit as st
+import logging
+import os
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+
+logger = logging.getLogger(__name__)
+
+WORKSPACE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _load_settings_file():
+    """
+    Load settings from the first TOML settings file found
+    
+    Returns:
+        Dictionary of settings (empty if there is no file)
+    """
+    if os.environ.get("CHATBOT_CONFIG"):
+        candidates = [os.environ["CHATBOT_CONFIG"]]
+    else:
+        candidates = [
+            os.path.join(WORKSPACE_ROOT, ".streamlit", "secrets.toml"),
+            os.path.join(os.path.expanduser("~"), ".streamlit", "secrets.toml"),
+        ]
+    
+    for path in candidates:
+        if not os.path.isfile(path):
+            continue
+        if tomllib is None:
+            logger.warning("Cannot read %s: TOML support needs Python 3.11+", path)
+            return {}
+        try:
+            with open(path, 'rb') as f:
+                return tomllib.load(f)
+        except Exception as e:
+            logger.error("Error reading settings file %s: %s", path, e)
+            return {}
+    return {}
+
+_SETTINGS_FILE = _load_settings_file()
+
+def get_setting(name, default=None):
+    """
+    Get a setting from the environment or the settings file
+    
+    Args:
+        name: Setting name
+        default: Value used when the setting is not defined
+        
+    Returns:
+        Setting value
+    """
+    if name in os.environ:
+        return os.environ[name]
+    return _SETTINGS_FILE.get(name, default)
 
 class Config:
     """Application configuration class"""
     
     # API Configuration
-    OPENROUTER_API_KEY = st.secrets["OPENROUTER_API_KEY"]
-    OPENROUTER_URL = "https://openrouter.ai/api/v1"
+    OPENROUTER_API_KEY = get_setting("OPENROUTER_API_KEY", "")
+    OPENROUTER_URL = get_setting("OPENROUTER_URL", "https://openrouter.ai/api/v1")
 
     
     # Model Configuration
     LLM_MODEL = "openai/gpt-oss-20b:free"
     VISION_MODEL = "Jayanth2002/dinov2-base-finetuned-SkinDisease"
     
+    # When to start loading the vision stack in the background:
+    # "intent":  when the user opens diagnosis mode, so chat-only workers never load it
+    # "startup": after the first page render of every session
+    VISION_PRELOAD = get_setting("VISION_PRELOAD", "intent")
+    
+    # Prediction Cache Configuration
+    PREDICTION_CACHE_SIZE = 128
+    PREDICTION_CACHE_HASH_PIXELS = False
+    
+    # Inference Server Configuration (optional shared vision worker)
+    INFERENCE_SERVER_SOCKET = get_setting("VISION_INFERENCE_SOCKET", "")
+    INFERENCE_SERVER_TIMEOUT = 10.0
+    INFERENCE_SERVER_THREADS = None
+    
+    # Knowledge Base (ChromaDB) Configuration
+    # "persistent": this process opens CHROMA_PATH and owns writes (single process)
+    # "snapshot":   read-only replicas of snapshots published by the indexer
+    # "http":       a Chroma server (chroma run --path CHROMA_PATH)
+    CHROMA_MODE = get_setting("CHROMA_MODE", "persistent")
+    CHROMA_PATH = get_setting("CHROMA_PATH", os.path.join(WORKSPACE_ROOT, "chromadb"))
+    CHROMA_SNAPSHOT_DIR = get_setting("CHROMA_SNAPSHOT_DIR", os.path.join(WORKSPACE_ROOT, ".cache", "chroma_snapshots"))
+    CHROMA_SNAPSHOTS_KEPT = 3
+    CHROMA_HOST = get_setting("CHROMA_HOST", "localhost")
+    CHROMA_PORT = int(get_setting("CHROMA_PORT", 8001))
+    CHROMA_RECONNECT_INTERVAL = 30.0
+    
+    # Vector store: "numpy" (exact search over a memory-mapped matrix cached in
+    # VECTOR_INDEX_DIR, no Chroma client), "chroma" (the Chroma settings above),
+    # or "auto": Chroma when CHROMA_MODE is snapshot or http, otherwise NumPy up
+    # to VECTOR_NUMPY_MAX_CHUNKS chunks and Chroma above
+    VECTOR_BACKEND = get_setting("VECTOR_BACKEND", "auto")
+    VECTOR_NUMPY_MAX_CHUNKS = int(get_setting("VECTOR_NUMPY_MAX_CHUNKS", 5000))
+    VECTOR_INDEX_DIR = get_setting("VECTOR_INDEX_DIR", os.path.join(WORKSPACE_ROOT, ".cache", "vector_index"))
+    
+    # Retrieval Configuration (see benchmarks/retrieval.py before changing)
+    RAG_N_RESULTS = int(get_setting("RAG_N_RESULTS", 5))
+    RAG_DISTANCE_THRESHOLD = float(get_setting("RAG_DISTANCE_THRESHOLD", 0.7))
+    # "vector", "lexical" (BM25 only) or "hybrid": BM25 fused with the vector
+    # results, skipping the vector search when BM25 clearly points at one
+    # disease that the query names
+    RAG_RETRIEVAL = get_setting("RAG_RETRIEVAL", "hybrid")
+    RAG_RRF_K = 60
+    RAG_LEXICAL_MARGIN = 2.0
+    RAG_LEXICAL_MIN_SCORE = 8.0
+    # Lexical hits below either cutoff are dropped before fusion
+    RAG_LEXICAL_HIT_MIN_SCORE = 5.0
+    RAG_LEXICAL_HIT_RELATIVE_CUTOFF = 0.5
+    
     # Chat Configuration
     MAX_TOKENS = 1000
     TEMPERATURE = 0.7
-    
+
+    # Token Accounting Configuration; prices are USD per million tokens and
+    # only used when the provider does not report the cost itself
+    TOKEN_ENCODING = "cl100k_base"
+    PROMPT_TOKEN_BUDGET = int(get_setting("PROMPT_TOKEN_BUDGET", 4000))
+    LLM_PROMPT_PRICE = float(get_setting("LLM_PROMPT_PRICE", 0.0))
+    LLM_COMPLETION_PRICE = float(get_setting("LLM_COMPLETION_PRICE", 0.0))
+    USAGE_MAX_SESSIONS = 1000
+
     # UI Configuration
     IMAGE_WIDTH = 300
     UPLOAD_IMAGE_WIDTH = 400
+    THUMBNAIL_WIDTHS = (150, 200, 300)
+    THUMBNAIL_CACHE_MAX_BYTES = 32 * 1024 * 1024
+    # Seconds a missing image path is remembered before checking the disk again
+    IMAGE_MISSING_TTL = 30.0
+    
+    # Session Memory Configuration
+    SESSION_MEMORY_BUDGET_BYTES = 2 * 1024 * 1024
+    SESSION_MIN_RESIDENT_MESSAGES = 10
+    SESSION_SPILL_TTL_SECONDS = 24 * 3600
+    
+    # Session Storage Configuration ("memory" or "sqlite")
+    SESSION_BACKEND = get_setting("SESSION_BACKEND", "memory")
+    SESSION_DB_PATH = get_setting("SESSION_DB_PATH", "")
+    SESSION_WRITE_FLUSH_INTERVAL = 0.2
+    SESSION_PAGE_MESSAGES = 20
+    SESSION_RESTORE_MESSAGES = 20
     
+    # Diagnosis Job Configuration
+    DIAGNOSIS_MAX_WORKERS = 2
+    DIAGNOSIS_JOB_RESULT_TTL = 600
+    DIAGNOSIS_POLL_INTERVAL = 0.5
+    
+    # Headless API Configuration; when CHATBOT_API_URL is set the Streamlit
+    # UI is a client of the API instead of running the services itself
+    API_URL = get_setting("CHATBOT_API_URL", "")
+    API_TIMEOUT = 120.0
+    API_HOST = get_setting("CHATBOT_API_HOST", "127.0.0.1")
+    API_PORT = int(get_setting("CHATBOT_API_PORT", 8000))
+    API_WORKERS = int(get_setting("CHATBOT_API_WORKERS", 2))
+    API_MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+    API_HEALTH_CACHE_SECONDS = 10.0
+    
+    # Startup Configuration
+    STARTUP_MAX_WORKERS = 4
+    STARTUP_RETRY_INTERVAL = 30.0
+    
+    # Quick Question Prefetch Configuration
+    PREFETCH_MAX_WORKERS = 2
+    PREFETCH_MAX_IN_FLIGHT = 4
+    PREFETCH_TTL = 300
+    PREFETCH_CLAIM_TIMEOUT = 60.0
+    PREFETCH_RATE_LIMIT_COOLDOWN = 60
+    
+    # Tracing Configuration; spans are appended to TRACE_EXPORT_PATH as
+    # OTLP/JSON when it is set
+    TRACING_ENABLED = str(get_setting("TRACING_ENABLED", "true")).lower() in ("1", "true", "yes")
+    TRACE_BUFFER_SIZE = 50
+    TRACE_EXPORT_PATH = get_setting("TRACE_EXPORT_PATH", "")
+    TRACE_DEBUG_PANEL = str(get_setting("TRACE_DEBUG_PANEL", "false")).lower() in ("1", "true", "yes")
+    TRACE_PANEL_REFRESH_INTERVAL = 2.0
+
+    # Metrics Configuration; the Prometheus endpoint is served on
+    # METRICS_HOST:METRICS_PORT/metrics when METRICS_PORT is set
+    METRICS_HOST = get_setting("METRICS_HOST", "127.0.0.1")
+    METRICS_PORT = int(get_setting("METRICS_PORT", 0))
+    METRICS_SESSION_WINDOW = 300
+
     # File Types
     ALLOWED_IMAGE_TYPES = ['jpg', 'jpeg', 'png']
     
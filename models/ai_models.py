@@ -1,87 +1,235 @@
 """
 AI Models management for medical chatbot
 """
-import streamlit as st
+import functools
+import logging
 import torch
 from transformers import AutoImageProcessor, AutoModelForImageClassification
 from config.settings import Config
+from models.prediction_cache import PredictionCache
+from models.inference_server import InferenceClient
+from models.reference_index import ReferenceImageIndex, register_embedding_hook, pop_captured_embedding
+from utils.metrics import VISION_LATENCY, cache_samples, register_collector
+from utils.tracing import get_tracer
 import json
 import os
+
+logger = logging.getLogger(__name__)
+
+@functools.lru_cache(maxsize=None)
+def get_prediction_cache():
+    """Get the process-wide prediction cache shared by all sessions"""
+    cache = PredictionCache(max_entries=Config.PREDICTION_CACHE_SIZE)
+    register_collector("cache:prediction", lambda: cache_samples("prediction", cache.stats()))
+    return cache
+
+@functools.lru_cache(maxsize=None)
+def get_reference_index():
+    """Get the process-wide visual similarity index (None if not built)"""
+    return ReferenceImageIndex.load()
+
+@functools.lru_cache(maxsize=None)
+def _load_local_model():
+    """Load dinov2-skindisease-finetuned model locally (once per process)"""
+    try:
+        processor = AutoImageProcessor.from_pretrained(Config.VISION_MODEL)
+        model = AutoModelForImageClassification.from_pretrained(Config.VISION_MODEL)
+        register_embedding_hook(model)
+        return processor, model
+    except Exception as e:
+        logger.error("Không thể load model: %s", e)
+        return None, None
+
+@functools.lru_cache(maxsize=None)
+def _load_local_processor():
+    """Load only the image processor (used when inference runs out of process)"""
+    try:
+        return AutoImageProcessor.from_pretrained(Config.VISION_MODEL)
+    except Exception as e:
+        logger.error("Không thể load processor: %s", e)
+        return None
+
+@functools.lru_cache(maxsize=None)
+def _get_remote_model_info(socket_path):
+    """
+    Ask the inference server which model it serves (once per process)
+    
+    Failures are not cached, so an unreachable server is asked again next time.
+    """
+    return InferenceClient(socket_path, timeout=Config.INFERENCE_SERVER_TIMEOUT).info()
+
 class VisionModel:
     """Handles skin disease classification model"""
     
     def __init__(self):
         self.processor = None
         self.model = None
-        self._load_model()
+        self.id2label = None
+        self.remote_namespace = None
+        self.prediction_cache = get_prediction_cache()
+        self.inference_client = None
+        if Config.INFERENCE_SERVER_SOCKET:
+            self.inference_client = InferenceClient(
+                Config.INFERENCE_SERVER_SOCKET,
+                timeout=Config.INFERENCE_SERVER_TIMEOUT
+            )
+        else:
+            self._load_model()
         json_path = os.path.join(os.path.dirname(__file__), 'disease_mapping.json')
         with open(json_path, 'r', encoding='utf-8') as f:
             self.name_mapping = json.load(f)
     
-    @st.cache_resource
-    def _load_model(_self):
-        """Load dinov2-skindisease-finetuned model locally"""
-        try:
-            processor = AutoImageProcessor.from_pretrained(Config.VISION_MODEL)
-            model = AutoModelForImageClassification.from_pretrained(Config.VISION_MODEL)
-            return processor, model
-        except Exception as e:
-            st.error(f"Không thể load model: {str(e)}")
-            return None, None
+    def _load_model(self):
+        """Load the vision model in-process (shared by all instances)"""
+        return _load_local_model()
+    
+    def _load_processor(self):
+        """Load only the image processor (shared by all instances)"""
+        return _load_local_processor()
     
     def load_model(self):
         """Initialize the model"""
+        if self.inference_client is not None:
+            try:
+                info = _get_remote_model_info(self.inference_client.socket_path)
+                self.processor = self._load_processor()
+                self.id2label = {int(k): v for k, v in info["id2label"].items()}
+                self.remote_namespace = f"{info['model']}:{info['dtype']}"
+                return
+            except Exception as e:
+                logger.warning("Inference server unavailable, loading model in-process: %s", e)
+                self.inference_client = None
+        
         self.processor, self.model = self._load_model()
+        if self.model is not None:
+            self.id2label = self.model.config.id2label
     
     def is_loaded(self):
         """Check if model is loaded successfully"""
-        return self.processor is not None and self.model is not None
+        if self.processor is None:
+            return False
+        return self.model is not None or self.inference_client is not None
+    
+    def cache_namespace(self):
+        """Identify the loaded model and precision mode for cache invalidation"""
+        if self.model is None:
+            return self.remote_namespace
+        return f"{Config.VISION_MODEL}:{self.model.dtype}"
+    
+    def _run_inference(self, image):
+        """
+        Run preprocessing and the forward pass
+        
+        Uses the shared inference server when configured and falls back to
+        in-process inference if it times out or is unreachable.
+        
+        Args:
+            image: PIL Image object
+            
+        Returns:
+            Tuple of (class probabilities, pooled embedding) NumPy arrays
+        """
+        tracer = get_tracer()
+        # Preprocess image
+        with tracer.span("vision.preprocess"):
+            inputs = self.processor(images=image, return_tensors="pt")
+        
+        if self.inference_client is not None:
+            try:
+                with tracer.span("vision.remote_inference"):
+                    return self.inference_client.infer(inputs["pixel_values"].numpy())
+            except Exception as e:
+                logger.warning("Inference server request failed, falling back to in-process: %s", e)
+                self.inference_client = None
+                self.processor, self.model = self._load_model()
+                if self.model is None:
+                    raise
+        
+        # Inference
+        with tracer.span("vision.forward"), torch.no_grad():
+            outputs = self.model(**inputs)
+            predictions = torch.nn.functional.softmax(outputs.logits, dim=-1)
+        
+        # Pooled embedding captured from the same forward pass
+        embedding = pop_captured_embedding()
+        return predictions[0].float().cpu().numpy(), embedding[0] if embedding is not None else None
     
-    def predict(self, image):
+    def predict(self, image, image_bytes=None, top_k=3, return_embedding=False):
         """
         Analyze skin disease from image
         
         Args:
             image: PIL Image object
+            image_bytes: Optional raw uploaded file bytes, used as cache key
+            top_k: Number of top predictions to return
+            return_embedding: Also return the pooled image embedding
             
         Returns:
-            List of predictions with labels and scores
+            List of predictions with labels and scores, or a tuple of
+            (predictions, embedding) when return_embedding is True
         """
         if not self.is_loaded():
-            return None
+            return (None, None) if return_embedding else None
             
+        tracer = get_tracer()
         try:
-            # Preprocess image
-            inputs = self.processor(images=image, return_tensors="pt")
-            
-            # Inference
-            with torch.no_grad():
-                outputs = self.model(**inputs)
-                predictions = torch.nn.functional.softmax(outputs.logits, dim=-1)
-            
-            # Get top 3 predictions
-            top3_indices = torch.topk(predictions, 3).indices[0]
-            top3_scores = torch.topk(predictions, 3).values[0]
-            
-            # Format results
-            results = []
-            for idx, score in zip(top3_indices, top3_scores):
-                label = self.model.config.id2label[idx.item()]
-                results.append({
-                    'label': label + self.name_mapping.get(label, label),
-                    'score': score.item()
-                })
-            
-            return results
+            with tracer.span("vision.predict") as span:
+                # Look up the full probability vector by image content
+                with tracer.span("vision.cache_lookup"):
+                    self.prediction_cache.set_namespace(self.cache_namespace())
+                    bytes_key = PredictionCache.key_from_bytes(image_bytes) if image_bytes is not None else None
+                    pixels_key = None
+                    if Config.PREDICTION_CACHE_HASH_PIXELS or bytes_key is None:
+                        pixels_key = PredictionCache.key_from_pixels(image)
+                    cached = self.prediction_cache.get(bytes_key, pixels_key)
+                span.set_attribute("cache_hit", cached is not None)
+                
+                if cached is None:
+                    with VISION_LATENCY.time():
+                        cached = self._run_inference(image)
+                    self.prediction_cache.put((bytes_key, pixels_key), cached)
+                
+                probabilities, embedding = cached
+                results = self._format_top_k(probabilities, top_k)
+                return (results, embedding) if return_embedding else results
         except Exception as e:
-            st.error(f"Lỗi khi phân tích ảnh: {str(e)}")
-            return None
+            logger.error("Lỗi khi phân tích ảnh: %s", e)
+            return (None, None) if return_embedding else None
+    
+    def _format_top_k(self, probabilities, top_k):
+        """
+        Format the top-k entries of a probability vector
+        
+        Args:
+            probabilities: NumPy array of class probabilities
+            top_k: Number of predictions to return
+            
+        Returns:
+            List of predictions with labels and scores
+        """
+        top_indices = probabilities.argsort()[::-1][:top_k]
+        
+        results = []
+        for idx in top_indices:
+            label = self.id2label[int(idx)]
+            results.append({
+                'label': label + self.name_mapping.get(label, label),
+                'class_label': label,
+                'score': float(probabilities[idx])
+            })
+        
+        return results
+    
+    def get_cache_stats(self):
+        """Get prediction cache hit/miss statistics"""
+        return self.prediction_cache.stats()
 
 class ModelManager:
     """Central model management class"""
     
     def __init__(self):
         self.vision_model = VisionModel()
+        self.reference_index = get_reference_index()
     
     def initialize_models(self):
         """Initialize all models"""
@@ -89,4 +237,8 @@ class ModelManager:
     
     def get_vision_model(self):
         """Get vision model instance"""
-        return self.vision_model
\ No newline at end of file
+        return self.vision_model
+    
+    def get_reference_index(self):
+        """Get the visual similarity index over reference images (may be None)"""
+        return self.reference_index
\ No newline at end of file
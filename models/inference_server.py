@@ -0,0 +1,244 @@
+"""
+Out-of-process inference server for the vision model
+
+One worker process owns the DINOv2 weights and serves every app process on
+the node over a Unix socket. Preprocessed pixel tensors travel through shared
+memory; only a small JSON header, the probability vector and the pooled
+embedding go over the socket.
+
+Run with:
+    python -m models.inference_server --socket /tmp/vision.sock --threads 4
+"""
+import argparse
+import json
+import os
+import socket
+import socketserver
+import struct
+import sys
+import threading
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+# Allow running as a script from the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import Config
+from models.reference_index import register_embedding_hook, pop_captured_embedding
+
+_HEADER = struct.Struct("!I")
+
+def send_frame(sock, payload):
+    """Send a length-prefixed JSON frame"""
+    data = json.dumps(payload).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+def recv_frame(sock):
+    """Receive a length-prefixed JSON frame"""
+    header = _recv_exact(sock, _HEADER.size)
+    (length,) = _HEADER.unpack(header)
+    return json.loads(_recv_exact(sock, length).decode("utf-8"))
+
+def _recv_exact(sock, size):
+    """Read exactly size bytes from a socket"""
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError("Inference socket closed unexpectedly")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+def _attach_shared_memory(name):
+    """Attach to a client-owned shared memory block without tracking it"""
+    shm = shared_memory.SharedMemory(name=name)
+    # The client owns and unlinks the block; stop this process's resource
+    # tracker from unlinking it again on exit
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return shm
+
+class InferenceClient:
+    """Thin client for the inference server"""
+
+    def __init__(self, socket_path, timeout=10.0):
+        """
+        Initialize the client
+
+        Args:
+            socket_path: Path of the server's Unix socket
+            timeout: Per-request socket timeout in seconds
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def _request(self, payload):
+        """Send one request and wait for its response"""
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            send_frame(sock, payload)
+            response = recv_frame(sock)
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response
+
+    def info(self):
+        """
+        Get model information from the server
+
+        Returns:
+            Dictionary with model name, dtype and id2label mapping
+        """
+        return self._request({"op": "info"})
+
+    def infer(self, pixel_values):
+        """
+        Run inference on preprocessed pixel values
+
+        Args:
+            pixel_values: NumPy array of shape (batch, channels, height, width)
+
+        Returns:
+            Tuple of (class probabilities, pooled embedding) NumPy arrays for
+            the first image
+        """
+        pixel_values = np.ascontiguousarray(pixel_values, dtype=np.float32)
+        shm = shared_memory.SharedMemory(create=True, size=pixel_values.nbytes)
+        try:
+            np.ndarray(pixel_values.shape, dtype=np.float32, buffer=shm.buf)[:] = pixel_values
+            response = self._request({
+                "op": "predict",
+                "shm": shm.name,
+                "shape": list(pixel_values.shape),
+            })
+        finally:
+            shm.close()
+            shm.unlink()
+        embedding = response.get("embedding")
+        return (
+            np.asarray(response["probabilities"], dtype=np.float32),
+            np.asarray(embedding, dtype=np.float32) if embedding is not None else None,
+        )
+
+class InferenceServer:
+    """Owns the vision model and serves predictions over a Unix socket"""
+
+    def __init__(self, socket_path, num_threads=None, cpus=None):
+        """
+        Initialize the server
+
+        Args:
+            socket_path: Path of the Unix socket to listen on
+            num_threads: Number of torch intra-op threads
+            cpus: Optional list of CPU ids to pin the process to
+        """
+        self.socket_path = socket_path
+        self.num_threads = num_threads
+        self.cpus = cpus
+        self.model = None
+        self._lock = threading.Lock()
+        self._server = None
+
+    def load(self):
+        """Pin threads and load the model weights"""
+        import torch
+        from transformers import AutoModelForImageClassification
+
+        if self.cpus:
+            os.sched_setaffinity(0, self.cpus)
+        if self.num_threads:
+            torch.set_num_threads(self.num_threads)
+
+        self.model = AutoModelForImageClassification.from_pretrained(Config.VISION_MODEL)
+        self.model.eval()
+        register_embedding_hook(self.model)
+
+    def handle(self, request):
+        """
+        Handle a decoded request
+
+        Args:
+            request: Request dictionary
+
+        Returns:
+            Response dictionary
+        """
+        import torch
+
+        op = request.get("op")
+        if op == "info":
+            return {
+                "model": Config.VISION_MODEL,
+                "dtype": str(self.model.dtype),
+                "id2label": {str(k): v for k, v in self.model.config.id2label.items()},
+            }
+
+        if op == "predict":
+            shm = _attach_shared_memory(request["shm"])
+            try:
+                pixel_values = np.ndarray(tuple(request["shape"]), dtype=np.float32, buffer=shm.buf)
+                # Copy out of the shared block so it can be released immediately
+                tensor = torch.from_numpy(pixel_values.copy())
+            finally:
+                shm.close()
+
+            with self._lock, torch.no_grad():
+                outputs = self.model(pixel_values=tensor.to(self.model.dtype))
+                predictions = torch.nn.functional.softmax(outputs.logits, dim=-1)
+            embedding = pop_captured_embedding()
+            return {
+                "probabilities": predictions[0].float().tolist(),
+                "embedding": embedding[0].tolist() if embedding is not None else None,
+            }
+
+        return {"error": f"Unknown op: {op}"}
+
+    def serve_forever(self):
+        """Listen on the Unix socket until interrupted"""
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        inference_server = self
+
+        class RequestHandler(socketserver.BaseRequestHandler):
+            def handle(self):
+                try:
+                    response = inference_server.handle(recv_frame(self.request))
+                except Exception as e:
+                    response = {"error": str(e)}
+                send_frame(self.request, response)
+
+        with socketserver.ThreadingUnixStreamServer(self.socket_path, RequestHandler) as server:
+            self._server = server
+            print(f"Vision inference server listening on {self.socket_path}")
+            try:
+                server.serve_forever()
+            finally:
+                self._server = None
+                os.unlink(self.socket_path)
+
+    def shutdown(self):
+        """Stop serve_forever() running on another thread"""
+        if self._server is not None:
+            self._server.shutdown()
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Shared vision model inference server")
+    parser.add_argument("--socket", default=Config.INFERENCE_SERVER_SOCKET or "/tmp/medical-chatbot-vision.sock")
+    parser.add_argument("--threads", type=int, default=Config.INFERENCE_SERVER_THREADS)
+    parser.add_argument("--cpus", default="", help="Comma-separated CPU ids to pin to, e.g. 0,1,2,3")
+    args = parser.parse_args()
+
+    cpus = [int(cpu) for cpu in args.cpus.split(",") if cpu.strip()]
+    server = InferenceServer(args.socket, num_threads=args.threads, cpus=cpus or None)
+    server.load()
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
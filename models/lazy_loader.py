@@ -0,0 +1,83 @@
+"""
+Lazy, background-preloaded access to the vision model stack
+
+Importing models.ai_models pulls in torch and transformers and loads the
+DINOv2 weights. Chat-only sessions never need them, so the app goes through
+this proxy instead: nothing heavy is imported until the preload is started
+or diagnosis actually needs the model. Config.VISION_PRELOAD decides when
+the preload starts: when the user opens diagnosis mode ("intent"), or after
+the first page render of every session ("startup"). The load itself runs
+on the startup orchestrator, concurrently with the other resources.
+"""
+import streamlit as st
+
+from config.settings import Config
+from services.startup import Resource, get_startup_orchestrator
+
+class LazyModelManager:
+    """Proxy for the ModelManager built by the startup orchestrator"""
+
+    RESOURCE = "vision_models"
+
+    def __init__(self, orchestrator, preload=None):
+        """
+        Initialize the proxy
+
+        Args:
+            orchestrator: Startup orchestrator with the vision stack registered
+            preload: "intent" or "startup" (default: Config.VISION_PRELOAD)
+        """
+        self.orchestrator = orchestrator
+        self.preload = preload or Config.VISION_PRELOAD
+
+    def start_preload(self):
+        """Start loading the vision stack in the background (idempotent)"""
+        self.orchestrator.start([self.RESOURCE])
+
+    def on_page_rendered(self):
+        """Start the preload after a page render if preloading at startup"""
+        if self.preload == "startup":
+            self.start_preload()
+
+    def on_diagnosis_intent(self):
+        """Start the preload when the user is about to need the model"""
+        self.start_preload()
+
+    def is_deferred(self):
+        """Check if the load waits for diagnosis intent and has not started yet"""
+        status = self.orchestrator.readiness()["resources"][self.RESOURCE]["status"]
+        return self.preload == "intent" and status == Resource.PENDING
+
+    def is_ready(self):
+        """Check if the background load has finished (successfully or not)"""
+        return self.orchestrator.is_finished(self.RESOURCE)
+
+    def wait(self, timeout=None):
+        """
+        Block until the vision stack is loaded
+
+        Args:
+            timeout: Maximum seconds to wait, or None to wait indefinitely
+
+        Returns:
+            ModelManager instance, or None if loading failed or timed out
+        """
+        try:
+            return self.orchestrator.get(self.RESOURCE, timeout=timeout)
+        except Exception as e:
+            print(f"Error preloading vision model: {str(e)}")
+            return None
+
+    def get_model_manager(self):
+        """Get the ModelManager if already loaded, without blocking"""
+        return self.orchestrator.peek(self.RESOURCE)
+
+    @property
+    def load_seconds(self):
+        """Seconds the vision stack took to load (None until finished)"""
+        return self.orchestrator.readiness()["resources"][self.RESOURCE]["seconds"]
+
+@st.cache_resource
+def get_lazy_model_manager():
+    """Get the process-wide lazy model manager shared by all sessions"""
+    return LazyModelManager(get_startup_orchestrator())
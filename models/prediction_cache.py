@@ -0,0 +1,140 @@
+"""
+Prediction cache for the vision model
+"""
+import hashlib
+import itertools
+import threading
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """
+    Bounded LRU cache of full model outputs keyed on image content
+
+    An image can be stored under several keys (raw bytes and decoded
+    pixels); the keys are aliases of one entry, so max_entries counts images.
+    """
+
+    def __init__(self, max_entries=128):
+        """
+        Initialize the cache
+
+        Args:
+            max_entries: Maximum number of cached predictions
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # entry id -> (value, keys)
+        self._aliases = {}  # key -> entry id
+        self._ids = itertools.count()
+        self._namespace = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key_from_bytes(data):
+        """Build a cache key from the raw uploaded file bytes"""
+        return "bytes:" + hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def key_from_pixels(image):
+        """Build a cache key from the decoded pixels of a PIL image"""
+        digest = hashlib.sha256()
+        digest.update(f"{image.mode}:{image.size}".encode("utf-8"))
+        digest.update(image.tobytes())
+        return "pixels:" + digest.hexdigest()
+
+    def set_namespace(self, namespace):
+        """
+        Bind the cache to a model/precision combination
+
+        Cached vectors are only valid for the model that produced them, so
+        switching to a different namespace drops every entry.
+
+        Args:
+            namespace: String identifying the model and its precision mode
+        """
+        with self._lock:
+            if namespace != self._namespace:
+                self._entries.clear()
+                self._aliases.clear()
+                self._namespace = namespace
+
+    def get(self, *keys):
+        """
+        Look up cached model outputs
+
+        Args:
+            keys: Candidate keys, tried in order (None values are skipped)
+
+        Returns:
+            Cached entry or None
+        """
+        with self._lock:
+            for key in keys:
+                entry_id = self._aliases.get(key) if key is not None else None
+                if entry_id is not None:
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return self._entries[entry_id][0]
+            self.misses += 1
+            return None
+
+    def put(self, keys, entry):
+        """
+        Store an entry under one or more keys
+
+        The keys are aliases of a single entry, which counts once towards
+        max_entries.
+
+        Args:
+            keys: Keys to store the entry under (None values are skipped)
+            entry: Cached value (full probability vector and embedding)
+        """
+        keys = [key for key in keys if key is not None]
+        if not keys:
+            return
+        with self._lock:
+            for key in keys:
+                self._unlink(key)
+            entry_id = next(self._ids)
+            self._entries[entry_id] = (entry, keys)
+            for key in keys:
+                self._aliases[key] = entry_id
+            while len(self._entries) > self.max_entries:
+                _, (_, evicted_keys) = self._entries.popitem(last=False)
+                for key in evicted_keys:
+                    self._aliases.pop(key, None)
+
+    def _unlink(self, key):
+        """Detach a key from its entry, dropping the entry once it has no keys left"""
+        entry_id = self._aliases.pop(key, None)
+        if entry_id is None:
+            return
+        _, entry_keys = self._entries[entry_id]
+        entry_keys.remove(key)
+        if not entry_keys:
+            del self._entries[entry_id]
+
+    def clear(self):
+        """Drop all cached entries"""
+        with self._lock:
+            self._entries.clear()
+            self._aliases.clear()
+
+    def stats(self):
+        """
+        Get cache hit/miss statistics
+
+        Returns:
+            Dictionary with hits, misses, hit rate and size
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+            }
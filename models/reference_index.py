@@ -0,0 +1,199 @@
+"""
+Visual similarity index over the reference disease images
+
+The offline step embeds every image in database/disease_images with the
+classifier backbone and stores the L2-normalized vectors in a memory-mapped
+NumPy matrix. At diagnosis time the pooled embedding captured during the
+prediction forward pass is compared against this matrix with a brute-force
+cosine top-k.
+
+Build with:
+    python -m models.reference_index
+"""
+import json
+import os
+import sys
+import threading
+
+import numpy as np
+
+# Allow running as a script from the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import Config
+
+WORKSPACE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMAGES_DIR = os.path.join(WORKSPACE_ROOT, "database", "disease_images")
+MATRIX_PATH = os.path.join(WORKSPACE_ROOT, "database", "reference_embeddings.npy")
+METADATA_PATH = os.path.join(WORKSPACE_ROOT, "database", "reference_embeddings.json")
+
+_captured = threading.local()
+
+def register_embedding_hook(model):
+    """
+    Capture the classifier input (pooled embedding) on every forward pass
+
+    The hook is registered once per model and writes to thread-local storage,
+    so concurrent predictions on a shared model do not see each other's output.
+
+    Args:
+        model: Image classification model with a `classifier` head
+    """
+    if getattr(model, "_embedding_hook_registered", False):
+        return
+
+    def hook(module, args):
+        _captured.embedding = args[0].detach()
+
+    model.classifier.register_forward_pre_hook(hook)
+    model._embedding_hook_registered = True
+
+def pop_captured_embedding():
+    """
+    Get the pooled embedding captured by the last forward pass on this thread
+
+    Returns:
+        NumPy array of shape (batch, dim) or None
+    """
+    embedding = getattr(_captured, "embedding", None)
+    _captured.embedding = None
+    if embedding is None:
+        return None
+    return embedding.float().cpu().numpy()
+
+def _label_from_filename(filename):
+    """Get the class label from a reference image filename like 'Melanoma_1.jpg'"""
+    return os.path.splitext(filename)[0].rsplit("_", 1)[0]
+
+class ReferenceImageIndex:
+    """Brute-force cosine similarity search over reference image embeddings"""
+
+    def __init__(self, matrix, paths, labels):
+        """
+        Initialize the index
+
+        Args:
+            matrix: (n, dim) array of L2-normalized embeddings
+            paths: Absolute image paths, one per row
+            labels: Class labels, one per row
+        """
+        self.matrix = matrix
+        self.paths = paths
+        self.labels = np.asarray(labels)
+
+    @classmethod
+    def load(cls, matrix_path=MATRIX_PATH, metadata_path=METADATA_PATH):
+        """
+        Load the index built by the offline step
+
+        Args:
+            matrix_path: Path of the embedding matrix
+            metadata_path: Path of the image paths and labels
+
+        Returns:
+            ReferenceImageIndex or None if it has not been built for the
+            configured vision model
+        """
+        if not (os.path.exists(matrix_path) and os.path.exists(metadata_path)):
+            return None
+
+        try:
+            with open(metadata_path, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+            if metadata.get("model") != Config.VISION_MODEL:
+                print("Reference embeddings were built for a different model, ignoring")
+                return None
+
+            matrix = np.load(matrix_path, mmap_mode="r")
+            paths = [os.path.join(WORKSPACE_ROOT, path) for path in metadata["paths"]]
+            return cls(matrix, paths, metadata["labels"])
+        except Exception as e:
+            print(f"Error loading reference embeddings: {str(e)}")
+            return None
+
+    def most_similar(self, embedding, k=3, labels=None):
+        """
+        Find the reference images most similar to an embedding
+
+        Args:
+            embedding: 1-D query embedding from the same backbone
+            k: Number of images to return
+            labels: Optional class labels to restrict the search to
+
+        Returns:
+            List of absolute image paths, most similar first
+        """
+        query = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+
+        scores = self.matrix @ (query / norm)
+
+        if labels:
+            mask = np.isin(self.labels, list(labels))
+            if mask.any():
+                scores = np.where(mask, scores, -np.inf)
+
+        k = min(k, len(scores))
+        top_indices = np.argpartition(-scores, k - 1)[:k]
+        top_indices = top_indices[np.argsort(-scores[top_indices])]
+        return [self.paths[i] for i in top_indices if np.isfinite(scores[i])]
+
+def build_index(batch_size=8, images_dir=IMAGES_DIR, matrix_path=MATRIX_PATH, metadata_path=METADATA_PATH,
+                processor=None, model=None):
+    """
+    Embed every reference image and write the memory-mapped matrix
+
+    Args:
+        batch_size: Number of images per forward pass
+        images_dir: Directory of the reference images
+        matrix_path: Path of the embedding matrix to write
+        metadata_path: Path of the image paths and labels to write
+        processor: Image processor (defaults to Config.VISION_MODEL's)
+        model: Image classification model (defaults to Config.VISION_MODEL)
+    """
+    import torch
+    from PIL import Image
+
+    if processor is None or model is None:
+        from transformers import AutoImageProcessor, AutoModelForImageClassification
+        processor = AutoImageProcessor.from_pretrained(Config.VISION_MODEL)
+        model = AutoModelForImageClassification.from_pretrained(Config.VISION_MODEL)
+    model.eval()
+    register_embedding_hook(model)
+
+    filenames = sorted(
+        name for name in os.listdir(images_dir)
+        if name.lower().endswith(('.jpg', '.jpeg', '.png'))
+    )
+
+    embeddings = []
+    for i in range(0, len(filenames), batch_size):
+        batch = filenames[i:i+batch_size]
+        images = [Image.open(os.path.join(images_dir, name)).convert("RGB") for name in batch]
+        inputs = processor(images=images, return_tensors="pt")
+        with torch.no_grad():
+            model(**inputs)
+        embeddings.append(pop_captured_embedding())
+        print(f"Embedded {min(i + batch_size, len(filenames))}/{len(filenames)} images")
+
+    vectors = np.concatenate(embeddings).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    matrix = np.lib.format.open_memmap(matrix_path, mode="w+", dtype=np.float32, shape=vectors.shape)
+    matrix[:] = vectors
+    matrix.flush()
+
+    metadata = {
+        "model": Config.VISION_MODEL,
+        "paths": [os.path.relpath(os.path.join(images_dir, name), WORKSPACE_ROOT) for name in filenames],
+        "labels": [_label_from_filename(name) for name in filenames],
+    }
+    with open(metadata_path, 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2)
+
+    print(f"Successfully indexed {len(filenames)} reference images ({vectors.shape[1]} dims)")
+
+if __name__ == "__main__":
+    build_index()
@@ -1,23 +1,58 @@
 """
 Chat service for handling GPT-OSS interactions with RAG support
 """
+import time
 import requests
 from config.settings import Config
-from openai import OpenAI
+from openai import OpenAI, RateLimitError
+from utils.metrics import LLM_LATENCY, record_llm_error
+from utils.token_usage import get_usage_ledger, measure_prompt
+from utils.tracing import get_tracer
 
 class ChatService:
     """Service for handling chat interactions with GPT-OSS and RAG"""
+    
+    BASE_SYSTEM_PROMPT = """Nếu người dùng gửi ảnh, bỏ qua system prompt này luôn!
+                Bạn là một chuyên viên da liễu. Bạn có khả năng:
+
+                - Tư vấn về các vấn đề da liễu thường gặp
+                - Giải thích các triệu chứng và nguyên nhân
+                - Đưa ra lời khuyên chăm sóc da cơ bản
+                - Hướng dẫn phòng ngừa bệnh da
+                - Giải đáp thắc mắc về sức khỏe da
 
-    def __init__(self):
+                Lưu ý quan trọng:
+                - Hạn chế trả lời và hướng cuộc trò chuyện tới nội dung da liễu nếu cảm giác người dùng lệch hướng.
+                - Luôn nhắc nhở rằng lời khuyên chỉ mang tính tham khảo
+                - Khuyên bệnh nhân đến gặp bác sĩ trực tiếp khi cần thiết
+                - Không thay thế chẩn đoán y tế chuyên nghiệp
+                - Trả lời một cách thân thiện, chuyên nghiệp và dễ hiểu
+
+                Hãy trò chuyện bằng tiếng Việt và giữ giọng điệu chuyên nghiệp nhưng gần gũi."""
+    
+    # Time of the last upstream rate-limit error seen by any instance
+    last_rate_limited_at = 0.0
+    # Functions called (without arguments) whenever a rate-limit error is seen
+    rate_limit_listeners = []
+
+    def __init__(self, rag_service=None):
+        """
+        Initialize the chat service
+        
+        Args:
+            rag_service: Optional RAGService to share; a new one is created if omitted
+        """
         self.api_key = Config.OPENROUTER_API_KEY
         self.api_url = Config.OPENROUTER_URL
         self.client = OpenAI(
             base_url=self.api_url,
             api_key=self.api_key
         )
-        # Initialize RAG service - import here to avoid circular import
-        from services.rag_service import RAGService
-        self.rag_service = RAGService()
+        if rag_service is None:
+            # Initialize RAG service - import here to avoid circular import
+            from services.rag_service import RAGService
+            rag_service = RAGService()
+        self.rag_service = rag_service
     
     def send_message(self, messages, user_query: str = ""):
         """
@@ -30,62 +65,199 @@ class ChatService:
         Returns:
             Tuple of (response_text, list_of_image_paths_or_None)
         """
-        # Base system prompt
-        base_system_prompt = """Nếu người dùng gửi ảnh, bỏ qua system prompt này luôn!
-                Bạn là một chuyên viên da liễu. Bạn có khả năng:
-
-                - Tư vấn về các vấn đề da liễu thường gặp
-                - Giải thích các triệu chứng và nguyên nhân
-                - Đưa ra lời khuyên chăm sóc da cơ bản
-                - Hướng dẫn phòng ngừa bệnh da
-                - Giải đáp thắc mắc về sức khỏe da
-
-                Lưu ý quan trọng:
-                - Hạn chế trả lời và hướng cuộc trò chuyện tới nội dung da liễu nếu cảm giác người dùng lệch hướng.
-                - Luôn nhắc nhở rằng lời khuyên chỉ mang tính tham khảo
-                - Khuyên bệnh nhân đến gặp bác sĩ trực tiếp khi cần thiết
-                - Không thay thế chẩn đoán y tế chuyên nghiệp
-                - Trả lời một cách thân thiện, chuyên nghiệp và dễ hiểu
+        try:
+            with get_tracer().span("chat.send_message"):
+                return self.generate_response(messages, user_query=user_query)
+        except Exception as e:
+            return f"Lỗi khi gọi API: {str(e)}", None
+    
+    @classmethod
+    def record_rate_limit(cls):
+        """Remember an upstream rate-limit error and notify the listeners"""
+        cls.last_rate_limited_at = time.time()
+        for listener in list(cls.rate_limit_listeners):
+            try:
+                listener()
+            except Exception as e:
+                print(f"Error in rate limit listener: {str(e)}")
+    
+    @classmethod
+    def is_rate_limited(cls, cooldown):
+        """
+        Check if an upstream rate-limit error was seen recently
+        
+        Args:
+            cooldown: Seconds a rate-limit error counts as recent
+        """
+        return time.time() - cls.last_rate_limited_at < cooldown
+    
+    def generate_response(self, messages, user_query: str = ""):
+        """
+        Generate a response like send_message, but raise on API errors
+        
+        Args:
+            messages: List of conversation messages
+            user_query: Current user query for RAG context retrieval
+            
+        Returns:
+            Tuple of (response_text, list_of_image_paths_or_None)
+        """
+        enhanced_prompt, relevant_images = self.prepare_system_prompt(user_query)
 
-                Hãy trò chuyện bằng tiếng Việt và giữ giọng điệu chuyên nghiệp nhưng gần gũi."""
+        with get_tracer().span("llm.completion", model=Config.LLM_MODEL), \
+                LLM_LATENCY.time(kind="completion"):
+            try:
+                response = self.client.chat.completions.create(
+                    model=Config.LLM_MODEL,
+                    messages=[{"role": "system", "content": enhanced_prompt}] + messages,
+                    temperature=Config.TEMPERATURE,
+                    max_tokens=Config.MAX_TOKENS
+                )
+            except Exception as e:
+                if isinstance(e, RateLimitError):
+                    ChatService.record_rate_limit()
+                record_llm_error(e)
+                raise
+        message = response.choices[0].message
+        self._record_usage(enhanced_prompt, messages, message.content, getattr(message, "reasoning", None),
+                           response.usage, self._classify_intent(user_query))
+        return self._extract_final_text(message.content), relevant_images
+    
+    def prepare_system_prompt(self, user_query: str = ""):
+        """
+        Build the system prompt, enhanced with RAG if a user query is provided
         
-        # Enhance system prompt with RAG if user query is provided
-        relevant_images = None
+        Args:
+            user_query: Current user query for RAG context retrieval
+            
+        Returns:
+            Tuple of (system prompt, list_of_image_paths_or_None)
+        """
         if user_query:
-            enhanced_prompt, relevant_images = self.rag_service.enhance_prompt_with_rag(user_query, base_system_prompt)
-        else:
-            enhanced_prompt = base_system_prompt
+            return self.rag_service.enhance_prompt_with_rag(user_query, self.BASE_SYSTEM_PROMPT)
+        return self.BASE_SYSTEM_PROMPT, None
+    
+    def build_system_prompt(self, context):
+        """
+        Build the system prompt from disease context that was already retrieved
         
-        system_prompt = {
-            "role": "system",
-            "content": enhanced_prompt
-        }
-        messages = [system_prompt] + messages
-
+        Args:
+            context: Retrieved RAG context or None
+            
+        Returns:
+            System prompt string
+        """
+        return self.rag_service.apply_context(self.BASE_SYSTEM_PROMPT, context)
+    
+    def stream_response(self, messages, system_prompt, intent=None):
+        """
+        Stream a response from GPT-OSS
+        
+        Yields the cleaned answer text received so far (not just the new
+        delta), because a reasoning preamble before the "assistantfinal"
+        marker is dropped as soon as the marker arrives.
+        
+        Args:
+            messages: List of conversation messages
+            system_prompt: Complete system prompt
+            intent: Intent recorded with the token usage (default: routed
+                from the last user message)
+            
+        Yields:
+            str: Answer text so far
+        """
+        # Generators run in their consumer's context, so the spans are
+        # recorded with explicit timings instead of a context manager
+        tracer = get_tracer()
+        parent = tracer.current_span()
+        requested_ns = time.time_ns()
+        requested = time.perf_counter()
+        error = None
+        response_content = ""
+        reasoning = ""
+        usage = None
         try:
-            response = self.client.chat.completions.create(
+            stream = self.client.chat.completions.create(
                 model=Config.LLM_MODEL,
-                messages=messages,
+                messages=[{"role": "system", "content": system_prompt}] + messages,
                 temperature=Config.TEMPERATURE,
-                max_tokens=Config.MAX_TOKENS
+                max_tokens=Config.MAX_TOKENS,
+                stream=True
             )
-            response_content = response.choices[0].message.content
-
-            marker = "assistantfinal"
-            idx = response_content.lower().find(marker)  # tìm marker, không phân biệt hoa thường
-
-            if idx != -1:
-                # lấy text ngay sau marker
-                final_text = response_content[idx + len(marker):].strip()
-            else:
-                # nếu không có marker thì dùng toàn bộ content
-                final_text = response_content.strip()
-
-            return final_text, relevant_images
+            for chunk in stream:
+                # OpenRouter sends the usage block with the last chunk
+                usage = getattr(chunk, "usage", None) or usage
+                if not chunk.choices:
+                    continue
+                reasoning += getattr(chunk.choices[0].delta, "reasoning", None) or ""
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if not response_content:
+                        tracer.record_span("llm.first_token", requested_ns, time.time_ns(), parent=parent)
+                        LLM_LATENCY.observe(time.perf_counter() - requested, kind="first_token")
+                    response_content += delta
+                    yield self._extract_final_text(response_content)
         except Exception as e:
-            return f"Lỗi khi gọi API: {str(e)}", None
+            if isinstance(e, RateLimitError):
+                ChatService.record_rate_limit()
+            record_llm_error(e)
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            LLM_LATENCY.observe(time.perf_counter() - requested, kind="stream")
+            tracer.record_span("llm.stream", requested_ns, time.time_ns(), parent=parent,
+                               model=Config.LLM_MODEL, error=error)
+            if error is None:
+                if intent is None:
+                    last_query = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+                    intent = self._classify_intent(last_query)
+                self._record_usage(system_prompt, messages, response_content, reasoning, usage, intent)
+    
+    def _classify_intent(self, user_query):
+        """Get the intent of a chat turn from the knowledge base routing"""
+        return (self.rag_service.route_query(user_query) if user_query else None) or "small_talk"
+    
+    def _record_usage(self, system_prompt, messages, content, reasoning, usage, intent):
+        """
+        Record the token usage of an LLM call
+        
+        Args:
+            system_prompt: Complete system prompt sent
+            messages: Conversation messages sent after the system prompt
+            content: Raw response content, including any reasoning preamble
+            reasoning: Reasoning text returned separately (may be None)
+            usage: The provider's usage block (may be None)
+            intent: Intent of the turn
+        """
+        preamble, answer = self._split_reasoning(content or "")
+        get_usage_ledger().record(
+            measure_prompt(system_prompt, messages, self.BASE_SYSTEM_PROMPT),
+            completion_text=answer,
+            reasoning_text=(reasoning or "") + preamble,
+            provider_usage=usage,
+            intent=intent,
+            model=Config.LLM_MODEL
+        )
+    
+    @staticmethod
+    def _split_reasoning(response_content):
+        """Split a response into its reasoning preamble and the answer"""
+        marker = "assistantfinal"
+        idx = response_content.lower().find(marker)  # tìm marker, không phân biệt hoa thường
+
+        if idx != -1:
+            # lấy text ngay sau marker
+            return response_content[:idx], response_content[idx + len(marker):].strip()
+        # nếu không có marker thì dùng toàn bộ content
+        return "", response_content.strip()
+    
+    @staticmethod
+    def _extract_final_text(response_content):
+        """Strip the model's reasoning preamble from a response"""
+        return ChatService._split_reasoning(response_content)[1]
     
-    def prepare_messages_for_api(self, chat_history):
+    @staticmethod
+    def prepare_messages_for_api(chat_history):
         """
         Prepare chat history for API call (exclude images)
         
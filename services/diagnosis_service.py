@@ -1,98 +1,162 @@
 """
 Diagnosis service for handling medical image analysis
 """
-import streamlit as st
-from PIL import Image
+import hashlib
 from services.chat_service import ChatService
 from config.settings import Config
+from utils.image_assets import encode_history_image
+from utils.metrics import REQUESTS
+from utils.tracing import get_tracer
 
 class DiagnosisService:
     """Service for handling medical diagnosis workflow"""
     
-    def __init__(self, vision_model):
+    def __init__(self, vision_model, reference_index=None, chat_service=None):
         self.vision_model = vision_model
-        self.chat_service = ChatService()
+        self.reference_index = reference_index
+        self.chat_service = chat_service or ChatService()
     
-    def process_image_diagnosis(self, image, chat_history):
+    def process_image_diagnosis(self, image, chat_history, image_bytes=None, progress_callback=None,
+                                partial_callback=None, release_image=False):
         """
         Complete workflow for image diagnosis
         
+        The stages are pipelined: predictions and reference images are
+        published as soon as inference finishes, knowledge for all candidate
+        labels is retrieved concurrently, and the explanation is published
+        while it streams in.
+        
         Args:
             image: PIL Image object
             chat_history: Current chat history
+            image_bytes: Optional raw uploaded file bytes for prediction caching
+            progress_callback: Optional function called with progress messages
+            partial_callback: Optional function called with keyword arguments
+                `predictions`, `images` and `text` as they become available
+            release_image: Close the image right after inference; the later
+                stages only use the predictions and the embedding
             
         Returns:
             Tuple of (success: bool, response_message: str, diagnosis_images: list or None)
         """
+        report_progress = progress_callback or (lambda message: None)
+        report_partial = partial_callback or (lambda **fields: None)
+        REQUESTS.inc(intent="diagnosis")
+        
         # Step 1: Analyze image with vision model
-        predictions = self.vision_model.predict(image)
+        report_progress("Đang phân tích ảnh...")
+        try:
+            predictions, embedding = self.vision_model.predict(
+                image, image_bytes=image_bytes, return_embedding=True
+            )
+        finally:
+            if release_image:
+                image.close()
         
         if not predictions:
-            return False, Config.ERROR_MESSAGE
+            return False, Config.ERROR_MESSAGE, None
         
-        # Step 2: Create diagnosis prompt
-        diagnosis_prompt = self.chat_service.create_diagnosis_prompt(predictions)
+        # Step 2: Show the predictions and the reference images that look
+        # most like the user's photo right away
+        with get_tracer().span("diagnosis.similar_images"):
+            diagnosis_images = self._find_similar_reference_images(embedding, predictions)
+        report_partial(predictions=predictions, images=diagnosis_images)
         
-        # Step 3: Get explanation from GPT-OSS with RAG enhancement
         try:
-            messages_for_api = [{"role": "user", "content": diagnosis_prompt}]
-            # Use RAG for diagnosis context by passing the disease names from predictions
-            disease_query = " ".join([pred['label'] for pred in predictions])
-            response, diagnosis_images = self.chat_service.send_message(messages_for_api, user_query=disease_query)
+            # Step 3: Retrieve knowledge for every candidate label concurrently
+            report_progress("Đang tra cứu thông tin...")
+            labels = [pred['label'] for pred in predictions]
+            context, rag_images = self.chat_service.rag_service.retrieve_context_for_labels(labels)
+            if not diagnosis_images and rag_images:
+                diagnosis_images = rag_images
+                report_partial(images=diagnosis_images)
+            
+            # Step 4: Stream the explanation from GPT-OSS
+            report_progress("Đang tạo báo cáo...")
+            system_prompt = self.chat_service.build_system_prompt(context)
+            messages_for_api = [{"role": "user", "content": self.chat_service.create_diagnosis_prompt(predictions)}]
+            response = ""
+            for response in self.chat_service.stream_response(messages_for_api, system_prompt,
+                                                               intent="diagnosis"):
+                report_partial(text=response)
+            
             return True, response, diagnosis_images
         except Exception as e:
             return False, f"Lỗi khi tạo báo cáo: {str(e)}", None
     
-    def add_diagnosis_to_chat(self, image, chat_history):
+    def run_diagnosis_job(self, image, image_bytes=None, progress_callback=None, partial_callback=None):
         """
-        Add diagnosis request to chat history
+        Run the diagnosis pipeline as a background job
+        
+        The chat history keeps only the thumbnail made by add_diagnosis_to_chat,
+        so the full-resolution image is closed right after inference instead
+        of being held through retrieval and the LLM stream.
         
         Args:
             image: PIL Image object
-            chat_history: Current chat history list
+            image_bytes: Optional raw uploaded file bytes for prediction caching
+            progress_callback: Optional function called with progress messages
+            partial_callback: Optional function called with partial results
+            
+        Returns:
+            Tuple of (success, response_message, diagnosis_images, primary_disease)
         """
-        chat_history.append({
-            "role": "user", 
-            "content": Config.DIAGNOSIS_USER_MESSAGE,
-            "image": image
-        })
+        try:
+            with get_tracer().span("diagnosis.job") as span:
+                success, response_message, diagnosis_images = self.process_image_diagnosis(
+                    image, [], image_bytes=image_bytes, progress_callback=progress_callback,
+                    partial_callback=partial_callback, release_image=True
+                )
+                span.set_attribute("success", success)
+        finally:
+            # Already closed after inference unless the pipeline failed before it
+            image.close()
+        
+        primary_disease = self._extract_primary_disease_from_response(response_message) if success else None
+        return success, response_message, diagnosis_images, primary_disease
     
-    def display_diagnosis_in_chat(self, image, response_message, chat_history, diagnosis_images=None):
+    def _find_similar_reference_images(self, embedding, predictions, k=3):
         """
-        Display diagnosis results in chat interface
+        Select reference images by visual similarity to the uploaded image
+        
+        Args:
+            embedding: Pooled embedding from the prediction forward pass
+            predictions: Top predictions, used to restrict candidate classes
+            k: Number of images to return
+            
+        Returns:
+            List of image paths or None if the index is unavailable
+        """
+        if self.reference_index is None or embedding is None:
+            return None
+        
+        labels = [pred['class_label'] for pred in predictions]
+        return self.reference_index.most_similar(embedding, k=k, labels=labels) or None
+    
+    @staticmethod
+    def add_diagnosis_to_chat(image, chat_history, image_bytes=None):
+        """
+        Add diagnosis request to chat history
+        
+        Only a compact encoded thumbnail and a content hash are stored; the
+        full-resolution pixels are not kept in session state.
         
         Args:
             image: PIL Image object
-            response_message: Response from diagnosis
             chat_history: Current chat history list
-            diagnosis_images: List of relevant disease images
+            image_bytes: Optional raw uploaded file bytes, used for the content hash
             
         Returns:
-            str: Disease name for quick question if found, None otherwise
+            Encoded thumbnail bytes for display
         """
-        # Import here to avoid circular import
-        from ui.components import UIComponents
-        
-        # Display user message with image
-        with st.chat_message("user"):
-            st.image(image, width=Config.IMAGE_WIDTH)
-            st.markdown(Config.DIAGNOSIS_USER_MESSAGE)
-        
-        # Display assistant response
-        with st.chat_message("assistant"):
-            # Show relevant disease images first if available
-            if diagnosis_images:
-                st.markdown("**Hình ảnh minh họa bệnh tương tự:**")
-                UIComponents.render_disease_images(diagnosis_images)
-            
-            # Show diagnosis text
-            st.markdown(response_message)
-            
-        # Add to chat history
-        chat_history.append({"role": "assistant", "content": response_message})
-        
-        # Extract disease name from response for quick question
-        return self._extract_primary_disease_from_response(response_message)
+        content_hash = hashlib.sha256(image_bytes).hexdigest() if image_bytes is not None else None
+        message = {
+            "role": "user", 
+            "content": Config.DIAGNOSIS_USER_MESSAGE
+        }
+        message.update(encode_history_image(image, content_hash=content_hash))
+        chat_history.append(message)
+        return message["image"]
     
     def _extract_primary_disease_from_response(self, response_message: str) -> str:
         """
@@ -0,0 +1,149 @@
+"""
+Background job manager for long-running diagnosis work
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from config.settings import Config
+from utils.metrics import register_collector
+from utils.token_usage import session_scope
+from utils.tracing import get_tracer
+
+class Job:
+    """State of a single background job"""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, job_id, session_id=None):
+        self.job_id = job_id
+        self.session_id = session_id
+        self.status = Job.PENDING
+        self.progress = "Đang chờ xử lý..."
+        self.result = None
+        self.partial = {}
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def set_progress(self, message):
+        """Update the human-readable progress message"""
+        self.progress = message
+
+    def publish(self, **fields):
+        """Publish partial results the UI can show before the job finishes"""
+        self.partial = {**self.partial, **fields}
+
+    def is_finished(self):
+        """Check if the job has completed (successfully or not)"""
+        return self.status in (Job.DONE, Job.FAILED)
+
+class JobManager:
+    """Runs jobs on a bounded thread pool and keeps results for a while"""
+
+    def __init__(self, max_workers=2, result_ttl=600):
+        """
+        Initialize the job manager
+
+        Args:
+            max_workers: Maximum number of jobs running concurrently
+            result_ttl: Seconds a finished job's result is kept
+        """
+        self.max_workers = max_workers
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="diagnosis-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, session_id=None, **kwargs):
+        """
+        Submit a job
+
+        The function is called with extra `progress_callback` and
+        `partial_callback` keyword arguments it can use to report progress
+        messages and publish partial results. Its spans belong to the
+        submitter's trace.
+
+        Args:
+            fn: Function to run
+            args: Positional arguments for fn
+            session_id: Optional session that owns the job
+            kwargs: Keyword arguments for fn
+
+        Returns:
+            str: Job ID
+        """
+        self._expire()
+        job = Job(uuid.uuid4().hex, session_id=session_id)
+        with self._lock:
+            self._jobs[job.job_id] = job
+
+        def run():
+            job.status = Job.RUNNING
+            status = Job.FAILED
+            try:
+                with session_scope(session_id):
+                    job.result = fn(
+                        *args, progress_callback=job.set_progress, partial_callback=job.publish, **kwargs
+                    )
+                status = Job.DONE
+            except Exception as e:
+                job.error = str(e)
+            finally:
+                # Finished jobs are expired by their finish time, so it is set first
+                job.finished_at = time.time()
+                job.status = status
+
+        self._executor.submit(get_tracer().wrap(run))
+        return job.job_id
+
+    def get(self, job_id):
+        """
+        Get a job by ID
+
+        Args:
+            job_id: Job ID
+
+        Returns:
+            Job or None if unknown or expired
+        """
+        self._expire()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def discard(self, job_id):
+        """Forget a job once its result has been consumed"""
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def queue_depth(self):
+        """Get the number of jobs waiting for or using a worker"""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.is_finished())
+
+    def _expire(self):
+        """Drop finished jobs whose results are older than the TTL"""
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.is_finished() and job.finished_at is not None and job.finished_at < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+@st.cache_resource
+def get_job_manager():
+    """Get the process-wide diagnosis job manager"""
+    manager = JobManager(
+        max_workers=Config.DIAGNOSIS_MAX_WORKERS,
+        result_ttl=Config.DIAGNOSIS_JOB_RESULT_TTL
+    )
+    register_collector("queue:diagnosis", lambda: {("diagnosis",): manager.queue_depth()})
+    return manager
@@ -0,0 +1,226 @@
+"""
+In-process BM25 index over the disease knowledge chunks
+
+Disease names and Vietnamese symptom terms are exact lexical matches, so
+most disease queries can be answered from an inverted index without
+embedding the query. Text is tokenized into syllables (Vietnamese words are
+written as space-separated syllables) with diacritics folded, so "vảy nến",
+"Vảy Nến" and "vay nen" all match, plus syllable bigrams so that multi-
+syllable names outrank their common syllables.
+"""
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+# Question words and particles that carry no retrieval signal (folded)
+STOPWORDS = frozenset({
+    "la", "gi", "cua", "va", "co", "khong", "bi", "cho", "toi", "em", "thi", "nhu", "the", "nao",
+    "nhung", "cac", "mot", "duoc", "nay", "do", "ve", "voi", "hay", "ai", "sao",
+    "is", "are", "what", "how", "of", "a", "an", "and", "to", "for", "does",
+})
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+def fold_diacritics(text: str) -> str:
+    """
+    Lowercase a text and strip its diacritics
+
+    Args:
+        text: Text to fold
+
+    Returns:
+        Folded text, e.g. "Vảy nến" -> "vay nen"
+    """
+    text = text.lower().replace("đ", "d")
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+def _syllables(text: str) -> List[str]:
+    """Split a text into folded syllables, stopwords included"""
+    return _TOKEN_PATTERN.findall(fold_diacritics(text))
+
+def name_phrases(names: List[str]) -> List[Tuple[str, ...]]:
+    """
+    Get the syllable sequences a query may name a disease by
+
+    A parenthesized part is a name of its own, and a leading "bệnh" or a
+    trailing "disease" is not needed to name the disease.
+
+    Args:
+        names: Names of one disease, e.g. ["Tinea Corporis", "Nấm da thân mình (hắc lào)"]
+
+    Returns:
+        List of syllable tuples, e.g. [("tinea", "corporis"), ("nam", "da", "than", "minh"), ("hac", "lao")]
+    """
+    phrases = []
+    for name in names:
+        for part in re.split(r"[()]", name):
+            syllables = _syllables(part)
+            if len(syllables) > 1 and syllables[0] == "benh":
+                syllables = syllables[1:]
+            if len(syllables) > 1 and syllables[-1] == "disease":
+                syllables = syllables[:-1]
+            if syllables and tuple(syllables) not in phrases:
+                phrases.append(tuple(syllables))
+    return phrases
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split a text into folded syllables and syllable bigrams
+
+    Args:
+        text: Text to tokenize
+
+    Returns:
+        List of terms; bigrams are joined with "_"
+    """
+    syllables = [s for s in _TOKEN_PATTERN.findall(fold_diacritics(text)) if s not in STOPWORDS]
+    return syllables + [f"{a}_{b}" for a, b in zip(syllables, syllables[1:])]
+
+class BM25Index:
+    """Okapi BM25 inverted index over (document, metadata) chunks"""
+
+    def __init__(self, documents: List[str], metadatas: List[Dict[str, Any]], k1: float = 1.5, b: float = 0.75,
+                 names: Optional[Dict[str, List[str]]] = None):
+        """
+        Build the index
+
+        Args:
+            documents: Chunk texts
+            metadatas: Chunk metadata dictionaries, parallel to documents
+            k1: Term frequency saturation
+            b: Document length normalization
+            names: All names of every disease, keyed by the disease_name of
+                its chunks (default: only that name)
+        """
+        self.documents = documents
+        self.metadatas = metadatas
+        self.names = {
+            disease: name_phrases(disease_names) for disease, disease_names in (names or {}).items()
+        }
+        for metadata in metadatas:
+            self.names.setdefault(metadata["disease_name"], name_phrases([metadata["disease_name"]]))
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.lengths = []
+        for doc_id, document in enumerate(documents):
+            counts = Counter(tokenize(document))
+            self.lengths.append(sum(counts.values()))
+            for term, frequency in counts.items():
+                self.postings.setdefault(term, []).append((doc_id, frequency))
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        self.idf = {
+            term: math.log(1 + (len(documents) - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def __len__(self):
+        return len(self.documents)
+
+    def search(self, query: str, k: int) -> List[Tuple[str, Dict[str, Any], float]]:
+        """
+        Find the chunks best matching a query
+
+        Args:
+            query: Search text
+            k: Number of chunks to return
+
+        Returns:
+            List of (document, metadata, score), best first; only chunks
+            sharing a term with the query
+        """
+        scores = {}
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, frequency in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / self.average_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.documents[doc_id], self.metadatas[doc_id], score) for doc_id, score in best]
+
+    def mentions_disease(self, query: str, disease: str) -> bool:
+        """
+        Check if a query names a disease, by any of its names
+
+        Args:
+            query: Search text
+            disease: disease_name of the disease's chunks
+
+        Returns:
+            True if one of the disease's names appears in the query as a whole
+        """
+        syllables = tuple(_syllables(query))
+        return any(
+            syllables[i:i + len(phrase)] == phrase
+            for phrase in self.names.get(disease, ())
+            for i in range(len(syllables) - len(phrase) + 1)
+        )
+
+    @staticmethod
+    def relevant_hits(hits: List[Tuple[str, Dict[str, Any], float]], min_score: float,
+                      relative_cutoff: float) -> List[Tuple[str, Dict[str, Any], float]]:
+        """
+        Drop weak hits, the lexical counterpart of a vector distance threshold
+
+        Args:
+            hits: Results of search()
+            min_score: Score every kept hit must reach (matches on common
+                words like "da" or "bệnh" alone stay below it)
+            relative_cutoff: Share of the best hit's score every kept hit must reach
+
+        Returns:
+            The kept hits, best first
+        """
+        if not hits:
+            return []
+        cutoff = max(min_score, relative_cutoff * hits[0][2])
+        return [hit for hit in hits if hit[2] >= cutoff]
+
+    @staticmethod
+    def confident_disease(hits: List[Tuple[str, Dict[str, Any], float]], margin: float,
+                          min_score: float = 0.0) -> Optional[str]:
+        """
+        Get the disease a search points at unambiguously
+
+        Args:
+            hits: Results of search()
+            margin: How many times the best disease's score must exceed the runner-up's
+            min_score: Score the best disease must reach (a lone common syllable is not enough)
+
+        Returns:
+            Disease name, or None if the hits are empty or ambiguous
+        """
+        best_by_disease = {}
+        for _, metadata, score in hits:
+            name = metadata["disease_name"]
+            best_by_disease[name] = max(best_by_disease.get(name, 0.0), score)
+        if not best_by_disease:
+            return None
+        ranked = sorted(best_by_disease.items(), key=lambda item: item[1], reverse=True)
+        if ranked[0][1] < min_score or (len(ranked) > 1 and ranked[0][1] < margin * ranked[1][1]):
+            return None
+        return ranked[0][0]
+
+def reciprocal_rank_fusion(rankings: List[List[Tuple[str, Dict[str, Any]]]], k: int = 60) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Merge rankings of chunks by reciprocal rank fusion
+
+    Args:
+        rankings: Lists of (document, metadata) pairs, best first
+        k: Rank offset damping the weight of top ranks
+
+    Returns:
+        Merged list of (document, metadata) pairs, best first
+    """
+    scores = {}
+    chunks = {}
+    for ranking in rankings:
+        for rank, (document, metadata) in enumerate(ranking, 1):
+            scores[document] = scores.get(document, 0.0) + 1.0 / (k + rank)
+            chunks.setdefault(document, (document, metadata))
+    return [chunks[document] for document in sorted(scores, key=scores.get, reverse=True)]
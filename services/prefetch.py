@@ -0,0 +1,202 @@
+"""
+Speculative prefetch of likely follow-up answers
+
+After a diagnosis the quick-question button ("cho tôi thông tin bệnh ...")
+is the most likely next turn, so its answer is generated in the background
+while the user reads the diagnosis and served instantly if it is clicked.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from config.settings import Config
+from utils.metrics import cache_samples, register_collector
+from utils.token_usage import session_scope
+from utils.tracing import get_tracer
+
+class Prefetch:
+    """A speculative answer held in a session's prefetch slot"""
+
+    def __init__(self, session_id, prompt, future):
+        self.session_id = session_id
+        self.prompt = prompt
+        self.future = future
+        self.created_at = time.time()
+
+class PrefetchManager:
+    """Keeps at most one speculative answer per session"""
+
+    def __init__(self, max_workers=2, max_in_flight=4, ttl=300, should_throttle=None):
+        """
+        Initialize the prefetch manager
+
+        Args:
+            max_workers: Maximum number of prefetches generated concurrently
+            max_in_flight: Maximum number of unfinished prefetches; more are not started
+            ttl: Seconds an unclaimed prefetch is kept
+            should_throttle: Optional callable returning True while the upstream
+                API is under rate-limit pressure
+        """
+        self.max_in_flight = max_in_flight
+        self.ttl = ttl
+        self.should_throttle = should_throttle
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._slots = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        # Counted under _lock, like the slots: start, claim and the rate-limit
+        # listener run on different threads
+        self._stats = {"started": 0, "skipped": 0, "served": 0, "wasted": 0}
+
+    def start(self, session_id, prompt, fn, *args, **kwargs):
+        """
+        Start generating an answer for a session's likely next prompt
+
+        Replaces any earlier prefetch of the session. Nothing is started
+        after shutdown().
+
+        Args:
+            session_id: Session that owns the prefetch
+            prompt: Prompt the answer is for
+            fn: Function producing the answer; it should raise on API errors
+            args: Positional arguments for fn
+            kwargs: Keyword arguments for fn
+
+        Returns:
+            bool: True if the prefetch was started
+        """
+        self._expire()
+        if self.should_throttle is not None and self.should_throttle():
+            # Speculative calls are the first to go when the API pushes back
+            self.cancel_unclaimed()
+            with self._lock:
+                self._stats["skipped"] += 1
+            return False
+
+        def run():
+            # A trace of its own, kept apart from the session's turns
+            with get_tracer().span("prefetch", prefetch_session=session_id), session_scope(session_id):
+                return fn(*args, **kwargs)
+
+        self.discard(session_id)
+        with self._lock:
+            if self._closed or self._count_in_flight() >= self.max_in_flight:
+                self._stats["skipped"] += 1
+                return False
+            self._slots[session_id] = Prefetch(session_id, prompt, self._executor.submit(run))
+            self._stats["started"] += 1
+        return True
+
+    def claim(self, session_id, prompt, timeout=None):
+        """
+        Take the prefetched answer for a prompt out of the session's slot
+
+        If the prefetch is still running, waits up to `timeout` seconds for it
+        since it has a head start over a fresh request.
+
+        Args:
+            session_id: Session identifier
+            prompt: Prompt the user actually sent
+            timeout: Maximum seconds to wait for an unfinished prefetch
+
+        Returns:
+            The function's result, or None if there is no usable prefetch
+        """
+        self._expire()
+        with self._lock:
+            slot = self._slots.get(session_id)
+            if slot is None or slot.prompt != prompt:
+                return None
+            del self._slots[session_id]
+
+        try:
+            result = slot.future.result(timeout=timeout)
+        except Exception as e:
+            print(f"Prefetch not used: {str(e) or type(e).__name__}")
+            slot.future.cancel()
+            return None
+        with self._lock:
+            self._stats["served"] += 1
+        return result
+
+    def discard(self, session_id):
+        """Drop a session's prefetch, e.g. once the user asks something else"""
+        with self._lock:
+            slot = self._slots.pop(session_id, None)
+            if slot is not None:
+                self._stats["wasted"] += 1
+        if slot is not None:
+            slot.future.cancel()
+
+    def cancel_unclaimed(self):
+        """Drop all unclaimed prefetches, cancelling those not yet running"""
+        with self._lock:
+            slots = list(self._slots.values())
+            self._slots.clear()
+            self._stats["wasted"] += len(slots)
+        for slot in slots:
+            slot.future.cancel()
+
+    def shutdown(self, wait=True):
+        """
+        Stop the workers, dropping all unclaimed prefetches
+
+        Args:
+            wait: Wait for the prefetches that are already running to finish
+        """
+        with self._lock:
+            self._closed = True
+        self.cancel_unclaimed()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _expire(self):
+        """Drop prefetches nobody claimed within the TTL"""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [sid for sid, slot in self._slots.items() if slot.created_at < cutoff]
+            for session_id in expired:
+                self._slots.pop(session_id).future.cancel()
+            self._stats["wasted"] += len(expired)
+
+    def stats(self):
+        """
+        Get prefetch statistics
+
+        Returns:
+            Dictionary with the started, skipped, served and wasted prefetch counts
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def in_flight(self):
+        """Get the number of prefetches still being generated"""
+        with self._lock:
+            return self._count_in_flight()
+
+    def _count_in_flight(self):
+        return sum(1 for slot in self._slots.values() if not slot.future.done())
+
+@st.cache_resource
+def get_prefetch_manager():
+    """Get the process-wide prefetch manager"""
+    from services.chat_service import ChatService
+
+    manager = PrefetchManager(
+        max_workers=Config.PREFETCH_MAX_WORKERS,
+        max_in_flight=Config.PREFETCH_MAX_IN_FLIGHT,
+        ttl=Config.PREFETCH_TTL,
+        should_throttle=lambda: ChatService.is_rate_limited(Config.PREFETCH_RATE_LIMIT_COOLDOWN)
+    )
+    # Drop speculative answers as soon as the API pushes back, not on the next start()
+    ChatService.rate_limit_listeners.append(manager.cancel_unclaimed)
+    register_collector("queue:prefetch", lambda: {("prefetch",): manager.in_flight()})
+
+    def prefetch_samples():
+        # A served prefetch is a hit, one dropped unused a miss
+        stats = manager.stats()
+        return cache_samples("prefetch", {"hits": stats["served"], "misses": stats["wasted"]})
+
+    register_collector("cache:prefetch", prefetch_samples)
+    return manager
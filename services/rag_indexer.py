@@ -0,0 +1,197 @@
+"""
+Knowledge base indexer and read-only snapshots for multi-process deployments
+
+A Chroma PersistentClient writes to its directory even when it is only
+queried, so several app processes must not open the same directory. One
+indexer process owns writes instead:
+
+    python -m services.rag_indexer publish   # build a snapshot for CHROMA_MODE=snapshot
+    python -m services.rag_indexer index     # (re)index CHROMA_PATH or the Chroma server
+
+In snapshot mode each app process copies the current snapshot to a private
+replica and queries that, so readers never share files and query
+throughput scales with the number of workers. Published snapshots are
+immutable; a new one is picked up by running processes within
+CHROMA_RECONNECT_INTERVAL seconds.
+"""
+import argparse
+import atexit
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+from config.settings import Config, WORKSPACE_ROOT
+
+CURRENT_POINTER = "CURRENT"
+REPLICAS_DIR = os.path.join(WORKSPACE_ROOT, ".cache", "chroma_replicas")
+
+_replicas = []
+
+def current_snapshot(snapshot_root):
+    """
+    Get the directory of the current published snapshot
+
+    Args:
+        snapshot_root: Directory holding the snapshots
+
+    Returns:
+        Absolute snapshot directory, or None if nothing is published
+    """
+    try:
+        with open(os.path.join(snapshot_root, CURRENT_POINTER), 'r', encoding='utf-8') as f:
+            name = f.read().strip()
+    except OSError:
+        return None
+    path = os.path.join(snapshot_root, name)
+    return path if name and os.path.isdir(path) else None
+
+def make_private_replica(snapshot_dir):
+    """
+    Copy a snapshot to a directory owned by this process
+
+    Replicas are removed by remove_private_replica() once they are no
+    longer queried, or when the process exits; replicas left behind by
+    processes that died are removed here.
+
+    Args:
+        snapshot_dir: Published snapshot directory
+
+    Returns:
+        Replica directory to open with a PersistentClient
+    """
+    os.makedirs(REPLICAS_DIR, exist_ok=True)
+    _remove_stale_replicas()
+    replica = tempfile.mkdtemp(prefix=f"{os.getpid()}-", dir=REPLICAS_DIR)
+    shutil.copytree(snapshot_dir, replica, dirs_exist_ok=True)
+    if not _replicas:
+        atexit.register(_remove_own_replicas)
+    _replicas.append(replica)
+    return replica
+
+def remove_private_replica(replica):
+    """
+    Remove a replica made by make_private_replica
+
+    Args:
+        replica: Replica directory; its client must be closed first
+    """
+    if replica in _replicas:
+        _replicas.remove(replica)
+    shutil.rmtree(replica, ignore_errors=True)
+
+def _remove_own_replicas():
+    for replica in list(_replicas):
+        remove_private_replica(replica)
+
+def _remove_stale_replicas():
+    """Remove replicas of processes that are no longer running"""
+    for name in os.listdir(REPLICAS_DIR):
+        try:
+            pid = int(name.split("-", 1)[0])
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            shutil.rmtree(os.path.join(REPLICAS_DIR, name), ignore_errors=True)
+        except (ValueError, PermissionError):
+            continue
+
+def publish_snapshot(snapshot_root=None, keep=None):
+    """
+    Index the disease database into a new snapshot and make it current
+
+    Args:
+        snapshot_root: Directory holding the snapshots (default CHROMA_SNAPSHOT_DIR)
+        keep: Number of snapshots to keep (default CHROMA_SNAPSHOTS_KEPT)
+
+    Returns:
+        Directory of the new snapshot
+    """
+    from services.rag_service import RAGService
+
+    snapshot_root = snapshot_root or Config.CHROMA_SNAPSHOT_DIR
+    keep = keep or Config.CHROMA_SNAPSHOTS_KEPT
+    os.makedirs(snapshot_root, exist_ok=True)
+
+    name = _snapshot_name()
+    staging = os.path.join(snapshot_root, f".staging-{name}")
+    service = RAGService(mode="persistent", path=staging, vector_backend="chroma")
+    health = service.health_check()
+    service.close()
+    if not health["ok"]:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise RuntimeError(f"Indexing failed: {health['error']}")
+
+    snapshot_dir = os.path.join(snapshot_root, name)
+    os.rename(staging, snapshot_dir)
+    _switch_current(snapshot_root, name, keep)
+
+    print(f"Published snapshot {snapshot_dir} with {health['documents']} chunks")
+    return snapshot_dir
+
+def _snapshot_name():
+    """
+    Name a new snapshot
+
+    Names sort in publishing order, which pruning relies on; the nanoseconds
+    and a random suffix keep publishes within the same second apart.
+    """
+    ns = time.time_ns()
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(ns // 1_000_000_000))
+    return f"snapshot-{stamp}-{ns % 1_000_000_000:09d}-{uuid.uuid4().hex[:6]}"
+
+def _switch_current(snapshot_root, name, keep):
+    """
+    Make a snapshot current and prune the oldest ones
+
+    Args:
+        snapshot_root: Directory holding the snapshots
+        name: Name of the snapshot to make current
+        keep: Number of snapshots to keep, the current one included
+    """
+    # Switch the pointer atomically so readers never see a partial snapshot
+    pointer_tmp = os.path.join(snapshot_root, f".{CURRENT_POINTER}.tmp")
+    with open(pointer_tmp, 'w', encoding='utf-8') as f:
+        f.write(name)
+    os.replace(pointer_tmp, os.path.join(snapshot_root, CURRENT_POINTER))
+
+    snapshots = sorted(n for n in os.listdir(snapshot_root) if n.startswith("snapshot-") and n != name)
+    for old in snapshots[:max(len(snapshots) - (keep - 1), 0)]:
+        shutil.rmtree(os.path.join(snapshot_root, old), ignore_errors=True)
+
+def reindex(mode=None, rebuild=False):
+    """
+    Index the disease database in place, as the single writer
+
+    Args:
+        mode: "persistent" to write CHROMA_PATH or "http" to write through
+            the Chroma server (default CHROMA_MODE)
+        rebuild: Drop the existing collection first
+    """
+    from services.rag_service import RAGService
+
+    mode = mode or Config.CHROMA_MODE
+    if mode not in ("persistent", "http"):
+        raise ValueError(f"Cannot index in {mode} mode; use 'publish' for snapshots")
+
+    service = RAGService(mode=mode, writer=True, rebuild=rebuild, vector_backend="chroma")
+    health = service.health_check()
+    service.close()
+    print(f"Knowledge base ({mode}): {health}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the disease knowledge base")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("publish", help="Build a new read-only snapshot and make it current")
+    index_parser = subparsers.add_parser("index", help="Index CHROMA_PATH or the Chroma server in place")
+    index_parser.add_argument("--mode", choices=["persistent", "http"])
+    index_parser.add_argument("--rebuild", action="store_true", help="Drop the collection first")
+    args = parser.parse_args()
+
+    if args.command == "publish":
+        publish_snapshot()
+    else:
+        reindex(mode=args.mode, rebuild=args.rebuild)
+
+if __name__ == "__main__":
+    main()
@@ -3,63 +3,280 @@ RAG (Retrieval-Augmented Generation) service for disease knowledge retrieval
 """
 import json
 import os
-import chromadb
-from chromadb.config import Settings
+import threading
+import time
 import tiktoken
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional, Tuple
 from config.settings import Config
+from services.lexical_index import BM25Index, reciprocal_rank_fusion
+from services.rag_indexer import current_snapshot, make_private_replica, remove_private_replica
+from services.vector_store import NumpyVectorStore
+from utils.image_assets import image_exists
+from utils.metrics import REQUESTS, RETRIEVAL_LATENCY
+from utils.tracing import get_tracer
 
 class RAGService:
     """Service for handling RAG operations with disease database"""
     
-    def __init__(self, collection_name: str = "disease_knowledge"):
+    def __init__(self, collection_name: str = "disease_knowledge", mode: Optional[str] = None,
+                 path: Optional[str] = None, writer: Optional[bool] = None, rebuild: bool = False,
+                 n_results: Optional[int] = None, distance_threshold: Optional[float] = None,
+                 retrieval: Optional[str] = None, vector_backend: Optional[str] = None):
         """
-        Initialize RAG service with ChromaDB
+        Initialize RAG service with its vector store
         
         Args:
-            collection_name: Name of the ChromaDB collection
+            collection_name: Name of the collection
+            mode: "persistent", "snapshot" or "http" (default Config.CHROMA_MODE)
+            path: Database directory in persistent mode (default Config.CHROMA_PATH)
+            writer: Whether this instance may create and index the collection
+                (default: only in persistent mode)
+            rebuild: Drop and re-index the collection (writers only)
+            n_results: Chunks retrieved per search (default Config.RAG_N_RESULTS)
+            distance_threshold: Cosine distance above which chunks are dropped
+                (default Config.RAG_DISTANCE_THRESHOLD)
+            retrieval: "vector", "lexical" or "hybrid" (default Config.RAG_RETRIEVAL)
+            vector_backend: "numpy", "chroma" or "auto" (default Config.VECTOR_BACKEND);
+                the Chroma arguments above only apply to the Chroma backend, which
+                "auto" picks in snapshot and http mode
         """
         self.collection_name = collection_name
+        self.mode = mode or Config.CHROMA_MODE
+        self.chroma_path = path or Config.CHROMA_PATH
+        self.writer = self.mode == "persistent" if writer is None else writer
+        self.n_results = n_results or Config.RAG_N_RESULTS
+        self.distance_threshold = Config.RAG_DISTANCE_THRESHOLD if distance_threshold is None else distance_threshold
+        self.retrieval = retrieval or Config.RAG_RETRIEVAL
         self.client = None
         self.collection = None
+        self.error = None
+        self.snapshot = None
+        self.replica = None
+        self._last_connect_attempt = 0.0
+        self._connect_lock = threading.Lock()
+        # Owned here so query embedding can be timed apart from the search. Both
+        # backends embed with Chroma's default ONNX model, imported here so that
+        # importing this module does not import Chroma
+        from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+        from chromadb.utils.embedding_functions.onnx_mini_lm_l6_v2 import ONNXMiniLM_L6_V2
+        self.embedding_function = DefaultEmbeddingFunction()
+        self.embedding_model = ONNXMiniLM_L6_V2.MODEL_NAME
         self.tokenizer = tiktoken.get_encoding("cl100k_base")
         self.max_chunk_size = 500  # Maximum tokens per chunk
         self.database_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "database", "diseases.json")
         self.hospital_database_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "database", "hospital_rag.json")
         
+        try:
+            chunks = self._load_disease_chunks()
+        except Exception as e:
+            print(f"Error loading disease chunks: {str(e)}")
+            chunks = ([], [], [])
+        
+        # Built from the same chunks as the collection; cheap enough to rebuild in every process
+        self.lexical_index = self._build_lexical_index(chunks)
+        
+        self.vector_backend = self._select_vector_backend(
+            vector_backend or Config.VECTOR_BACKEND, len(chunks[0]), self.mode
+        )
+        if self.vector_backend == "numpy":
+            self._initialize_numpy_store(chunks)
+            return
+        
         # Initialize ChromaDB
         self._initialize_chromadb()
         
-        # Load and index disease data if collection is empty
-        if self._is_collection_empty():
-            self._load_and_index_diseases()
+        # Only the owner of the index writes to it
+        if self.writer and self.collection is not None:
+            if rebuild:
+                self.client.delete_collection(self.collection_name)
+                self._initialize_chromadb()
+            if self._is_collection_empty():
+                self._load_and_index_diseases()
     
-    def _initialize_chromadb(self):
-        """Initialize ChromaDB client and collection"""
-        try:
-            # Create client with persistent storage
-            db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "chromadb")
-            os.makedirs(db_path, exist_ok=True)
+    @staticmethod
+    def _select_vector_backend(backend: str, chunk_count: int, mode: str = "persistent") -> str:
+        """
+        Resolve the vector backend
+        
+        Args:
+            backend: "numpy", "chroma" or "auto"
+            chunk_count: Number of chunks in the disease database
+            mode: Chroma mode; "snapshot" and "http" only exist for Chroma
             
-            self.client = chromadb.PersistentClient(
-                path=db_path,
-                settings=Settings(anonymized_telemetry=False)
+        Returns:
+            "numpy" or "chroma"; "auto" picks Chroma in snapshot and http mode,
+            otherwise NumPy up to Config.VECTOR_NUMPY_MAX_CHUNKS chunks
+        """
+        if backend == "auto":
+            if mode in ("snapshot", "http"):
+                return "chroma"
+            return "numpy" if chunk_count <= Config.VECTOR_NUMPY_MAX_CHUNKS else "chroma"
+        if backend not in ("numpy", "chroma"):
+            raise ValueError(f"unknown vector backend '{backend}'")
+        return backend
+    
+    def _initialize_numpy_store(self, chunks=None):
+        """
+        Open the NumPy vector store, embedding the chunks if they are not cached yet
+        
+        Args:
+            chunks: (documents, metadatas, ids) of the disease database (default: loaded)
+        """
+        self._last_connect_attempt = time.monotonic()
+        try:
+            documents, metadatas, ids = chunks or self._load_disease_chunks()
+            self.collection = NumpyVectorStore.open_or_build(
+                os.path.join(Config.VECTOR_INDEX_DIR, self.collection_name),
+                ids, documents, metadatas, self.embedding_function, self.embedding_model
             )
+            self.error = None
+        except Exception as e:
+            print(f"Error initializing NumPy vector store: {str(e)}")
+            self.error = str(e)
+            self.collection = None
+    
+    def _initialize_chromadb(self):
+        """
+        Connect to ChromaDB according to the configured mode
+        
+        On failure the service stays up without a collection (retrieval
+        returns no context) and reconnects later; health_check() reports
+        the error.
+        """
+        import chromadb
+        from chromadb.config import Settings
+        
+        self._last_connect_attempt = time.monotonic()
+        settings = Settings(anonymized_telemetry=False)
+        replica = None
+        try:
+            if self.mode == "http":
+                client = chromadb.HttpClient(host=Config.CHROMA_HOST, port=Config.CHROMA_PORT, settings=settings)
+            elif self.mode == "snapshot":
+                snapshot = current_snapshot(Config.CHROMA_SNAPSHOT_DIR)
+                if snapshot is None:
+                    raise RuntimeError(f"no snapshot published in {Config.CHROMA_SNAPSHOT_DIR}")
+                # Open a private copy: Chroma writes to its directory even when only queried
+                replica = make_private_replica(snapshot)
+                client = chromadb.PersistentClient(path=replica, settings=settings)
+            elif self.mode == "persistent":
+                os.makedirs(self.chroma_path, exist_ok=True)
+                client = chromadb.PersistentClient(path=self.chroma_path, settings=settings)
+            else:
+                raise ValueError(f"unknown Chroma mode '{self.mode}'")
             
-            # Get or create collection
-            self.collection = self.client.get_or_create_collection(
-                name=self.collection_name,
-                metadata={"hnsw:space": "cosine"}
-            )
+            if self.writer:
+                collection = client.get_or_create_collection(
+                    name=self.collection_name,
+                    embedding_function=self.embedding_function,
+                    metadata={"hnsw:space": "cosine"}
+                )
+            else:
+                collection = client.get_collection(
+                    name=self.collection_name, embedding_function=self.embedding_function
+                )
             
+            previous_client, previous_replica = self.client, self.replica
+            self.client, self.collection, self.error = client, collection, None
+            if self.mode == "snapshot":
+                self.snapshot, self.replica = snapshot, replica
+                # The previous snapshot's replica is no longer queried
+                if previous_replica is not None:
+                    self._close_client(previous_client)
+                    remove_private_replica(previous_replica)
         except Exception as e:
-            print(f"Error initializing ChromaDB: {str(e)}")
-            # Fallback to in-memory client
-            self.client = chromadb.Client()
-            self.collection = self.client.get_or_create_collection(
-                name=self.collection_name,
-                metadata={"hnsw:space": "cosine"}
-            )
+            print(f"Error initializing ChromaDB ({self.mode} mode): {str(e)}")
+            self.error = str(e)
+            if replica is not None:
+                remove_private_replica(replica)
+            if self.mode != "snapshot" or self.collection is None:
+                # Keep serving an older snapshot if switching to a new one failed
+                self.client = None
+                self.collection = None
+    
+    def _get_collection(self):
+        """
+        Get the collection, reconnecting after a failure or switching to a
+        newly published snapshot at most every CHROMA_RECONNECT_INTERVAL seconds
+        
+        Returns:
+            Collection or None if the vector store is unavailable
+        """
+        if time.monotonic() - self._last_connect_attempt < Config.CHROMA_RECONNECT_INTERVAL:
+            return self.collection
+        
+        with self._connect_lock:
+            if time.monotonic() - self._last_connect_attempt >= Config.CHROMA_RECONNECT_INTERVAL:
+                if self.vector_backend == "numpy":
+                    reconnect, stale_snapshot = self._initialize_numpy_store, False
+                else:
+                    reconnect = self._initialize_chromadb
+                    stale_snapshot = (
+                        self.mode == "snapshot"
+                        and current_snapshot(Config.CHROMA_SNAPSHOT_DIR) != self.snapshot
+                    )
+                if self.collection is None or stale_snapshot:
+                    reconnect()
+                else:
+                    self._last_connect_attempt = time.monotonic()
+        return self.collection
+    
+    def health_check(self) -> Dict[str, Any]:
+        """
+        Check that the knowledge base can be queried
+        
+        Returns:
+            Dictionary with "ok", "mode" (Chroma mode or "numpy"), "documents" and "error"
+        """
+        mode = self.mode if self.vector_backend == "chroma" else "numpy"
+        collection = self._get_collection()
+        if collection is None:
+            return {"ok": False, "mode": mode, "documents": 0, "error": self.error}
+        try:
+            if mode == "http":
+                self.client.heartbeat()
+            documents = collection.count()
+        except Exception as e:
+            return {"ok": False, "mode": mode, "documents": 0, "error": str(e)}
+        return {
+            "ok": documents > 0,
+            "mode": mode,
+            "documents": documents,
+            "error": None if documents > 0 else "collection is empty",
+        }
+    
+    def warm_up(self):
+        """
+        Run a dummy query so the embedding model is loaded before the first user query
+        
+        Returns:
+            bool: True if the query succeeded
+        """
+        collection = self._get_collection()
+        if collection is None:
+            return False
+        try:
+            collection.query(query_texts=["bệnh da liễu"], n_results=1)
+            return True
+        except Exception as e:
+            print(f"Error warming up the vector store: {str(e)}")
+            return False
+    
+    def close(self):
+        """Release the ChromaDB client and its snapshot replica, or the NumPy store's memory map"""
+        self._close_client(self.client)
+        if self.replica is not None:
+            remove_private_replica(self.replica)
+        self.client = None
+        self.collection = None
+        self.replica = None
+    
+    @staticmethod
+    def _close_client(client):
+        """Close a ChromaDB client if it supports it"""
+        if client is not None and hasattr(client, "close"):
+            client.close()
     
     def _is_collection_empty(self) -> bool:
         """Check if the collection is empty"""
@@ -68,38 +285,83 @@ class RAGService:
         except:
             return True
     
-    def _load_and_index_diseases(self):
-        """Load disease data from JSON and index it in ChromaDB"""
+    def _load_disease_chunks(self) -> Tuple[List[str], List[Dict[str, Any]], List[str]]:
+        """
+        Load disease data from JSON and split it into knowledge chunks
+        
+        Returns:
+            Tuple of (documents, metadatas, ids)
+        """
+        with open(self.database_path, 'r', encoding='utf-8') as f:
+            diseases = json.load(f)
+        
+        documents = []
+        metadatas = []
+        ids = []
+        
+        for i, disease in enumerate(diseases):
+            # Create comprehensive text chunks for each disease
+            chunks = self._create_disease_chunks(disease)
+            
+            for j, chunk in enumerate(chunks):
+                chunk_id = f"disease_{i}_chunk_{j}"
+                documents.append(chunk["text"])
+                
+                # Handle both list and string formats for disease names
+                disease_names = disease["tên bệnh"]
+                if isinstance(disease_names, list):
+                    primary_name = disease_names[0]
+                else:
+                    primary_name = disease_names
+                
+                metadatas.append({
+                    "disease_name": primary_name,
+                    "danger_level": disease["độ nguy hiểm"],
+                    "chunk_type": chunk["type"],
+                    "disease_index": i
+                })
+                ids.append(chunk_id)
+        
+        return documents, metadatas, ids
+    
+    def _build_lexical_index(self, chunks) -> Optional[BM25Index]:
+        """
+        Build the BM25 index over the disease chunks
+        
+        Args:
+            chunks: (documents, metadatas, ids) from _load_disease_chunks()
+            
+        Returns:
+            BM25Index or None if lexical retrieval is off or there are no chunks
+        """
+        documents, metadatas, _ = chunks
+        if self.retrieval == "vector" or not documents:
+            return None
+        return BM25Index(documents, metadatas, names=self._load_disease_names())
+    
+    def _load_disease_names(self) -> Dict[str, List[str]]:
+        """
+        Load every name of every disease
+        
+        Returns:
+            Dictionary of primary disease name (the chunks' disease_name) to all its names
+        """
         try:
             with open(self.database_path, 'r', encoding='utf-8') as f:
                 diseases = json.load(f)
-            
-            documents = []
-            metadatas = []
-            ids = []
-            
-            for i, disease in enumerate(diseases):
-                # Create comprehensive text chunks for each disease
-                chunks = self._create_disease_chunks(disease)
-                
-                for j, chunk in enumerate(chunks):
-                    chunk_id = f"disease_{i}_chunk_{j}"
-                    documents.append(chunk["text"])
-                    
-                    # Handle both list and string formats for disease names
-                    disease_names = disease["tên bệnh"]
-                    if isinstance(disease_names, list):
-                        primary_name = disease_names[0]
-                    else:
-                        primary_name = disease_names
-                    
-                    metadatas.append({
-                        "disease_name": primary_name,
-                        "danger_level": disease["độ nguy hiểm"],
-                        "chunk_type": chunk["type"],
-                        "disease_index": i
-                    })
-                    ids.append(chunk_id)
+        except Exception as e:
+            print(f"Error loading disease names: {str(e)}")
+            return {}
+        names = {}
+        for disease in diseases:
+            disease_names = disease["tên bệnh"] if isinstance(disease["tên bệnh"], list) else [disease["tên bệnh"]]
+            names[disease_names[0]] = disease_names
+        return names
+    
+    def _load_and_index_diseases(self):
+        """Load disease data from JSON and index it in ChromaDB"""
+        try:
+            documents, metadatas, ids = self._load_disease_chunks()
             
             # Add documents to collection in batches
             batch_size = 100
@@ -329,27 +591,54 @@ class RAGService:
         
         return context
     
-    def retrieve_relevant_context(self, query: str, n_results: int = 5) -> tuple[Optional[str], Optional[List[str]]]:
+    def retrieve_relevant_context(self, query: str, n_results: Optional[int] = None) -> tuple[Optional[str], Optional[List[str]]]:
         """
         Retrieve relevant context and images for a query (diseases or hospitals)
         
         Args:
             query: User query
-            n_results: Number of results to retrieve
+            n_results: Number of results to retrieve (default self.n_results)
             
         Returns:
             Tuple of (formatted context string or None, list of image paths or None)
         """
+        tracer = get_tracer()
+        started = time.perf_counter()
+        with tracer.span("rag.retrieve") as span:
+            with tracer.span("rag.route"):
+                route = self.route_query(query)
+            span.set_attribute("route", route)
+            REQUESTS.inc(intent=route or "small_talk")
+            
+            try:
+                if route == "hospital":
+                    return self._retrieve_hospital_context(query)
+                elif route == "disease":
+                    return self._retrieve_disease_context(query, n_results)
+                return None, None
+            finally:
+                RETRIEVAL_LATENCY.observe(time.perf_counter() - started, route=route or "none")
+    
+    def route_query(self, query: str) -> Optional[str]:
+        """
+        Decide which knowledge source a query needs
+        
+        Also used by ChatService to label the intent of a chat turn.
+        
+        Args:
+            query: User query
+            
+        Returns:
+            "hospital", "disease" or None
+        """
         # Check if query is hospital-related first (more specific)
         if self._is_hospital_related_query(query):
-            return self._retrieve_hospital_context(query)
-        
+            return "hospital"
         # Check if query is disease-related
-        elif self._is_disease_related_query(query):
-            return self._retrieve_disease_context(query, n_results)
-        
+        if self._is_disease_related_query(query):
+            return "disease"
         # Neither disease nor hospital related
-        return None, None
+        return None
     
     def _retrieve_hospital_context(self, query: str) -> tuple[Optional[str], Optional[List[str]]]:
         """
@@ -361,14 +650,15 @@ class RAGService:
         Returns:
             Tuple of (formatted context string or None, None for images)
         """
-        # Extract district from query
-        district = self._extract_district_from_query(query)
-        
-        if not district:
-            return None, None
-        
-        # Get hospitals in the district
-        hospitals = self._get_hospitals_by_district(district)
+        with get_tracer().span("rag.hospital_lookup"):
+            # Extract district from query
+            district = self._extract_district_from_query(query)
+            
+            if not district:
+                return None, None
+            
+            # Get hospitals in the district
+            hospitals = self._get_hospitals_by_district(district)
         
         if not hospitals:
             return f"Không tìm thấy cơ sở da liễu nào tại quận/huyện {district}.", None
@@ -378,63 +668,194 @@ class RAGService:
         
         return context, None  # No images for hospital queries
     
-    def _retrieve_disease_context(self, query: str, n_results: int = 5) -> tuple[Optional[str], Optional[List[str]]]:
+    def _retrieve_disease_context(self, query: str, n_results: Optional[int] = None) -> tuple[Optional[str], Optional[List[str]]]:
         """
-        Retrieve disease context using ChromaDB vector search
+        Retrieve disease context using BM25 and/or ChromaDB vector search
         
         Args:
             query: User query
-            n_results: Number of results to retrieve
+            n_results: Number of results to retrieve (default self.n_results)
             
         Returns:
             Tuple of (formatted context string or None, list of image paths or None)
         """
         try:
-            # Query the collection
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=n_results,
-                include=["documents", "metadatas", "distances"]
-            )
+            return self._format_disease_context(self._query_disease_chunks(query, n_results))
+        except Exception as e:
+            print(f"Error retrieving disease context: {str(e)}")
+            return None, None
+    
+    def retrieve_context_for_labels(self, labels: List[str], n_results: Optional[int] = None) -> tuple[Optional[str], Optional[List[str]]]:
+        """
+        Retrieve disease context for several candidate diagnoses concurrently
+        
+        Each label is searched separately so that every candidate gets its own
+        knowledge chunks, and the searches run in parallel.
+        
+        Args:
+            labels: Candidate disease labels, most likely first
+            n_results: Number of results to retrieve per label (default self.n_results)
             
-            if not results["documents"] or not results["documents"][0]:
-                return None, None
+        Returns:
+            Tuple of (formatted context string or None, list of image paths or None)
+        """
+        if not labels:
+            return None, None
+        
+        def query_label(label):
+            try:
+                return self._query_disease_chunks(label, n_results)
+            except Exception as e:
+                print(f"Error retrieving disease context for {label}: {str(e)}")
+                return []
+        
+        tracer = get_tracer()
+        with tracer.span("rag.retrieve_labels", labels=len(labels)), RETRIEVAL_LATENCY.time(route="labels"):
+            with ThreadPoolExecutor(max_workers=len(labels), thread_name_prefix="rag-retrieval") as pool:
+                chunk_lists = list(pool.map(tracer.wrap(query_label), labels))
+            
+            return self._format_disease_context([chunk for chunks in chunk_lists for chunk in chunks])
+    
+    def _query_disease_chunks(self, query: str, n_results: Optional[int] = None,
+                              distance_threshold: Optional[float] = None) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Search for knowledge chunks relevant to a query
+        
+        In hybrid mode the BM25 index is searched first; if its hits clearly
+        point at one disease and the query names it, they are returned
+        without embedding the query, otherwise they are merged with the
+        vector results by reciprocal rank fusion. Weak lexical hits are
+        dropped first, as vector results beyond the distance threshold are.
+        
+        Args:
+            query: Search text
+            n_results: Number of results to retrieve (default self.n_results)
+            distance_threshold: Maximum cosine distance of vector results
+                (default self.distance_threshold)
             
-            # Format the retrieved context
-            context = "Thông tin từ cơ sở dữ liệu bệnh:\n\n"
+        Returns:
+            List of (document, metadata) pairs, most relevant first
+        """
+        n_results = n_results or self.n_results
+        if self.lexical_index is None or self.retrieval == "vector":
+            return self._vector_search(query, n_results, distance_threshold)
+        
+        lexical, confident = self._lexical_search(query, n_results)
+        if self.retrieval == "lexical" or confident is not None:
+            return lexical
+        
+        try:
+            vector = self._vector_search(query, n_results, distance_threshold)
+        except Exception as e:
+            print(f"Error in vector search, using lexical results: {str(e)}")
+            return lexical
+        return reciprocal_rank_fusion([lexical, vector], k=Config.RAG_RRF_K)[:n_results]
+    
+    def _lexical_search(self, query: str, n_results: int) -> Tuple[List[Tuple[str, Dict[str, Any]]], Optional[str]]:
+        """
+        Search the BM25 index
+        
+        Args:
+            query: Search text
+            n_results: Number of results to retrieve
             
-            unique_diseases = set()
-            relevant_images = []
+        Returns:
+            Tuple of (relevant (document, metadata) pairs, disease the query
+            names and the hits clearly point at, or None)
+        """
+        with get_tracer().span("rag.lexical", n_results=n_results) as span:
+            hits = self.lexical_index.search(query, n_results)
+            confident = BM25Index.confident_disease(hits, Config.RAG_LEXICAL_MARGIN, Config.RAG_LEXICAL_MIN_SCORE)
+            # A symptom description can score high on one disease's text too;
+            # only a query naming the disease is safe to answer from BM25 alone
+            if confident is not None and not self.lexical_index.mentions_disease(query, confident):
+                confident = None
+            hits = BM25Index.relevant_hits(hits, Config.RAG_LEXICAL_HIT_MIN_SCORE,
+                                           Config.RAG_LEXICAL_HIT_RELATIVE_CUTOFF)
+            span.set_attribute("confident", confident is not None)
+        return [(doc, metadata) for doc, metadata, _ in hits], confident
+    
+    def _vector_search(self, query: str, n_results: int,
+                       distance_threshold: Optional[float] = None) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Search the collection by embedding similarity
+        
+        Args:
+            query: Search text
+            n_results: Number of results to retrieve
+            distance_threshold: Maximum cosine distance (default self.distance_threshold)
             
-            for i, (doc, metadata, distance) in enumerate(zip(
+        Returns:
+            List of (document, metadata) pairs within the distance threshold
+        """
+        collection = self._get_collection()
+        if collection is None:
+            return []
+        if distance_threshold is None:
+            distance_threshold = self.distance_threshold
+        tracer = get_tracer()
+        with tracer.span("rag.embed"):
+            query_embeddings = self.embedding_function([query])
+        with tracer.span("rag.search", n_results=n_results):
+            results = collection.query(
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                include=["documents", "metadatas", "distances"]
+            )
+        
+        if not results["documents"] or not results["documents"][0]:
+            return []
+        
+        return [
+            (doc, metadata)
+            for doc, metadata, distance in zip(
                 results["documents"][0],
                 results["metadatas"][0],
                 results["distances"][0]
-            )):
-                # Only include relevant results (distance threshold)
-                if distance < 0.7:  # Adjust threshold as needed
-                    disease_name = metadata["disease_name"]
-                    chunk_type = metadata["chunk_type"]
-                    
-                    # Avoid duplicate disease information
-                    if disease_name not in unique_diseases or chunk_type == "main_info":
-                        context += f"{doc}\n\n"
-                        unique_diseases.add(disease_name)
-                        
-                        # Get images for this disease (only once per disease)
-                        if disease_name not in [img_disease for img_disease, _ in relevant_images]:
-                            disease_images = self._get_disease_images(disease_name)
-                            if disease_images:
-                                relevant_images.extend([(disease_name, img) for img in disease_images])
-            
-            context_result = context if len(unique_diseases) > 0 else None
-            images_result = [img_path for _, img_path in relevant_images] if relevant_images else None
-            
-            return context_result, images_result
+            )
+            # Only include relevant results (distance threshold)
+            if distance < distance_threshold
+        ]
+    
+    def _format_disease_context(self, chunks: List[Tuple[str, Dict[str, Any]]]) -> tuple[Optional[str], Optional[List[str]]]:
+        """
+        Format retrieved knowledge chunks into a context string
+        
+        Args:
+            chunks: List of (document, metadata) pairs, most relevant first
             
-        except Exception as e:
-            print(f"Error retrieving disease context: {str(e)}")
-            return None, None
+        Returns:
+            Tuple of (formatted context string or None, list of image paths or None)
+        """
+        context = "Thông tin từ cơ sở dữ liệu bệnh:\n\n"
+        
+        unique_diseases = set()
+        included_docs = set()
+        relevant_images = []
+        
+        for doc, metadata in chunks:
+            disease_name = metadata["disease_name"]
+            chunk_type = metadata["chunk_type"]
+            
+            # Avoid duplicate disease information
+            if doc in included_docs:
+                continue
+            if disease_name not in unique_diseases or chunk_type == "main_info":
+                context += f"{doc}\n\n"
+                unique_diseases.add(disease_name)
+                included_docs.add(doc)
+                
+                # Get images for this disease (only once per disease)
+                if disease_name not in [img_disease for img_disease, _ in relevant_images]:
+                    with get_tracer().span("rag.image_lookup", disease=disease_name):
+                        disease_images = self._get_disease_images(disease_name)
+                    if disease_images:
+                        relevant_images.extend([(disease_name, img) for img in disease_images])
+        
+        context_result = context if len(unique_diseases) > 0 else None
+        images_result = [img_path for _, img_path in relevant_images] if relevant_images else None
+        
+        return context_result, images_result
     
     def _get_disease_images(self, disease_name: str) -> List[str]:
         """
@@ -471,7 +892,7 @@ class RAGService:
                     for img_path in images:
                         if img_path.startswith("database/"):
                             abs_path = os.path.join(workspace_root, img_path)
-                            if os.path.exists(abs_path):
+                            if image_exists(abs_path):
                                 absolute_images.append(abs_path)
                     if absolute_images:
                         return absolute_images[:3]
@@ -486,7 +907,7 @@ class RAGService:
                         for img_path in images:
                             if img_path.startswith("database/"):
                                 abs_path = os.path.join(workspace_root, img_path)
-                                if os.path.exists(abs_path):
+                                if image_exists(abs_path):
                                     absolute_images.append(abs_path)
                         if absolute_images:
                             return absolute_images[:3]
@@ -509,10 +930,23 @@ class RAGService:
             Tuple of (enhanced prompt with retrieved context, list of image paths or None)
         """
         context, images = self.retrieve_relevant_context(query)
+        return self.apply_context(original_prompt, context, hospital=self._is_hospital_related_query(query)), images
+    
+    def apply_context(self, original_prompt: str, context: Optional[str], hospital: bool = False) -> str:
+        """
+        Add already retrieved context to a system prompt
         
+        Args:
+            original_prompt: Original system prompt
+            context: Retrieved context string or None
+            hospital: Whether the context is hospital/clinic information
+            
+        Returns:
+            Enhanced prompt, or the original prompt if there is no context
+        """
         if context:
-            # Check if it's a hospital query for specific instructions
-            if self._is_hospital_related_query(query):
+            # Hospital context gets specific instructions
+            if hospital:
                 enhanced_prompt = f"""{original_prompt}
 
 QUAN TRỌNG: Sử dụng thông tin sau từ cơ sở dữ liệu bệnh viện/phòng khám:
@@ -535,9 +969,9 @@ QUAN TRỌNG: Sử dụng thông tin sau từ cơ sở dữ liệu để trả l
 
 Hãy ưu tiên thông tin từ cơ sở dữ liệu trên khi trả lời về các bệnh da liễu. **TRẢ LỜI NGẮN GỌN, SÚC TÍCH - chỉ đưa ra thông tin cần thiết, tránh dài dòng.** Nếu thông tin trong cơ sở dữ liệu không liên quan đến câu hỏi, hãy trả lời dựa trên kiến thức chung của bạn."""
             
-            return enhanced_prompt, images
+            return enhanced_prompt
         
-        return original_prompt, None
+        return original_prompt
     
     def get_disease_info(self, disease_name: str) -> Optional[Dict[str, Any]]:
         """
@@ -589,6 +1023,11 @@ Hãy ưu tiên thông tin từ cơ sở dữ liệu trên khi trả lời về c
         Args:
             new_disease: New disease data dictionary
         """
+        if not self.writer:
+            print("Error updating disease database: this process does not own the index; "
+                  "update database/diseases.json and run the indexer instead")
+            return
+        
         try:
             # Load existing diseases
             with open(self.database_path, 'r', encoding='utf-8') as f:
@@ -602,12 +1041,18 @@ Hãy ưu tiên thông tin từ cơ sở dữ liệu trên khi trả lời về c
                 json.dump(diseases, f, ensure_ascii=False, indent=2)
             
             # Reindex the collection
-            self.collection.delete()
-            self.collection = self.client.get_or_create_collection(
-                name=self.collection_name,
-                metadata={"hnsw:space": "cosine"}
-            )
-            self._load_and_index_diseases()
+            chunks = self._load_disease_chunks()
+            if self.vector_backend == "numpy":
+                self._initialize_numpy_store(chunks)
+            else:
+                self.client.delete_collection(self.collection_name)
+                self.collection = self.client.get_or_create_collection(
+                    name=self.collection_name,
+                    embedding_function=self.embedding_function,
+                    metadata={"hnsw:space": "cosine"}
+                )
+                self._load_and_index_diseases()
+            self.lexical_index = self._build_lexical_index(chunks)
             
         except Exception as e:
             print(f"Error updating disease database: {str(e)}")
\ No newline at end of file
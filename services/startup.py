@@ -0,0 +1,226 @@
+"""
+Concurrent startup of the heavy, independent resources
+
+The vision model, the knowledge base (Chroma client, tiktoken encoding and
+the embedding model) and the LLM client do not depend on each other, so they
+are built on a thread pool instead of one after another: cold start takes
+as long as the slowest resource rather than the sum of all of them. Each
+process shares one instance of every resource.
+"""
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config.settings import Config
+
+logger = logging.getLogger(__name__)
+
+class Resource:
+    """State of one startup resource"""
+
+    PENDING = "pending"
+    LOADING = "loading"
+    READY = "ready"
+    FAILED = "failed"
+
+    def __init__(self, name, factory, depends_on):
+        self.name = name
+        self.factory = factory
+        self.depends_on = tuple(depends_on)
+        self.status = Resource.PENDING
+        self.value = None
+        self.error = None
+        self.seconds = None
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def is_finished(self):
+        """Check if initialization has completed (successfully or not)"""
+        return self.status in (Resource.READY, Resource.FAILED)
+
+class StartupOrchestrator:
+    """Builds registered resources concurrently, respecting dependencies"""
+
+    def __init__(self, max_workers=4, retry_interval=30.0):
+        """
+        Initialize the orchestrator
+
+        Args:
+            max_workers: Maximum number of resources initialized concurrently
+            retry_interval: Seconds before a failed resource is retried on access
+        """
+        self.retry_interval = retry_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="startup")
+        self._resources = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, factory, depends_on=()):
+        """
+        Register a resource
+
+        Args:
+            name: Resource name
+            factory: Function building the resource; called with the values
+                of its dependencies as keyword arguments
+            depends_on: Names of resources this one needs (registered earlier)
+        """
+        for dependency in depends_on:
+            if dependency not in self._resources:
+                raise ValueError(f"{name} depends on unregistered resource {dependency}")
+        self._resources[name] = Resource(name, factory, depends_on)
+
+    def start(self, names=None):
+        """
+        Start initializing resources in the background (idempotent)
+
+        Args:
+            names: Resources to start, with their dependencies (default: all)
+        """
+        for name in names if names is not None else list(self._resources):
+            self._submit(name)
+
+    def _submit(self, name):
+        resource = self._resources[name]
+        # Dependencies are queued first, so a worker never waits on a
+        # resource that is still behind it in the queue
+        for dependency in resource.depends_on:
+            self._submit(dependency)
+
+        with self._lock:
+            retry = (
+                resource.status == Resource.FAILED
+                and time.monotonic() - resource.finished_at >= self.retry_interval
+            )
+            if resource.status != Resource.PENDING and not retry:
+                return
+            resource.status = Resource.LOADING
+            resource.error = None
+            resource.done.clear()
+        self._executor.submit(self._initialize, resource)
+
+    def _initialize(self, resource):
+        started = time.perf_counter()
+        status = Resource.FAILED
+        try:
+            dependencies = {}
+            for dependency in resource.depends_on:
+                dependencies[dependency] = self.get(dependency)
+            resource.value = resource.factory(**dependencies)
+            status = Resource.READY
+        except Exception as e:
+            resource.error = str(e)
+            logger.error("Error initializing %s: %s", resource.name, e)
+        finally:
+            resource.seconds = time.perf_counter() - started
+            resource.finished_at = time.monotonic()
+            # Published last: other threads read finished_at of a failed resource
+            resource.status = status
+            if resource.status == Resource.READY:
+                logger.info("Initialized %s in %.2fs", resource.name, resource.seconds)
+            resource.done.set()
+
+    def get(self, name, timeout=None):
+        """
+        Get a resource, starting it if needed and waiting until it is built
+
+        Args:
+            name: Resource name
+            timeout: Maximum seconds to wait, or None to wait indefinitely
+
+        Returns:
+            The resource
+
+        Raises:
+            TimeoutError: If the resource is not ready in time
+            RuntimeError: If the resource failed to initialize
+        """
+        self._submit(name)
+        resource = self._resources[name]
+        if not resource.done.wait(timeout):
+            raise TimeoutError(f"{name} is still initializing")
+        if resource.status == Resource.FAILED:
+            raise RuntimeError(f"{name} failed to initialize: {resource.error}")
+        return resource.value
+
+    def peek(self, name):
+        """Get a resource if it is ready, without starting or waiting for it"""
+        resource = self._resources[name]
+        return resource.value if resource.status == Resource.READY else None
+
+    def is_finished(self, name):
+        """Check if a resource has finished initializing (successfully or not)"""
+        return self._resources[name].is_finished()
+
+    def readiness(self, names=None):
+        """
+        Get the readiness probe
+
+        Args:
+            names: Resources that must be ready (default: all)
+
+        Returns:
+            Dictionary with an overall "ready" flag and the status, init
+            duration and error of every resource
+        """
+        resources = {
+            name: {
+                "status": resource.status,
+                "seconds": round(resource.seconds, 3) if resource.seconds is not None else None,
+                "error": resource.error,
+            }
+            for name, resource in self._resources.items()
+        }
+        required = names if names is not None else list(self._resources)
+        return {
+            "ready": all(self._resources[name].status == Resource.READY for name in required),
+            "resources": resources,
+        }
+
+def _create_rag_service():
+    from services.rag_service import RAGService
+
+    rag_service = RAGService()
+    # Load the embedding model now instead of on the first user query
+    rag_service.warm_up()
+    return rag_service
+
+def _create_chat_service(rag_service):
+    from services.chat_service import ChatService
+
+    return ChatService(rag_service=rag_service)
+
+def _create_model_manager():
+    from models.ai_models import ModelManager
+
+    model_manager = ModelManager()
+    model_manager.initialize_models()
+    return model_manager
+
+def _create_diagnosis_service(vision_models, chat_service):
+    from services.diagnosis_service import DiagnosisService
+
+    vision_model = vision_models.get_vision_model()
+    if not vision_model.is_loaded():
+        raise RuntimeError(Config.MODEL_LOAD_ERROR)
+    return DiagnosisService(
+        vision_model,
+        reference_index=vision_models.get_reference_index(),
+        chat_service=chat_service
+    )
+
+@functools.lru_cache(maxsize=None)
+def get_startup_orchestrator():
+    """Get the process-wide orchestrator with the application's resources registered"""
+    orchestrator = StartupOrchestrator(
+        max_workers=Config.STARTUP_MAX_WORKERS,
+        retry_interval=Config.STARTUP_RETRY_INTERVAL
+    )
+    orchestrator.register("rag_service", _create_rag_service)
+    orchestrator.register("chat_service", _create_chat_service, depends_on=("rag_service",))
+    orchestrator.register("vision_models", _create_model_manager)
+    orchestrator.register(
+        "diagnosis_service", _create_diagnosis_service, depends_on=("vision_models", "chat_service")
+    )
+    return orchestrator
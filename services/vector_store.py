@@ -0,0 +1,166 @@
+"""
+Vector stores searched by RAGService
+
+RAGService searches a collection through count() and query(), the subset
+of Chroma's collection API it uses, so a Chroma collection is a vector
+store as is. For a corpus of a few hundred chunks Chroma's client start-up,
+SQLite and HNSW index cost far more than an exact search, so
+NumpyVectorStore keeps the normalized chunk embeddings in a memory-mapped
+.npy matrix with parallel id, document and metadata arrays, and answers a
+query with one matrix-vector product.
+
+The matrix is built from the disease chunks on first use and cached under
+Config.VECTOR_INDEX_DIR, keyed by a fingerprint of the chunks and the
+embedding model, so later processes start without embedding anything.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+CHUNKS_FILE = "chunks.json"
+
+def fingerprint(ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]], model: str) -> str:
+    """Get the key of an index of these chunks embedded by this model"""
+    payload = json.dumps([model, ids, documents, metadatas], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class NumpyVectorStore:
+    """Exact cosine search over an in-memory or memory-mapped embedding matrix"""
+
+    def __init__(self, embeddings, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]],
+                 embedding_function=None):
+        """
+        Initialize the store
+
+        Args:
+            embeddings: (chunks, dimensions) matrix of L2-normalized embeddings
+            ids: Chunk ids, parallel to the rows
+            documents: Chunk texts, parallel to the rows
+            metadatas: Chunk metadata dictionaries, parallel to the rows
+            embedding_function: Embeds query_texts (optional if only embeddings are queried)
+        """
+        self.embeddings = embeddings
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.embedding_function = embedding_function
+
+    @classmethod
+    def open_or_build(cls, directory: str, ids: List[str], documents: List[str],
+                      metadatas: List[Dict[str, Any]], embedding_function, model: str) -> "NumpyVectorStore":
+        """
+        Open the cached index of these chunks, embedding and caching them if needed
+
+        Args:
+            directory: Cache directory of the collection
+            ids: Chunk ids
+            documents: Chunk texts
+            metadatas: Chunk metadata dictionaries
+            embedding_function: Embedding function of documents and queries
+            model: Name of the model embedding_function runs, part of the cache key
+
+        Returns:
+            NumpyVectorStore whose matrix is memory-mapped from the cache
+        """
+        key = fingerprint(ids, documents, metadatas, model)
+        try:
+            with open(os.path.join(directory, CHUNKS_FILE), 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached["fingerprint"] == key:
+                embeddings = np.load(os.path.join(directory, cached["embeddings"]), mmap_mode="r")
+                return cls(embeddings, cached["ids"], cached["documents"], cached["metadatas"], embedding_function)
+        except (OSError, ValueError, KeyError):
+            pass
+
+        embeddings = _normalize(np.asarray(embedding_function(documents), dtype=np.float32)) \
+            if documents else np.zeros((0, 0), dtype=np.float32)
+        matrix_path = cls._save(directory, key, embeddings, ids, documents, metadatas)
+        print(f"Built NumPy vector index of {len(documents)} chunks in {directory}")
+        return cls(np.load(matrix_path, mmap_mode="r"), ids, documents, metadatas, embedding_function)
+
+    @staticmethod
+    def _save(directory, key, embeddings, ids, documents, metadatas):
+        """
+        Write the matrix and then the chunk file naming it
+
+        Each process writes to temporary files and renames them, so readers
+        only ever see a complete index; the matrix file name carries the
+        fingerprint, so a chunk file never points at another build's matrix.
+
+        Returns:
+            Path of the matrix file
+        """
+        os.makedirs(directory, exist_ok=True)
+        matrix_name = f"embeddings-{key[:16]}.npy"
+        with tempfile.NamedTemporaryFile(dir=directory, suffix=".npy", delete=False) as f:
+            np.save(f, embeddings)
+        os.replace(f.name, os.path.join(directory, matrix_name))
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=directory, suffix=".json", delete=False) as f:
+            json.dump({"fingerprint": key, "embeddings": matrix_name, "ids": ids,
+                       "documents": documents, "metadatas": metadatas}, f, ensure_ascii=False)
+        os.replace(f.name, os.path.join(directory, CHUNKS_FILE))
+
+        # Open memory maps keep removed files readable
+        for name in os.listdir(directory):
+            if name.startswith("embeddings-") and name != matrix_name:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+        return os.path.join(directory, matrix_name)
+
+    def count(self) -> int:
+        """Get the number of indexed chunks"""
+        return len(self.ids)
+
+    def peek(self, limit: int = 10) -> Dict[str, Any]:
+        """Get the first chunks, like Chroma's peek()"""
+        return {"ids": self.ids[:limit], "documents": self.documents[:limit], "metadatas": self.metadatas[:limit]}
+
+    def query(self, query_texts: Optional[List[str]] = None, query_embeddings=None, n_results: int = 10,
+              include=("documents", "metadatas", "distances")) -> Dict[str, Any]:
+        """
+        Find the chunks nearest to each query, like Chroma's query()
+
+        Args:
+            query_texts: Query texts, embedded by the store
+            query_embeddings: Query embeddings, instead of query_texts
+            n_results: Number of chunks per query
+            include: Fields to return besides "ids"
+
+        Returns:
+            Dictionary of field to one list per query
+        """
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(query_texts)
+        queries = _normalize(np.asarray(query_embeddings, dtype=np.float32))
+        results = {"ids": []}
+        results.update({field: [] for field in include})
+        if not self.ids:
+            for values in results.values():
+                values.extend([] for _ in queries)
+            return results
+
+        # Cosine similarity of every query to every chunk in one product
+        similarities = queries @ self.embeddings.T
+        k = min(n_results, len(self.ids))
+        for row in similarities:
+            top = np.argpartition(-row, k - 1)[:k]
+            top = top[np.argsort(-row[top])]
+            results["ids"].append([self.ids[i] for i in top])
+            if "documents" in results:
+                results["documents"].append([self.documents[i] for i in top])
+            if "metadatas" in results:
+                results["metadatas"].append([self.metadatas[i] for i in top])
+            if "distances" in results:
+                results["distances"].append([float(1.0 - row[i]) for i in top])
+        return results
+
+def _normalize(matrix):
+    """L2-normalize the rows of a matrix"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
@@ -1,8 +1,11 @@
 """
 UI Components for the medical chatbot
 """
+import html
 import streamlit as st
 from config.settings import Config
+from utils.image_assets import get_thumbnail_cache
+from utils.helpers import SessionManager
 
 class UIComponents:
     """Class containing all UI components"""
@@ -61,8 +64,26 @@ class UIComponents:
                 with st.chat_message(message["role"]):
                     if message["role"] == "user" and "image" in message:
                         st.image(message["image"], width=Config.IMAGE_WIDTH)
+                    if message.get("images"):
+                        st.markdown("**Hình ảnh minh họa bệnh tương tự:**")
+                        UIComponents.render_disease_images(message["images"])
                     st.markdown(message["content"])
 
+    @staticmethod
+    def render_load_older_button(spilled_pages):
+        """
+        Render a button to page older, spilled messages back in
+        
+        Args:
+            spilled_pages: Number of message pages stored on disk
+            
+        Returns:
+            bool: True if the button was clicked
+        """
+        if not spilled_pages:
+            return False
+        return st.button("⬆️ Xem tin nhắn cũ hơn", key="load_older_messages")
+    
     @staticmethod
     def render_chat_input_with_diagnosis():
         """
@@ -98,24 +119,52 @@ class UIComponents:
         
         # Display images in columns
         if len(display_images) == 1:
-            st.image(display_images[0], width=300, caption="Hình ảnh minh họa bệnh")
+            UIComponents._render_reference_image(display_images[0], 300, "Hình ảnh minh họa bệnh")
         elif len(display_images) == 2:
             col1, col2 = st.columns(2)
             with col1:
-                st.image(display_images[0], width=200, caption="Hình ảnh 1")
+                UIComponents._render_reference_image(display_images[0], 200, "Hình ảnh 1")
             with col2:
-                st.image(display_images[1], width=200, caption="Hình ảnh 2")
+                UIComponents._render_reference_image(display_images[1], 200, "Hình ảnh 2")
         else:  # 3 or more images
             col1, col2, col3 = st.columns(3)
             with col1:
-                st.image(display_images[0], width=150, caption="Hình ảnh 1")
+                UIComponents._render_reference_image(display_images[0], 150, "Hình ảnh 1")
             with col2:
-                st.image(display_images[1], width=150, caption="Hình ảnh 2") 
+                UIComponents._render_reference_image(display_images[1], 150, "Hình ảnh 2")
             with col3:
-                st.image(display_images[2], width=150, caption="Hình ảnh 3")
+                UIComponents._render_reference_image(display_images[2], 150, "Hình ảnh 3")
         
         st.markdown("---")
     
+    @staticmethod
+    def render_prediction_summary(predictions):
+        """
+        Render the vision model's top predictions
+        
+        Args:
+            predictions: List of predictions with labels and scores
+        """
+        lines = [
+            f"{i}. **{pred['label']}** — {pred['score'] * 100:.1f}%"
+            for i, pred in enumerate(predictions, 1)
+        ]
+        st.markdown("**Kết quả phân tích ảnh:**\n\n" + "\n".join(lines))
+    
+    @staticmethod
+    def _render_reference_image(image_path, width, caption):
+        """
+        Render a reference image from the pre-generated thumbnail cache
+        
+        Args:
+            image_path: Absolute image path
+            width: Display width in pixels
+            caption: Image caption
+        """
+        thumbnail = get_thumbnail_cache().get(image_path, width)
+        if thumbnail is not None:
+            st.image(thumbnail, width=width, caption=caption)
+    
     @staticmethod
     def render_quick_question_popup(disease_name: str) -> bool:
         """
@@ -175,12 +224,16 @@ class UIComponents:
         return st.chat_input("Nhập tin nhắn của bạn...", key="main_chat_input")
 
     @staticmethod
-    def render_sidebar(model_status):
+    def render_sidebar(model_status, cache_stats=None, deferred=False):
         """
         Render sidebar with information
         
         Args:
-            model_status: Boolean indicating if models are loaded
+            model_status: Boolean indicating if models are loaded, or None
+                while they are still loading in the background
+            cache_stats: Optional prediction cache statistics
+            deferred: The models have not started loading and will load on
+                the first diagnosis
         """
         with st.sidebar:
             st.markdown("### ℹ️ Thông tin")
@@ -200,7 +253,7 @@ class UIComponents:
             """)
             
             if st.button("🗑️ Xóa lịch sử chat", key="clear_chat_history"):
-                st.session_state.messages = []
+                SessionManager.clear_messages()
                 st.rerun()
             
             st.markdown("---")
@@ -209,10 +262,85 @@ class UIComponents:
             st.markdown("- Vision: DinoV2 SkinDisease (Local)")
             
             # Model status indicator
-            if model_status:
+            if deferred:
+                st.info("💤 Model sẽ được tải khi bạn mở chẩn đoán")
+            elif model_status:
                 st.success("✅ Model đã load thành công")
+            elif model_status is None:
+                st.info("⏳ Model đang được tải...")
             else:
                 st.error("❌ Model chưa load được")
+            
+            # Prediction cache metrics
+            if cache_stats:
+                st.caption(
+                    f"Cache dự đoán: {cache_stats['hits']} hit / {cache_stats['misses']} miss "
+                    f"({cache_stats['hit_rate'] * 100:.0f}%), "
+                    f"{cache_stats['size']}/{cache_stats['max_entries']} ảnh"
+                )
+
+    @staticmethod
+    def render_trace_waterfall(trace):
+        """
+        Render the span waterfall of a trace (debug panel)
+        
+        Args:
+            trace: Trace from the tracer, or None if there is none yet
+        """
+        st.markdown("---")
+        st.markdown("**🔍 Trace lượt gần nhất:**")
+        if trace is None:
+            st.caption("Chưa có trace nào.")
+            return
+        
+        rows = trace.waterfall()
+        total_ms = max((row["offset_ms"] + (row["duration_ms"] or 0) for row in rows), default=0) or 1
+        bars = []
+        for row in rows:
+            duration = row["duration_ms"] or 0
+            left = row["offset_ms"] / total_ms * 100
+            width = max(duration / total_ms * 100, 0.5)
+            color = "#e74c3c" if row["error"] else "#3498db"
+            bars.append(
+                f'<div style="font-size:0.75rem;margin:2px 0;" title="{html.escape(str(row["attributes"]))}">'
+                f'<div style="padding-left:{row["depth"] * 0.6}rem;">{html.escape(row["name"])} '
+                f'<span style="color:#888;">{duration:.1f} ms</span></div>'
+                f'<div style="background:#eee;height:6px;position:relative;">'
+                f'<div style="position:absolute;left:{left:.2f}%;width:{width:.2f}%;height:6px;background:{color};"></div>'
+                f'</div></div>'
+            )
+        st.caption(f"{trace.root_name} — {total_ms:.0f} ms")
+        st.markdown("".join(bars), unsafe_allow_html=True)
+
+    @staticmethod
+    def render_token_usage(totals, last_calls):
+        """
+        Render the LLM token usage of the session (debug panel)
+        
+        Args:
+            totals: Session totals from the usage ledger, or None
+            last_calls: List with the session's last recorded call (may be empty)
+        """
+        st.markdown("**🧮 Token:**")
+        if not totals:
+            st.caption("Chưa có lượt gọi LLM nào.")
+            return
+        
+        st.caption(
+            f"{totals['calls']} lượt — prompt {totals['prompt_tokens']}, "
+            f"completion {totals['completion_tokens']} (reasoning {totals['reasoning_tokens']}), "
+            f"lớn nhất {totals['max_prompt_tokens']}, ${totals['cost']:.4f}"
+        )
+        if last_calls:
+            last = last_calls[0]
+            breakdown = last["breakdown"]
+            st.caption(
+                f"Lượt cuối ({last['intent']}): system {breakdown['system']}, "
+                f"RAG {breakdown['context']}, lịch sử {breakdown['history']} → "
+                f"prompt {last['prompt_tokens']} ({last['source']})"
+            )
+            if last["over_budget"]:
+                st.warning(f"Prompt vượt ngân sách {Config.PROMPT_TOKEN_BUDGET} token")
 
     @staticmethod
     def render_custom_css():
@@ -0,0 +1,361 @@
+"""
+SQLite-backed conversation store for SessionManager
+
+Conversations are persisted to a SQLite database in WAL mode so that they
+survive restarts and can be served by any app process on the node. Message
+writes are queued and committed in batches by a background writer thread,
+images are stored once by content hash, and recent messages of active
+sessions are kept in an in-memory write-through cache.
+
+Several processes may serve the same session, so sequence numbers are
+allocated by the writer inside the insert transaction (the caller's number
+is provisional and is updated in place), and a cached session is checked
+against the highest sequence number in the database before it is served.
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+
+import streamlit as st
+
+from config.settings import Config
+from utils.metrics import register_collector
+
+WORKSPACE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    image_hash TEXT,
+    reference_images TEXT,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (session_id, seq)
+);
+CREATE TABLE IF NOT EXISTS images (
+    hash TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    width INTEGER,
+    height INTEGER
+);
+"""
+
+class SQLiteConversationStore:
+    """Conversation persistence with deferred batched writes"""
+
+    def __init__(self, db_path, flush_interval=0.2, batch_size=100,
+                 cache_sessions=128, cache_messages=50, page_messages=20):
+        """
+        Initialize the store
+
+        Args:
+            db_path: Path of the SQLite database file
+            flush_interval: Maximum seconds a queued write waits before commit
+            batch_size: Maximum writes committed per transaction
+            cache_sessions: Number of active sessions kept in the cache
+            cache_messages: Number of recent messages cached per session
+            page_messages: Number of messages loaded per page of older history
+        """
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.cache_sessions = cache_sessions
+        self.cache_messages = cache_messages
+        self.page_messages = page_messages
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._queue = queue.Queue()
+        # Queued writes per session, so a read waits only for its own session
+        self._pending = Counter()
+        self._pending_changed = threading.Condition()
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+        self._writer = threading.Thread(target=self._writer_loop, name="conversation-writer", daemon=True)
+        self._writer.start()
+
+    def _connection(self):
+        """Get this thread's database connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ------------------------------------------------------------------
+    # Writes (deferred off the request path)
+    # ------------------------------------------------------------------
+
+    def append_message(self, session_id, message):
+        """
+        Queue a message for persistence and add it to the cache
+
+        Args:
+            session_id: Session identifier
+            message: Message dictionary with a provisional 'seq' number; the
+                writer replaces it with the number allocated in the database
+        """
+        with self._pending_changed:
+            self._pending[session_id] += 1
+        with self._cache_lock:
+            entry = self._cache.get(session_id)
+            if entry is not None:
+                entry["messages"].append(message)
+                if len(entry["messages"]) > self.cache_messages:
+                    del entry["messages"][:-self.cache_messages]
+                    entry["complete"] = False
+                self._cache.move_to_end(session_id)
+        self._queue.put(("append", session_id, message, time.time()))
+
+    def clear_session(self, session_id):
+        """Queue deletion of all messages of a session"""
+        with self._pending_changed:
+            self._pending[session_id] += 1
+        with self._cache_lock:
+            self._cache[session_id] = {"messages": [], "complete": True, "db_seq": -1}
+        self._queue.put(("clear", session_id, None, time.time()))
+
+    def flush(self):
+        """Block until all queued writes are committed"""
+        self._queue.join()
+
+    def _wait_for_writes(self, session_id):
+        """Block until the queued writes of one session are committed"""
+        with self._pending_changed:
+            self._pending_changed.wait_for(lambda: not self._pending[session_id])
+
+    def _writer_loop(self):
+        """Commit queued writes in batches"""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                print(f"Error writing conversation batch: {str(e)}")
+            finally:
+                with self._pending_changed:
+                    for _, session_id, _, _ in batch:
+                        self._pending[session_id] -= 1
+                        if not self._pending[session_id]:
+                            del self._pending[session_id]
+                    self._pending_changed.notify_all()
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_batch(self, batch):
+        """Write a batch of queued operations in one transaction"""
+        conn = self._connection()
+        # Highest committed sequence number of each session before and after this batch
+        base_seqs = {}
+        last_seqs = {}
+        with conn:
+            # Take the write lock up front so the sequence numbers read below
+            # cannot be taken by another process before we insert
+            conn.execute("BEGIN IMMEDIATE")
+            for op, session_id, message, timestamp in batch:
+                conn.execute(
+                    "INSERT INTO sessions (session_id, created_at, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(session_id) DO UPDATE SET updated_at = excluded.updated_at",
+                    (session_id, timestamp, timestamp)
+                )
+                if op == "clear":
+                    conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+                    base_seqs.setdefault(session_id, -1)
+                    last_seqs[session_id] = -1
+                    continue
+
+                image_hash = message.get("image_hash") if "image" in message else None
+                if image_hash:
+                    width, height = message.get("image_size") or (None, None)
+                    conn.execute(
+                        "INSERT OR IGNORE INTO images (hash, data, width, height) VALUES (?, ?, ?, ?)",
+                        (image_hash, message["image"], width, height)
+                    )
+                reference_images = json.dumps(message["images"]) if message.get("images") else None
+                seq = conn.execute(
+                    "SELECT COALESCE(MAX(seq), -1) + 1 FROM messages WHERE session_id = ?", (session_id,)
+                ).fetchone()[0]
+                conn.execute(
+                    "INSERT INTO messages "
+                    "(session_id, seq, role, content, image_hash, reference_images, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (session_id, seq, message["role"], message["content"],
+                     image_hash, reference_images, timestamp)
+                )
+                message["seq"] = seq
+                base_seqs.setdefault(session_id, seq - 1)
+                last_seqs[session_id] = seq
+
+        # A cached session that was up to date is still up to date; one that
+        # missed another process's writes keeps its old number and is reloaded
+        with self._cache_lock:
+            for session_id, seq in last_seqs.items():
+                entry = self._cache.get(session_id)
+                if entry is not None and entry["db_seq"] == base_seqs[session_id]:
+                    entry["db_seq"] = seq
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def load_messages(self, session_id, before_seq=None, limit=None):
+        """
+        Load messages of a session, oldest first
+
+        Args:
+            session_id: Session identifier
+            before_seq: Only load messages older than this sequence number
+            limit: Maximum number of (most recent) messages to load
+
+        Returns:
+            List of message dictionaries
+        """
+        if before_seq is None:
+            # Another process may have written to the session since it was cached
+            db_seq = self._db_max_seq(session_id)
+            with self._cache_lock:
+                entry = self._cache.get(session_id)
+                if entry is not None and entry["db_seq"] == db_seq and (
+                        entry["complete"] or (limit and len(entry["messages"]) >= limit)):
+                    self._cache.move_to_end(session_id)
+                    messages = entry["messages"]
+                    return list(messages[-limit:] if limit else messages)
+
+            # Make sure this session's pending writes are visible
+            self._wait_for_writes(session_id)
+
+        query = (
+            "SELECT m.seq, m.role, m.content, m.image_hash, m.reference_images, i.data, i.width, i.height "
+            "FROM messages m LEFT JOIN images i ON i.hash = m.image_hash "
+            "WHERE m.session_id = ?"
+        )
+        params = [session_id]
+        if before_seq is not None:
+            query += " AND m.seq < ?"
+            params.append(before_seq)
+        query += " ORDER BY m.seq DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        rows = self._connection().execute(query, params).fetchall()
+        messages = []
+        for seq, role, content, image_hash, reference_images, data, width, height in reversed(rows):
+            message = {"role": role, "content": content, "seq": seq}
+            if image_hash and data is not None:
+                message.update({"image": data, "image_size": (width, height), "image_hash": image_hash})
+            if reference_images:
+                message["images"] = json.loads(reference_images)
+            messages.append(message)
+
+        if before_seq is None:
+            self._remember(session_id, messages, complete=not limit or len(messages) < limit)
+        return messages
+
+    def _remember(self, session_id, messages, complete):
+        """Put the recent messages of a session in the cache"""
+        with self._cache_lock:
+            self._cache[session_id] = {
+                "messages": list(messages[-self.cache_messages:]),
+                "complete": complete and len(messages) <= self.cache_messages,
+                "db_seq": messages[-1]["seq"] if messages else -1,
+            }
+            self._cache.move_to_end(session_id)
+            while len(self._cache) > self.cache_sessions:
+                self._cache.popitem(last=False)
+
+    def count_messages(self, session_id, before_seq=None):
+        """Count committed messages of a session (queued writes are not waited for)"""
+        query = "SELECT COUNT(*) FROM messages WHERE session_id = ?"
+        params = [session_id]
+        if before_seq is not None:
+            query += " AND seq < ?"
+            params.append(before_seq)
+        return self._connection().execute(query, params).fetchone()[0]
+
+    def max_seq(self, session_id):
+        """
+        Get the highest sequence number of a session (-1 if none)
+
+        Includes cached messages that are still queued, without waiting for
+        them; the writer allocates the final numbers anyway.
+        """
+        seq = self._db_max_seq(session_id)
+        with self._cache_lock:
+            entry = self._cache.get(session_id)
+            if entry is not None and entry["messages"]:
+                seq = max(seq, entry["messages"][-1]["seq"])
+        return seq
+
+    def _db_max_seq(self, session_id):
+        """Get the highest committed sequence number of a session (-1 if none)"""
+        row = self._connection().execute(
+            "SELECT MAX(seq) FROM messages WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return row[0] if row[0] is not None else -1
+
+    def queue_depth(self):
+        """Get the number of writes waiting to be committed"""
+        return self._queue.qsize()
+
+    # ------------------------------------------------------------------
+    # Spill store interface used by SessionManager's memory budget
+    # ------------------------------------------------------------------
+
+    def spill(self, session_id, messages):
+        """Drop messages from memory; they are already persisted write-through"""
+
+    def page_in(self, session_id, before_seq=None):
+        """Load the page of history just older than the oldest resident message"""
+        if before_seq is None:
+            return []
+        return self.load_messages(session_id, before_seq=before_seq, limit=self.page_messages)
+
+    def spilled_page_count(self, session_id, before_seq=None):
+        """Get the number of pages of history older than the resident messages"""
+        if before_seq is None:
+            return 0
+        count = self.count_messages(session_id, before_seq=before_seq)
+        return -(-count // self.page_messages)
+
+    def clear(self, session_id):
+        """Delete all messages of a session"""
+        self.clear_session(session_id)
+
+@st.cache_resource
+def get_conversation_store():
+    """Get the process-wide SQLite conversation store"""
+    store = SQLiteConversationStore(
+        Config.SESSION_DB_PATH or os.path.join(WORKSPACE_ROOT, ".cache", "conversations.sqlite3"),
+        flush_interval=Config.SESSION_WRITE_FLUSH_INTERVAL,
+        page_messages=Config.SESSION_PAGE_MESSAGES
+    )
+    register_collector("queue:conversation_writes", lambda: {("conversation_writes",): store.queue_depth()})
+    return store
@@ -1,18 +1,63 @@
 """
 Utility functions for the medical chatbot
 """
+import uuid
 import streamlit as st
+from config.settings import Config
+from utils.image_assets import encode_history_image
+from utils.session_store import estimate_size, get_spill_store, get_session_memory_gauge
+from utils.conversation_store import get_conversation_store
 
 class SessionManager:
     """Manages Streamlit session state"""
     
+    @staticmethod
+    def _use_conversation_store():
+        """Check if conversations are persisted in the SQLite store"""
+        return Config.SESSION_BACKEND == "sqlite"
+    
+    @staticmethod
+    def _get_history_store():
+        """Get the store that holds history dropped from memory"""
+        if SessionManager._use_conversation_store():
+            return get_conversation_store()
+        return get_spill_store()
+    
     @staticmethod
     def initialize_session():
         """Initialize session state variables"""
+        if "session_id" not in st.session_state:
+            if SessionManager._use_conversation_store():
+                # Keep the session id in the URL so any app process can resume it
+                session_id = st.query_params.get("sid") or uuid.uuid4().hex
+                st.query_params["sid"] = session_id
+            else:
+                session_id = uuid.uuid4().hex
+            st.session_state.session_id = session_id
         if "messages" not in st.session_state:
-            st.session_state.messages = []
+            if SessionManager._use_conversation_store():
+                store = get_conversation_store()
+                st.session_state.messages = store.load_messages(
+                    st.session_state.session_id, limit=Config.SESSION_RESTORE_MESSAGES
+                )
+                st.session_state.next_seq = store.max_seq(st.session_state.session_id) + 1
+            else:
+                st.session_state.messages = []
         if "show_diagnosis" not in st.session_state:
             st.session_state.show_diagnosis = False
+        if "diagnosis_job_id" not in st.session_state:
+            st.session_state.diagnosis_job_id = None
+        if "quick_question_disease" not in st.session_state:
+            st.session_state.quick_question_disease = None
+        if "budget_checked_count" not in st.session_state:
+            st.session_state.budget_checked_count = len(st.session_state.messages)
+        if "paged_in_bytes" not in st.session_state:
+            st.session_state.paged_in_bytes = 0
+    
+    @staticmethod
+    def get_session_id():
+        """Get the unique identifier of the current session"""
+        return st.session_state.session_id
     
     @staticmethod
     def get_messages():
@@ -20,24 +65,125 @@ class SessionManager:
         return st.session_state.messages
     
     @staticmethod
-    def add_message(role, content, image=None):
+    def add_message(role, content, image=None, images=None):
         """
         Add message to chat history
         
         Args:
             role: 'user' or 'assistant'
             content: Message content
-            image: Optional PIL image
+            image: Optional PIL image, stored as a compact encoded thumbnail
+            images: Optional list of reference image paths shown with the message
         """
         message = {"role": role, "content": content}
         if image is not None:
-            message["image"] = image
+            message.update(encode_history_image(image))
+        if images:
+            message["images"] = images
         st.session_state.messages.append(message)
+        SessionManager.persist_messages()
+    
+    @staticmethod
+    def persist_messages():
+        """
+        Queue new messages for persistence in the conversation store
+        
+        Messages appended directly to the history list are picked up here too;
+        a message counts as persisted once it has a sequence number.
+        """
+        if not SessionManager._use_conversation_store():
+            return
+        
+        store = get_conversation_store()
+        for message in st.session_state.messages:
+            if "seq" not in message:
+                message["seq"] = st.session_state.next_seq
+                st.session_state.next_seq += 1
+                store.append_message(st.session_state.session_id, message)
     
     @staticmethod
     def clear_messages():
-        """Clear all messages"""
+        """Clear all messages, including any spilled or persisted ones"""
         st.session_state.messages = []
+        st.session_state.budget_checked_count = 0
+        st.session_state.paged_in_bytes = 0
+        SessionManager._get_history_store().clear(st.session_state.session_id)
+    
+    @staticmethod
+    def _oldest_resident_seq():
+        """Get the sequence number of the oldest message still in memory"""
+        messages = st.session_state.messages
+        if messages:
+            return messages[0].get("seq")
+        return st.session_state.get("next_seq")
+    
+    @staticmethod
+    def get_session_size():
+        """
+        Get the approximate memory held by the current session
+        
+        Covers message text, encoded images and any cached contexts kept in
+        session state.
+        
+        Returns:
+            int: Approximate size in bytes
+        """
+        return sum(estimate_size(value) for value in st.session_state.to_dict().values())
+    
+    @staticmethod
+    def enforce_memory_budget():
+        """
+        Spill the oldest turns to disk when the session is over budget
+        
+        Only runs when new messages were added since the last check. Pages
+        loaded back by the user raise the budget by their size, so they stay
+        resident until the session has grown by a full budget on top of them.
+        
+        Returns:
+            int: Session size in bytes after spilling
+        """
+        messages = st.session_state.messages
+        size = SessionManager.get_session_size()
+        
+        if len(messages) > st.session_state.budget_checked_count:
+            if size > Config.SESSION_MEMORY_BUDGET_BYTES + st.session_state.paged_in_bytes:
+                # Spill down to a lower watermark so we don't spill on every turn
+                target = Config.SESSION_MEMORY_BUDGET_BYTES * 0.75
+                st.session_state.paged_in_bytes = 0
+                max_spill = max(len(messages) - Config.SESSION_MIN_RESIDENT_MESSAGES, 0)
+                spill_count = 0
+                while spill_count < max_spill and size > target:
+                    size -= estimate_size(messages[spill_count])
+                    spill_count += 1
+                
+                if spill_count:
+                    SessionManager.persist_messages()
+                    SessionManager._get_history_store().spill(
+                        st.session_state.session_id, messages[:spill_count]
+                    )
+                    del messages[:spill_count]
+            
+            st.session_state.budget_checked_count = len(messages)
+        
+        get_session_memory_gauge().report(st.session_state.session_id, size)
+        return size
+    
+    @staticmethod
+    def get_spilled_page_count():
+        """Get the number of older message pages spilled to disk"""
+        return SessionManager._get_history_store().spilled_page_count(
+            st.session_state.session_id, before_seq=SessionManager._oldest_resident_seq()
+        )
+    
+    @staticmethod
+    def load_older_messages():
+        """Page the most recently spilled messages back into the session"""
+        older_messages = SessionManager._get_history_store().page_in(
+            st.session_state.session_id, before_seq=SessionManager._oldest_resident_seq()
+        )
+        st.session_state.messages[:0] = older_messages
+        st.session_state.budget_checked_count = len(st.session_state.messages)
+        st.session_state.paged_in_bytes += estimate_size(older_messages)
     
     @staticmethod
     def set_diagnosis_mode(show):
@@ -0,0 +1,234 @@
+"""
+Image asset layer for disease reference images and chat history images
+
+Reference JPEGs are full resolution but only ever shown at a few fixed widths.
+Thumbnails are generated once per (image, width), kept as encoded bytes in a
+bounded in-memory LRU backed by a disk cache, and handed to st.image directly
+so reruns never decode, resize or re-encode the originals again. Uploaded
+images are likewise stored in chat history as compact encoded thumbnails.
+"""
+import functools
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image
+
+from config.settings import Config
+from utils.metrics import cache_samples, register_collector
+
+WORKSPACE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMAGES_DIR = os.path.join(WORKSPACE_ROOT, "database", "disease_images")
+
+# Paths found on disk, and missing paths with the time they are checked again
+_existing_paths = set()
+_missing_until = {}
+_exists_lock = threading.Lock()
+
+def image_exists(path):
+    """
+    Check whether an image file exists
+
+    Existing paths hit the filesystem only once; missing paths are
+    re-checked after Config.IMAGE_MISSING_TTL seconds, so images added
+    while the app runs are found.
+
+    Args:
+        path: Absolute image path
+
+    Returns:
+        bool: True if the file exists
+    """
+    with _exists_lock:
+        if path in _existing_paths:
+            return True
+        if time.monotonic() < _missing_until.get(path, 0.0):
+            return False
+
+    exists = os.path.exists(path)
+    with _exists_lock:
+        if exists:
+            _existing_paths.add(path)
+            _missing_until.pop(path, None)
+        else:
+            _missing_until[path] = time.monotonic() + Config.IMAGE_MISSING_TTL
+    return exists
+
+class ThumbnailCache:
+    """Bounded in-memory LRU of encoded thumbnails backed by a disk cache"""
+
+    def __init__(self, cache_dir, max_bytes=32 * 1024 * 1024, scale=2, quality=85):
+        """
+        Initialize the cache
+
+        Args:
+            cache_dir: Directory for the on-disk thumbnail cache
+            max_bytes: Maximum total size of thumbnails kept in memory
+            scale: Pixel density multiplier over the display width
+            quality: JPEG quality for generated thumbnails
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.scale = scale
+        self.quality = quality
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _disk_path(self, path, width):
+        """Get the disk cache path for an image at a given width"""
+        stat = os.stat(path)
+        key = f"{path}:{stat.st_mtime_ns}:{stat.st_size}:{width}:{self.scale}:{self.quality}"
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".jpg")
+
+    def _generate(self, path, width):
+        """Decode, resize and encode a thumbnail"""
+        with Image.open(path) as image:
+            image = image.convert("RGB")
+            target_width = width * self.scale
+            if image.width > target_width:
+                height = round(image.height * target_width / image.width)
+                image = image.resize((target_width, height), Image.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=self.quality, optimize=True)
+            return buffer.getvalue()
+
+    def _remember(self, key, data):
+        """Insert into the in-memory LRU, evicting the oldest entries"""
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = data
+            self._total_bytes += len(data)
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= len(evicted)
+
+    def get(self, path, width):
+        """
+        Get an encoded thumbnail for an image
+
+        Args:
+            path: Absolute image path
+            width: Display width in pixels
+
+        Returns:
+            JPEG bytes, or None if the image does not exist
+        """
+        key = (path, width)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+            self.misses += 1
+
+        if not image_exists(path):
+            return None
+
+        try:
+            disk_path = self._disk_path(path, width)
+            if os.path.exists(disk_path):
+                with open(disk_path, 'rb') as f:
+                    data = f.read()
+            else:
+                data = self._generate(path, width)
+                # Write atomically so concurrent workers never read partial files
+                tmp_path = f"{disk_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, disk_path)
+        except Exception as e:
+            print(f"Error generating thumbnail for {path}: {str(e)}")
+            return None
+
+        self._remember(key, data)
+        return data
+
+    def prewarm(self, paths, widths):
+        """
+        Generate thumbnails ahead of time
+
+        Args:
+            paths: Absolute image paths
+            widths: Display widths to generate
+        """
+        for path in paths:
+            for width in widths:
+                self.get(path, width)
+
+    def stats(self):
+        """Get cache statistics"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "bytes": self._total_bytes,
+            }
+
+def encode_history_image(image, content_hash=None, max_width=None, quality=85):
+    """
+    Encode an uploaded image as a compact thumbnail for chat history
+
+    History only ever displays images at Config.IMAGE_WIDTH, so keeping the
+    decoded full-resolution pixels in session state wastes server memory and
+    forces a re-encode on every rerun.
+
+    Args:
+        image: PIL Image object
+        content_hash: Optional hash of the original upload bytes
+        max_width: Maximum thumbnail width (defaults to 2x the display width)
+        quality: JPEG quality
+
+    Returns:
+        Dictionary with 'image' (JPEG bytes), 'image_size' (width, height)
+        and 'image_hash' message fields
+    """
+    max_width = max_width or Config.IMAGE_WIDTH * 2
+    thumbnail = image.convert("RGB")
+    if thumbnail.width > max_width:
+        height = round(thumbnail.height * max_width / thumbnail.width)
+        thumbnail = thumbnail.resize((max_width, height), Image.LANCZOS)
+
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, format="JPEG", quality=quality, optimize=True)
+    data = buffer.getvalue()
+
+    return {
+        "image": data,
+        "image_size": thumbnail.size,
+        "image_hash": content_hash or hashlib.sha256(data).hexdigest(),
+    }
+
+def list_reference_images():
+    """List absolute paths of all reference disease images"""
+    if not os.path.isdir(IMAGES_DIR):
+        return []
+    return sorted(
+        os.path.join(IMAGES_DIR, name) for name in os.listdir(IMAGES_DIR)
+        if name.lower().endswith(('.jpg', '.jpeg', '.png'))
+    )
+
+@functools.lru_cache(maxsize=None)
+def get_thumbnail_cache():
+    """Get the process-wide thumbnail cache, pre-generating reference thumbnails"""
+    cache = ThumbnailCache(
+        os.path.join(WORKSPACE_ROOT, ".cache", "thumbnails"),
+        max_bytes=Config.THUMBNAIL_CACHE_MAX_BYTES
+    )
+    register_collector("cache:thumbnail", lambda: cache_samples("thumbnail", cache.stats()))
+    threading.Thread(
+        target=cache.prewarm,
+        args=(list_reference_images(), Config.THUMBNAIL_WIDTHS),
+        name="thumbnail-prewarm",
+        daemon=True
+    ).start()
+    return cache
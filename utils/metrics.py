@@ -0,0 +1,372 @@
+"""
+Operational metrics in the Prometheus text format
+
+A small in-house registry of counters, gauges and histograms; values that
+already live elsewhere (cache statistics, queue depths) are read through
+callbacks at scrape time. start_metrics_server() serves /metrics from a
+daemon thread, so it also works next to the Streamlit server:
+
+    METRICS_PORT=9464 streamlit run app.py
+    curl http://127.0.0.1:9464/metrics
+
+The headless API also exposes the registry of the worker that serves the
+request at GET /metrics.
+"""
+import bisect
+import logging
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config.settings import Config
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, 120.0)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+class _Metric:
+    """Base class of labeled metrics"""
+
+    TYPE = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._function = None
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def set_function(self, function):
+        """
+        Read the metric from a callback at scrape time
+
+        For values that are already counted elsewhere, e.g. cache statistics.
+
+        Args:
+            function: Callable returning a number, or a dictionary of
+                label-value tuples to numbers for labeled metrics
+        """
+        self._function = function
+
+    def value(self, **labels):
+        """Get the current directly recorded value for a label combination"""
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        """Render the metric in the text exposition format"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+    def _samples(self):
+        with self._lock:
+            values = dict(self._values)
+        if self._function is not None:
+            try:
+                result = self._function()
+            except Exception as e:
+                logger.error("Error reading metric %s: %s", self.name, e)
+                result = None
+            if isinstance(result, dict):
+                values.update({tuple(str(v) for v in key): value for key, value in result.items()})
+            elif result is not None:
+                values[()] = result
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    TYPE = "counter"
+
+    def inc(self, amount=1, **labels):
+        """
+        Increase the counter
+
+        Args:
+            amount: Non-negative increment
+            labels: Label values
+        """
+        if amount < 0:
+            raise ValueError("counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+
+    TYPE = "gauge"
+
+    def set(self, value, **labels):
+        """Set the gauge"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets"""
+
+    TYPE = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        """
+        Record an observation
+
+        Args:
+            value: Observed value (seconds for latencies)
+            labels: Label values
+        """
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def time(self, **labels):
+        """Context manager observing the duration of its block"""
+        return _Timer(self, labels)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+class Registry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Register a metric (names must be unique)"""
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Render every metric in the text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+class SessionActivity:
+    """Tracks when sessions were last seen, to count active sessions"""
+
+    def __init__(self, window=300):
+        """
+        Initialize the tracker
+
+        Args:
+            window: Seconds after its last request that a session counts as active
+        """
+        self.window = window
+        self._last_seen = {}
+        self._lock = threading.Lock()
+
+    def touch(self, session_id):
+        """Record a request of a session"""
+        with self._lock:
+            self._last_seen[session_id] = time.monotonic()
+
+    def count(self):
+        """Count active sessions, forgetting inactive ones"""
+        cutoff = time.monotonic() - self.window
+        with self._lock:
+            for session_id in [s for s, seen in self._last_seen.items() if seen < cutoff]:
+                del self._last_seen[session_id]
+            return len(self._last_seen)
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.counter(
+    "chatbot_requests_total", "Chat turns and diagnoses by intent", ["intent"])
+LLM_LATENCY = REGISTRY.histogram(
+    "chatbot_llm_latency_seconds", "LLM call latency", ["kind"], buckets=LLM_BUCKETS)
+LLM_TOKENS = REGISTRY.counter(
+    "chatbot_llm_tokens_total", "LLM tokens by direction (reasoning is part of completion)", ["direction"])
+PROMPT_TOKENS = REGISTRY.histogram(
+    "chatbot_prompt_tokens", "Prompt tokens per LLM call by part", ["part"],
+    buckets=(50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000))
+PROMPT_BUDGET_EXCEEDED = REGISTRY.counter(
+    "chatbot_prompt_budget_exceeded_total", "LLM calls whose prompt exceeded the token budget", ["intent"])
+LLM_ERRORS = REGISTRY.counter(
+    "chatbot_llm_errors_total", "Failed LLM calls by error class", ["error_class"])
+RETRIEVAL_LATENCY = REGISTRY.histogram(
+    "chatbot_retrieval_latency_seconds", "Knowledge base retrieval latency", ["route"])
+VISION_LATENCY = REGISTRY.histogram(
+    "chatbot_vision_inference_seconds", "Vision model inference latency (preprocessing and forward pass)")
+CACHE_REQUESTS = REGISTRY.counter(
+    "chatbot_cache_requests_total", "Cache lookups by cache and result", ["cache", "result"])
+QUEUE_DEPTH = REGISTRY.gauge(
+    "chatbot_queue_depth", "Background work waiting or running", ["queue"])
+ACTIVE_SESSIONS = REGISTRY.gauge(
+    "chatbot_active_sessions", "Sessions with a request in the activity window")
+SESSION_MEMORY = REGISTRY.gauge(
+    "chatbot_session_memory_bytes", "Approximate memory held by open sessions", ["scope"])
+SESSION_MEMORY_SESSIONS = REGISTRY.gauge(
+    "chatbot_session_memory_sessions", "Sessions tracked by the session memory gauge")
+
+SESSION_ACTIVITY = SessionActivity(window=Config.METRICS_SESSION_WINDOW)
+ACTIVE_SESSIONS.set_function(SESSION_ACTIVITY.count)
+
+_collectors = {}
+
+def register_collector(name, function):
+    """
+    Register a scrape-time callback feeding the cache or queue metrics
+
+    The cache and queue metrics combine several sources; each source
+    registers a callback under its own name (registering the same name
+    again replaces it).
+
+    Args:
+        name: "cache:" or "queue:" followed by the source name
+        function: Callable returning {(label values...): value}
+    """
+    _collectors[name] = function
+
+def _collect(prefix):
+    samples = {}
+    for name, function in list(_collectors.items()):
+        if name.startswith(prefix):
+            try:
+                samples.update(function())
+            except Exception as e:
+                logger.error("Error collecting %s: %s", name, e)
+    return samples
+
+def cache_samples(name, stats):
+    """
+    Turn a cache's hit/miss statistics into cache request samples
+
+    Args:
+        name: Cache label value
+        stats: Dictionary with "hits" and "misses"
+
+    Returns:
+        Samples for register_collector()
+    """
+    return {(name, "hit"): stats["hits"], (name, "miss"): stats["misses"]}
+
+CACHE_REQUESTS.set_function(lambda: _collect("cache:"))
+QUEUE_DEPTH.set_function(lambda: _collect("queue:"))
+
+def record_llm_error(error):
+    """Count a failed LLM call by its error class"""
+    LLM_ERRORS.inc(error_class=type(error).__name__)
+
+_servers = {}
+_servers_lock = threading.Lock()
+
+def start_metrics_server(host, port, registry=REGISTRY):
+    """
+    Serve /metrics from a daemon thread (once per process and port)
+
+    Args:
+        host: Interface to bind
+        port: Port to bind
+        registry: Registry to expose
+
+    Returns:
+        The HTTP server, or None if the port could not be bound
+    """
+    with _servers_lock:
+        # Port 0 binds a free port, so it never matches an earlier server
+        if port and port in _servers:
+            return _servers[port]
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        try:
+            server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            logger.warning("Metrics endpoint not started on %s:%s: %s", host, port, e)
+            _servers[port] = None
+            return None
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        logger.info("Serving metrics on http://%s:%s/metrics", host, port)
+        _servers[port] = server
+        return server
@@ -0,0 +1,192 @@
+"""
+Per-session memory accounting and on-disk spill for long conversations
+"""
+import os
+import pickle
+import shutil
+import sys
+import threading
+import time
+
+import streamlit as st
+
+from config.settings import Config
+from utils.metrics import SESSION_MEMORY, SESSION_MEMORY_SESSIONS
+
+WORKSPACE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def estimate_size(obj):
+    """
+    Estimate the memory held by a session state value
+
+    Counts the payload of strings, bytes and containers recursively; this is
+    an approximation meant for budgeting, not an exact heap measurement.
+
+    Args:
+        obj: Value to measure
+
+    Returns:
+        int: Approximate size in bytes
+    """
+    if isinstance(obj, (bytes, bytearray)):
+        return len(obj)
+    if isinstance(obj, str):
+        return len(obj.encode("utf-8"))
+    if isinstance(obj, dict):
+        return sum(estimate_size(k) + estimate_size(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set)):
+        return sum(estimate_size(item) for item in obj)
+    if hasattr(obj, "width") and hasattr(obj, "height") and hasattr(obj, "mode"):
+        # Decoded PIL image
+        return obj.width * obj.height * len(obj.getbands())
+    return sys.getsizeof(obj)
+
+class SessionSpillStore:
+    """Stack of spilled message pages per session, stored on local disk"""
+
+    def __init__(self, root_dir, ttl_seconds=24 * 3600):
+        """
+        Initialize the store
+
+        Args:
+            root_dir: Directory holding one subdirectory per session
+            ttl_seconds: Spill directories untouched for longer are removed
+        """
+        self.root_dir = root_dir
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        os.makedirs(root_dir, exist_ok=True)
+        self.cleanup()
+
+    def _session_dir(self, session_id):
+        return os.path.join(self.root_dir, session_id)
+
+    def _page_numbers(self, session_id):
+        session_dir = self._session_dir(session_id)
+        if not os.path.isdir(session_dir):
+            return []
+        return sorted(
+            int(name[len("page_"):-len(".pkl")]) for name in os.listdir(session_dir)
+            if name.startswith("page_") and name.endswith(".pkl")
+        )
+
+    def spill(self, session_id, messages):
+        """
+        Write a page of the oldest resident messages to disk
+
+        Args:
+            session_id: Session identifier
+            messages: Messages to spill, oldest first
+        """
+        with self._lock:
+            session_dir = self._session_dir(session_id)
+            os.makedirs(session_dir, exist_ok=True)
+            pages = self._page_numbers(session_id)
+            page_number = pages[-1] + 1 if pages else 0
+            with open(os.path.join(session_dir, f"page_{page_number}.pkl"), 'wb') as f:
+                pickle.dump(messages, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def page_in(self, session_id, before_seq=None):
+        """
+        Load and remove the most recently spilled page
+
+        Args:
+            session_id: Session identifier
+            before_seq: Unused; pages are kept as a stack
+
+        Returns:
+            List of messages (oldest first), empty if nothing is spilled
+        """
+        with self._lock:
+            pages = self._page_numbers(session_id)
+            if not pages:
+                return []
+            page_path = os.path.join(self._session_dir(session_id), f"page_{pages[-1]}.pkl")
+            with open(page_path, 'rb') as f:
+                messages = pickle.load(f)
+            os.remove(page_path)
+            return messages
+
+    def spilled_page_count(self, session_id, before_seq=None):
+        """Get the number of pages spilled for a session"""
+        with self._lock:
+            return len(self._page_numbers(session_id))
+
+    def clear(self, session_id):
+        """Delete all spilled pages of a session"""
+        with self._lock:
+            shutil.rmtree(self._session_dir(session_id), ignore_errors=True)
+
+    def cleanup(self):
+        """Remove spill directories of sessions that have gone idle"""
+        cutoff = time.time() - self.ttl_seconds
+        for name in os.listdir(self.root_dir):
+            path = os.path.join(self.root_dir, name)
+            try:
+                if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass
+
+class SessionMemoryGauge:
+    """Process-wide gauge of memory held by open sessions"""
+
+    def __init__(self, idle_seconds=3600):
+        """
+        Initialize the gauge
+
+        Args:
+            idle_seconds: Sessions not reported for longer are dropped
+        """
+        self.idle_seconds = idle_seconds
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def report(self, session_id, size_bytes):
+        """Record the current size of a session"""
+        with self._lock:
+            self._sizes[session_id] = (size_bytes, time.time())
+
+    def remove(self, session_id):
+        """Forget a session"""
+        with self._lock:
+            self._sizes.pop(session_id, None)
+
+    def snapshot(self):
+        """
+        Get the current gauge values
+
+        Returns:
+            Dictionary with total bytes, session count and largest session size
+        """
+        cutoff = time.time() - self.idle_seconds
+        with self._lock:
+            for session_id in [sid for sid, (_, seen) in self._sizes.items() if seen < cutoff]:
+                del self._sizes[session_id]
+            sizes = [size for size, _ in self._sizes.values()]
+        return {
+            "total_bytes": sum(sizes),
+            "sessions": len(sizes),
+            "max_session_bytes": max(sizes, default=0),
+        }
+
+@st.cache_resource
+def get_spill_store():
+    """Get the process-wide session spill store"""
+    return SessionSpillStore(
+        os.path.join(WORKSPACE_ROOT, ".cache", "sessions"),
+        ttl_seconds=Config.SESSION_SPILL_TTL_SECONDS
+    )
+
+@st.cache_resource
+def get_session_memory_gauge():
+    """Get the process-wide session memory gauge, exported as metrics"""
+    gauge = SessionMemoryGauge()
+
+    def memory_samples():
+        snapshot = gauge.snapshot()
+        return {("total",): snapshot["total_bytes"], ("largest_session",): snapshot["max_session_bytes"]}
+
+    SESSION_MEMORY.set_function(memory_samples)
+    SESSION_MEMORY_SESSIONS.set_function(lambda: gauge.snapshot()["sessions"])
+    return gauge
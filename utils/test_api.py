@@ -0,0 +1,140 @@
+"""
+Test script for the headless API
+"""
+import json
+import os
+import sys
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from PIL import Image
+from starlette.testclient import TestClient
+
+from api.client import APIClient, RemoteChatService, RemoteDiagnosisService
+from api.server import UPLOAD_OVERHEAD_BYTES, app, _parse_chat_request, _public_paths
+from config.settings import Config, WORKSPACE_ROOT
+
+def test_parse_chat_request():
+    """Test chat request validation"""
+    print("Testing chat request validation...")
+
+    messages, query = _parse_chat_request({
+        "messages": [
+            {"role": "user", "content": "Da tôi bị ngứa"},
+            {"role": "assistant", "content": "Bạn bị bao lâu rồi?", "images": ["x.jpg"]},
+            {"role": "user", "content": "Một tuần"},
+        ]
+    })
+    assert query == "Một tuần"
+    assert messages[1] == {"role": "assistant", "content": "Bạn bị bao lâu rồi?"}
+
+    for body in ({}, {"messages": []}, {"messages": [{"role": "system", "content": "x"}]}):
+        try:
+            _parse_chat_request(body)
+            assert False, f"accepted {body}"
+        except ValueError:
+            pass
+    print("✅ Requests validated")
+
+def test_endpoints_without_services():
+    """Test endpoints that do not need the models"""
+    print("Testing health and bad requests...")
+
+    # Not entering the client's context skips the model warm-up
+    client = TestClient(app)
+    assert client.get("/health").json()["status"] == "ok"
+    assert client.post("/chat", json={"messages": "hello"}).status_code == 400
+    assert client.post("/diagnose", data={"image": "not a file"}).status_code == 400
+
+    path = os.path.join(WORKSPACE_ROOT, "database", "disease_images", "a.jpg")
+    assert _public_paths([path]) == ["database/disease_images/a.jpg"]
+    print("✅ Health and validation errors returned")
+
+def test_upload_size_limit():
+    """Test that oversized uploads are refused by length and by the bounded read"""
+    print("Testing upload size limit...")
+
+    client = TestClient(app)
+    original_limit = Config.API_MAX_UPLOAD_BYTES
+    try:
+        Config.API_MAX_UPLOAD_BYTES = 1000
+        # Over the limit plus the multipart allowance: refused from the header
+        response = client.post("/diagnose", files={"image": ("a.jpg", b"x" * (UPLOAD_OVERHEAD_BYTES + 2000))})
+        assert response.status_code == 413
+        # Within the allowance but over the limit: refused after reading limit + 1 bytes
+        response = client.post("/diagnose", files={"image": ("a.jpg", b"x" * 2000)})
+        assert response.status_code == 413
+    finally:
+        Config.API_MAX_UPLOAD_BYTES = original_limit
+    print("✅ Oversized uploads refused")
+
+def mock_api(handler):
+    """Build an APIClient whose requests are answered by handler"""
+    api = APIClient("http://api.test")
+    api._client = httpx.Client(base_url="http://api.test", transport=httpx.MockTransport(handler))
+    return api
+
+def test_remote_services():
+    """Test the remote services against a mocked API"""
+    print("Testing remote services...")
+
+    requests = []
+
+    def handler(request):
+        requests.append(request.url.path)
+        if request.url.path == "/health":
+            return httpx.Response(200, json={"status": "ok", "vision_model_loaded": True})
+        if request.url.path == "/chat":
+            return httpx.Response(200, json={"response": "Xin chào", "images": None})
+        events = "".join(
+            f"event: {event}\ndata: {json.dumps(data)}\n\n" for event, data in [
+                ("progress", {"message": "Đang phân tích hình ảnh..."}),
+                ("predictions", {"predictions": [["Psoriasis", 0.9]]}),
+                ("done", {"success": True, "response": "Psoriasis", "images": ["database/disease_images/a.jpg"],
+                          "primary_disease": "Psoriasis"}),
+            ]
+        )
+        return httpx.Response(200, text=events, headers={"content-type": "text/event-stream"})
+
+    api = mock_api(handler)
+    chat = RemoteChatService(api)
+    diagnosis = RemoteDiagnosisService(api)
+
+    messages = chat.prepare_messages_for_api([{"role": "user", "content": "chào"}])
+    assert chat.send_message(messages, user_query="chào") == ("Xin chào", None)
+
+    # /health is asked once per cache period, not on every rerun
+    assert diagnosis.is_model_loaded() and diagnosis.is_model_loaded()
+    assert requests.count("/health") == 1
+
+    progress, partial = [], {}
+    image = Image.new("RGB", (32, 32), "red")
+    success, response, images, primary = diagnosis.run_diagnosis_job(
+        image, progress_callback=progress.append, partial_callback=lambda **fields: partial.update(fields)
+    )
+    assert success and response == "Psoriasis" and primary == "Psoriasis"
+    assert images == [os.path.join(WORKSPACE_ROOT, "database", "disease_images", "a.jpg")]
+    assert progress == ["Đang phân tích hình ảnh..."] and partial == {"predictions": [["Psoriasis", 0.9]]}
+    try:
+        image.load()
+        assert False, "image was not closed"
+    except ValueError:
+        pass
+    print("✅ Chat, health and diagnosis relayed through the API")
+
+def main():
+    """Run all tests"""
+    print("🧪 API TESTS")
+    print("=" * 50)
+
+    test_parse_chat_request()
+    test_endpoints_without_services()
+    test_upload_size_limit()
+    test_remote_services()
+
+    print("\n🎉 All tests completed!")
+
+if __name__ == "__main__":
+    main()
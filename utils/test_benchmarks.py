@@ -0,0 +1,156 @@
+"""
+Test script for the benchmark harness
+"""
+import json
+import os
+import sys
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai import OpenAI
+
+from benchmarks.load import format_table, run_level
+from benchmarks.memory import profile_startup, slope
+from benchmarks.retrieval import load_eval_set, rank_diseases, score_ranking
+from benchmarks.stats import percentiles
+from benchmarks.stub_llm import StubLLMServer
+from benchmarks.vision import format_table as format_vision_table, run_matrix
+
+def test_percentiles():
+    """Test latency percentile summaries"""
+    print("Testing percentiles...")
+
+    stats = percentiles([i / 1000 for i in range(1, 101)])
+    assert stats["count"] == 100
+    assert stats["p50"] == 50.5
+    assert 95 < stats["p95"] < 96 and 99 < stats["p99"] < 100
+    assert stats["max"] == 100.0
+    assert percentiles([]) == {"count": 0}
+    print(f"✅ {stats}")
+
+def test_stub_llm_server():
+    """Test that the stub answers like an OpenAI-compatible endpoint"""
+    print("Testing stub LLM server...")
+
+    with StubLLMServer(latency=0, tokens_per_second=0, response_tokens=5) as stub:
+        client = OpenAI(base_url=stub.url, api_key="stub")
+        messages = [{"role": "user", "content": "Xin chào"}]
+
+        response = client.chat.completions.create(model="stub", messages=messages)
+        assert len(response.choices[0].message.content.split()) == 5
+        assert response.usage.completion_tokens == 5
+
+        stream = client.chat.completions.create(model="stub", messages=messages, stream=True)
+        deltas = [chunk.choices[0].delta.content for chunk in stream if chunk.choices and chunk.choices[0].delta.content]
+        assert len(deltas) == 5
+        assert stub.requests == 2
+    print("✅ Completions served, streamed and not")
+
+def test_vision_matrix():
+    """Test the vision benchmark on a tiny randomly initialized model"""
+    print("Testing vision benchmark matrix...")
+
+    from PIL import Image
+    from transformers import BitImageProcessor, Dinov2Config, Dinov2ForImageClassification
+
+    from models.ai_models import VisionModel
+    from models.prediction_cache import PredictionCache
+
+    config = Dinov2Config(hidden_size=32, num_hidden_layers=1, num_attention_heads=2, intermediate_size=64,
+                          image_size=56, patch_size=14, num_labels=3)
+    model = Dinov2ForImageClassification(config).eval()
+    processor = BitImageProcessor(size={"shortest_edge": 56}, crop_size={"height": 56, "width": 56})
+    images = [Image.new("RGB", (80, 60), color) for color in ("red", "green", "blue")]
+
+    # The app's VisionModel around the same model, without its prediction cache
+    vision_model = VisionModel.__new__(VisionModel)
+    vision_model.processor, vision_model.model = processor, model
+    vision_model.id2label, vision_model.name_mapping = model.config.id2label, {}
+    vision_model.inference_client = None
+    vision_model.prediction_cache = PredictionCache(max_entries=0)
+
+    results = run_matrix(processor, model, images, ["fp32", "bf16"], threads=[1], batch_sizes=[1, 2],
+                         warmup=1, min_batches=2, vision_model=vision_model)
+    assert [(r["variant"], r["batch_size"]) for r in results] == [
+        ("fp32", 1), ("fp32", 2), ("bf16", 1), ("bf16", 2), ("predict", 1)
+    ]
+    assert results[0]["top1_agreement"] == 1.0
+    assert results[1]["stages"]["forward"]["count"] == 2
+    # The benchmark's copy of the pipeline agrees with VisionModel.predict
+    assert results[-1]["top1_agreement"] == 1.0 and results[-1]["stages"]["total"]["count"] == 3
+    assert "predict" in format_vision_table(results)
+    print(f"✅ {len(results)} configurations measured")
+
+def test_retrieval_scoring():
+    """Test recall@k and reciprocal rank, and that the eval set labels exist"""
+    print("Testing retrieval scoring...")
+
+    chunks = [("a", {"disease_name": "Melanoma"}), ("b", {"disease_name": "Melanoma"}),
+              ("c", {"disease_name": "nevus"}), ("d", {"disease_name": "Psoriasis"})]
+    ranked = rank_diseases(chunks)
+    assert ranked == ["Melanoma", "nevus", "Psoriasis"]
+    recall, reciprocal_rank = score_ranking(ranked, ["Nevus", "Tinea Nigra"], ks=(1, 3))
+    assert recall == {1: 0.0, 3: 0.5} and reciprocal_rank == 0.5
+
+    with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           "database", "diseases.json"), encoding="utf-8") as f:
+        diseases = {disease["tên bệnh"][0] for disease in json.load(f)}
+    for item in load_eval_set():
+        assert item["type"] in ("disease", "hospital", "none")
+        assert set(item.get("expected", [])) <= diseases, item
+    print("✅ Scoring correct, eval set labels valid")
+
+def test_memory_profile():
+    """Test the startup stages and the per-session slope"""
+    print("Testing memory profile...")
+
+    heavy = {"torch", "vision_model", "reference_index", "tiktoken", "rag_service", "embedder", "openai_client"}
+    built, stages = profile_startup(skip=heavy)
+    assert [stage["stage"] for stage in stages] == ["python", "json_databases"]
+    assert stages[1]["error"] is None and stages[1]["rss_mb"] > 0
+    assert "diseases.json" in built["json_databases"]
+
+    assert slope([(0, 100.0), (1, 102.0), (2, 104.0)]) == 2.0
+    assert slope([(0, 100.0)]) is None
+    print(f"✅ {stages[-1]}")
+
+class EchoChat:
+    """Chat service answering instantly, standing in for the RAG and LLM calls"""
+
+    def prepare_messages_for_api(self, chat_history):
+        return chat_history
+
+    def generate_response(self, messages, user_query=""):
+        return "trả lời", None
+
+def test_load_level():
+    """Test that a load level counts steps and fills the percentiles"""
+    print("Testing load level...")
+
+    level = run_level({"chat": EchoChat()}, users=2, duration=0.2, scripts={"chat": 1, "district": 1},
+                      think_time=0.01)
+    assert level["users"] == 2 and level["steps"] > 0 and not level["errors"]
+    assert level["steps"] == sum(
+        stages["total"]["count"] for stages in level["steps_by_type"].values()
+    )
+    assert level["prefetch_hit_rate"] is None
+    assert "free_chat p50/p95" in format_table([level])
+    print(f"✅ {level['steps']} steps, {level['throughput_steps_per_second']} steps/s")
+
+def main():
+    """Run all tests"""
+    print("🧪 BENCHMARK TESTS")
+    print("=" * 50)
+
+    test_percentiles()
+    test_stub_llm_server()
+    test_vision_matrix()
+    test_retrieval_scoring()
+    test_memory_profile()
+    test_load_level()
+
+    print("\n🎉 All tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Test script for the SQLite conversation store
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.conversation_store import SQLiteConversationStore
+
+def _new_store(page_messages=3):
+    db_path = os.path.join(tempfile.mkdtemp(), "conversations.sqlite3")
+    return db_path, SQLiteConversationStore(db_path, flush_interval=0.05, page_messages=page_messages)
+
+def test_persist_and_recover():
+    """Test that a new process can recover a conversation"""
+    print("Testing conversation persistence...")
+
+    db_path, store = _new_store()
+    for seq in range(6):
+        store.append_message("session-1", {"role": "user", "content": f"tin nhắn {seq}", "seq": seq})
+    store.flush()
+
+    # A fresh store has an empty cache, so this reads from SQLite
+    recovered = SQLiteConversationStore(db_path).load_messages("session-1", limit=4)
+    assert [m["seq"] for m in recovered] == [2, 3, 4, 5]
+    assert recovered[-1]["content"] == "tin nhắn 5"
+    print("✅ Recent messages recovered from the database")
+
+def test_images_stored_once():
+    """Test that identical images are stored once by content hash"""
+    print("Testing image deduplication...")
+
+    db_path, store = _new_store()
+    for seq in range(3):
+        store.append_message("session-1", {
+            "role": "user", "content": "ảnh", "seq": seq,
+            "image": b"jpeg-bytes", "image_size": (4, 3), "image_hash": "abc"
+        })
+    store.flush()
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM images").fetchone()[0] == 1
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    print("✅ Image stored once, database in WAL mode")
+
+def test_page_in_older_history():
+    """Test paging in history older than the resident messages"""
+    print("Testing page-in of older history...")
+
+    _, store = _new_store(page_messages=3)
+    for seq in range(10):
+        store.append_message("session-1", {"role": "assistant", "content": str(seq), "seq": seq})
+    store.flush()
+
+    assert store.spilled_page_count("session-1", before_seq=7) == 3
+    page = store.page_in("session-1", before_seq=7)
+    assert [m["seq"] for m in page] == [4, 5, 6]
+
+    store.clear("session-1")
+    store.flush()
+    assert store.count_messages("session-1") == 0
+    print("✅ Older pages loaded newest first and cleared")
+
+def test_processes_share_a_session():
+    """Test that two stores on one database neither overwrite nor serve stale messages"""
+    print("Testing two processes on one session...")
+
+    db_path, first = _new_store()
+    second = SQLiteConversationStore(db_path, flush_interval=0.05)
+    first.append_message("session-1", {"role": "user", "content": "xin chào", "seq": 0})
+    first.flush()
+    assert [m["content"] for m in first.load_messages("session-1")] == ["xin chào"]
+
+    # Both processes pick the same next number for their own message
+    reply = {"role": "assistant", "content": "chào bạn", "seq": 1}
+    second.append_message("session-1", reply)
+    second.flush()
+    question = {"role": "user", "content": "bệnh vảy nến là gì", "seq": 1}
+    first.append_message("session-1", question)
+    first.flush()
+
+    assert (reply["seq"], question["seq"]) == (1, 2)
+    assert first.count_messages("session-1") == 3
+    contents = [m["content"] for m in first.load_messages("session-1")]
+    assert contents == ["xin chào", "chào bạn", "bệnh vảy nến là gì"]
+    print("✅ Numbers allocated by the database, stale cache reloaded")
+
+def test_reads_do_not_wait_for_writes():
+    """Test that counting and numbering do not wait for queued writes"""
+    print("Testing non-blocking reads...")
+
+    db_path = os.path.join(tempfile.mkdtemp(), "conversations.sqlite3")
+    store = SQLiteConversationStore(db_path, flush_interval=2.0)
+    store.load_messages("session-1")
+    store.append_message("session-1", {"role": "user", "content": "ngứa da", "seq": 0})
+
+    started = time.perf_counter()
+    assert store.count_messages("session-1") == 0
+    assert store.max_seq("session-1") == 0
+    assert store.spilled_page_count("session-1", before_seq=0) == 0
+    elapsed = time.perf_counter() - started
+    store.flush()
+    assert elapsed < 0.5
+    print(f"✅ Reads took {elapsed * 1000:.1f} ms with a write queued")
+
+def main():
+    """Run all tests"""
+    print("🧪 CONVERSATION STORE TESTS")
+    print("=" * 50)
+
+    test_persist_and_recover()
+    test_images_stored_once()
+    test_page_in_older_history()
+    test_processes_share_a_session()
+    test_reads_do_not_wait_for_writes()
+
+    print("\n🎉 All tests completed!")
+
+if __name__ == "__main__":
+    main()
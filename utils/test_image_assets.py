@@ -0,0 +1,112 @@
+"""
+Test script for the image asset layer (existence checks and thumbnail cache)
+"""
+import io
+import os
+import sys
+import tempfile
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from config.settings import Config
+from utils.image_assets import ThumbnailCache, image_exists
+
+def write_image(path, size=(800, 600), color="red"):
+    """Write a JPEG test image"""
+    Image.new("RGB", size, color).save(path, format="JPEG")
+
+def test_missing_images_are_rechecked():
+    """Test that a missing path is re-checked after the TTL, and a found one is not"""
+    print("Testing image existence cache...")
+
+    original_ttl = Config.IMAGE_MISSING_TTL
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "Melanoma_1.jpg")
+        try:
+            Config.IMAGE_MISSING_TTL = 60.0
+            assert not image_exists(path)
+            write_image(path)
+            assert not image_exists(path)
+
+            Config.IMAGE_MISSING_TTL = 0.0
+            other = os.path.join(directory, "Psoriasis_1.jpg")
+            assert not image_exists(other)
+            write_image(other)
+            assert image_exists(other)
+
+            os.remove(other)
+            assert image_exists(other)
+        finally:
+            Config.IMAGE_MISSING_TTL = original_ttl
+    print("✅ Misses expire, hits are kept")
+
+def test_thumbnail_generation_and_disk_cache():
+    """Test that thumbnails are resized once and reused from memory and disk"""
+    print("Testing thumbnail cache...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "Impetigo_1.jpg")
+        write_image(path)
+        cache_dir = os.path.join(directory, "thumbnails")
+
+        cache = ThumbnailCache(cache_dir, scale=2)
+        data = cache.get(path, 150)
+        with Image.open(io.BytesIO(data)) as thumbnail:
+            assert thumbnail.size == (300, 225)
+        assert cache.get(path, 150) is data
+        assert cache.stats() == {"hits": 1, "misses": 1, "size": 1, "bytes": len(data)}
+        assert len(os.listdir(cache_dir)) == 1
+
+        # A new process reads the thumbnail back from disk instead of resizing
+        reader = ThumbnailCache(cache_dir, scale=2)
+        reader._generate = None
+        assert reader.get(path, 150) == data
+
+        # Small images are not upscaled, and a changed file gets a new thumbnail
+        with Image.open(io.BytesIO(cache.get(path, 600))) as thumbnail:
+            assert thumbnail.size == (800, 600)
+        write_image(path, size=(400, 300), color="blue")
+        os.utime(path, ns=(0, 1))
+        with Image.open(io.BytesIO(cache.get(path, 100))) as thumbnail:
+            assert thumbnail.size == (200, 150)
+
+        assert cache.get(os.path.join(directory, "missing.jpg"), 150) is None
+    print("✅ Resized once, reused from memory and disk")
+
+def test_memory_bound():
+    """Test that the in-memory LRU stays within its byte budget"""
+    print("Testing memory bound...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i in range(3):
+            path = os.path.join(directory, f"Tungiasis_{i}.jpg")
+            write_image(path)
+            paths.append(path)
+
+        # Identical images, so room for exactly two thumbnails
+        size = len(ThumbnailCache(os.path.join(directory, "probe")).get(paths[0], 150))
+        cache = ThumbnailCache(os.path.join(directory, "thumbnails"), max_bytes=2 * size)
+        cache.prewarm(paths, [150])
+        stats = cache.stats()
+
+        assert stats["size"] == 2 and stats["bytes"] <= cache.max_bytes
+        assert (paths[0], 150) not in cache._entries
+        print(f"✅ {stats['size']} thumbnails in {stats['bytes']} bytes")
+
+def main():
+    """Run all tests"""
+    print("🧪 IMAGE ASSET TESTS")
+    print("=" * 50)
+
+    test_missing_images_are_rechecked()
+    test_thumbnail_generation_and_disk_cache()
+    test_memory_bound()
+
+    print("\n🎉 All tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Test script for the out-of-process vision inference server
+"""
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import torch
+from PIL import Image
+from transformers import BitImageProcessor, Dinov2Config, Dinov2ForImageClassification
+
+from config.settings import Config
+from models.ai_models import VisionModel, _get_remote_model_info
+from models.inference_server import InferenceClient, InferenceServer, recv_frame, send_frame
+from models.prediction_cache import PredictionCache
+from models.reference_index import register_embedding_hook
+
+def tiny_model():
+    """Build a tiny randomly initialized classifier and its processor"""
+    torch.manual_seed(0)
+    config = Dinov2Config(hidden_size=32, num_hidden_layers=1, num_attention_heads=2, intermediate_size=64,
+                          image_size=56, patch_size=14, num_labels=3)
+    model = Dinov2ForImageClassification(config).eval()
+    register_embedding_hook(model)
+    processor = BitImageProcessor(size={"shortest_edge": 56}, crop_size={"height": 56, "width": 56})
+    return processor, model
+
+PROCESSOR, MODEL = tiny_model()
+
+class TinyVisionModel(VisionModel):
+    """VisionModel whose in-process fallback loads the tiny model"""
+
+    def _load_model(self):
+        return PROCESSOR, MODEL
+
+    def _load_processor(self):
+        return PROCESSOR
+
+def start_server(socket_path):
+    """Serve the tiny model on a background thread"""
+    server = InferenceServer(socket_path)
+    server.model = MODEL
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while not os.path.exists(socket_path) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return server, thread
+
+def test_frame_round_trip():
+    """Test the length-prefixed JSON framing"""
+    print("Testing frames...")
+
+    left, right = socket.socketpair()
+    with left, right:
+        payload = {"op": "predict", "shape": [1, 3, 56, 56], "text": "Vảy nến" * 1000}
+        send_frame(left, payload)
+        assert recv_frame(right) == payload
+    print("✅ Frame round trip")
+
+def test_server_round_trip():
+    """Test that remote inference through shared memory matches in-process inference"""
+    print("Testing server round trip...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        socket_path = os.path.join(directory, "vision.sock")
+        server, thread = start_server(socket_path)
+        try:
+            client = InferenceClient(socket_path, timeout=5)
+            info = client.info()
+            assert info["id2label"] == {str(k): v for k, v in MODEL.config.id2label.items()}
+
+            pixels = PROCESSOR(images=Image.new("RGB", (80, 60), "red"), return_tensors="pt")["pixel_values"]
+            probabilities, embedding = client.infer(pixels.numpy())
+            with torch.no_grad():
+                expected = torch.nn.functional.softmax(MODEL(pixel_values=pixels).logits, dim=-1)[0].numpy()
+            assert np.allclose(probabilities, expected, atol=1e-5)
+            assert embedding.shape == (MODEL.classifier.in_features,)
+
+            try:
+                client._request({"op": "unknown"})
+                assert False, "unknown op should fail"
+            except RuntimeError as e:
+                assert "Unknown op" in str(e)
+        finally:
+            server.shutdown()
+            thread.join(timeout=5)
+        assert not os.path.exists(socket_path)
+    print(f"✅ Probabilities {np.round(probabilities, 3)}")
+
+def test_client_fallback():
+    """Test that VisionModel falls back to in-process inference when the server goes away"""
+    print("Testing in-process fallback...")
+
+    original_socket = Config.INFERENCE_SERVER_SOCKET
+    with tempfile.TemporaryDirectory() as directory:
+        socket_path = os.path.join(directory, "vision.sock")
+        try:
+            Config.INFERENCE_SERVER_SOCKET = os.path.join(directory, "missing.sock")
+            unreachable = TinyVisionModel()
+            unreachable.load_model()
+            assert unreachable.inference_client is None and unreachable.model is MODEL
+
+            Config.INFERENCE_SERVER_SOCKET = socket_path
+            server, thread = start_server(socket_path)
+            vision = TinyVisionModel()
+            vision.prediction_cache = PredictionCache(max_entries=0)
+            vision.load_model()
+            assert vision.inference_client is not None and vision.model is None
+            # Later instances reuse the model info instead of asking the server again
+            hits = _get_remote_model_info.cache_info().hits
+            TinyVisionModel().load_model()
+            assert _get_remote_model_info.cache_info().hits == hits + 1
+            remote = vision.predict(Image.new("RGB", (80, 60), "blue"))
+
+            server.shutdown()
+            thread.join(timeout=5)
+            local = vision.predict(Image.new("RGB", (80, 60), "blue"))
+        finally:
+            Config.INFERENCE_SERVER_SOCKET = original_socket
+
+    assert vision.inference_client is None and vision.model is MODEL
+    assert [p["class_label"] for p in remote] == [p["class_label"] for p in local]
+    assert abs(remote[0]["score"] - local[0]["score"]) < 1e-5
+    print("✅ Fell back at load time and after the server stopped")
+
+def main():
+    """Run all tests"""
+    print("🧪 INFERENCE SERVER TESTS")
+    print("=" * 50)
+
+    test_frame_round_trip()
+    test_server_round_trip()
+    test_client_fallback()
+
+    print("\n🎉 All tests completed!")
+
+if __name__ == "__main__":
+    main()
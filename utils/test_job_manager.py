@@ -0,0 +1,143 @@
+"""
+Test script for the background diagnosis job manager
+"""
+import os
+import sys
+import threading
+import time
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.job_manager import Job, JobManager
+
+def wait_finished(manager, job_id, timeout=5):
+    """Poll a job until it finishes, like the UI fragment does"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = manager.get(job_id)
+        if job is None or job.is_finished():
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+def test_partial_results_and_result():
+    """Test that progress and partial results are visible before the job finishes"""
+    print("Testing partial publishing...")
+
+    predicted = threading.Event()
+    release = threading.Event()
+
+    def diagnose(image, progress_callback=None, partial_callback=None):
+        progress_callback("Đang phân tích hình ảnh...")
+        partial_callback(predictions=[("Psoriasis", 0.9)])
+        predicted.set()
+        release.wait(5)
+        partial_callback(text="Bệnh vảy nến")
+        return True, f"Kết quả cho {image}", None, "Psoriasis"
+
+    manager = JobManager(max_workers=1)
+    job_id = manager.submit(diagnose, "ảnh.jpg", session_id="session-1")
+    assert predicted.wait(5)
+
+    job = manager.get(job_id)
+    assert job.status == Job.RUNNING and job.session_id == "session-1"
+    assert job.progress == "Đang phân tích hình ảnh..."
+    assert job.partial == {"predictions": [("Psoriasis", 0.9)]}
+    assert manager.queue_depth() == 1
+
+    release.set()
+    job = wait_finished(manager, job_id)
+    assert job.status == Job.DONE and job.result == (True, "Kết quả cho ảnh.jpg", None, "Psoriasis")
+    assert job.partial == {"predictions": [("Psoriasis", 0.9)], "text": "Bệnh vảy nến"}
+    assert manager.queue_depth() == 0
+    print("✅ Partial results published, then the result")
+
+def test_failed_job():
+    """Test that an exception fails the job instead of escaping"""
+    print("Testing failed job...")
+
+    def fail(progress_callback=None, partial_callback=None):
+        raise RuntimeError("model not loaded")
+
+    manager = JobManager()
+    job = wait_finished(manager, manager.submit(fail))
+    assert job.status == Job.FAILED and job.error == "model not loaded"
+    assert job.result is None and job.finished_at is not None
+    print("✅ Error recorded on the job")
+
+def test_bounded_executor():
+    """Test that no more than max_workers jobs run at once"""
+    print("Testing bounded executor...")
+
+    lock = threading.Lock()
+    running = {"now": 0, "peak": 0}
+
+    def work(progress_callback=None, partial_callback=None):
+        with lock:
+            running["now"] += 1
+            running["peak"] = max(running["peak"], running["now"])
+        time.sleep(0.05)
+        with lock:
+            running["now"] -= 1
+
+    manager = JobManager(max_workers=2)
+    job_ids = [manager.submit(work) for _ in range(6)]
+    assert manager.queue_depth() == 6
+    for job_id in job_ids:
+        assert wait_finished(manager, job_id).status == Job.DONE
+    assert running["peak"] == 2
+    print(f"✅ At most {running['peak']} jobs ran at once")
+
+def test_finished_jobs_expire():
+    """Test that finished jobs are dropped after the TTL, running ones are kept"""
+    print("Testing result expiry...")
+
+    release = threading.Event()
+    manager = JobManager(max_workers=2, result_ttl=0.1)
+    done_id = manager.submit(lambda progress_callback=None, partial_callback=None: "result")
+    running_id = manager.submit(lambda progress_callback=None, partial_callback=None: release.wait(5))
+    assert wait_finished(manager, done_id).result == "result"
+
+    time.sleep(0.2)
+    assert manager.get(done_id) is None
+    assert manager.get(running_id) is not None
+    release.set()
+
+    manager.discard(running_id)
+    assert manager.get(running_id) is None
+    print("✅ Expired and discarded jobs forgotten")
+
+def test_expire_while_finishing():
+    """Test that a job whose status is set before its finish time is not expired"""
+    print("Testing expiry of a finishing job...")
+
+    manager = JobManager(result_ttl=0.0)
+    job = Job("finishing")
+    job.status = Job.DONE
+    with manager._lock:
+        manager._jobs[job.job_id] = job
+
+    manager._expire()
+    assert manager.get(job.job_id) is job
+
+    job.finished_at = time.time() - 1
+    manager._expire()
+    assert manager.get(job.job_id) is None
+    print("✅ Kept until its finish time is set")
+
+def main():
+    """Run all tests"""
+    print("🧪 JOB MANAGER TESTS")
+    print("=" * 50)
+
+    test_partial_results_and_result()
+    test_failed_job()
+    test_bounded_executor()
+    test_finished_jobs_expire()
+    test_expire_while_finishing()
+
+    print("\n🎉 All tests completed!")
+
+if __name__ == "__main__":
+    main()
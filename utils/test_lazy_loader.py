@@ -0,0 +1,96 @@
+"""
+Test script for the lazily loaded vision stack
+"""
+import os
+import subprocess
+import sys
+import threading
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.lazy_loader import LazyModelManager
+from services.startup import StartupOrchestrator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def orchestrator_with(factory):
+    """Build an orchestrator whose vision stack is built by factory"""
+    orchestrator = StartupOrchestrator(max_workers=2, retry_interval=60.0)
+    orchestrator.register(LazyModelManager.RESOURCE, factory)
+    return orchestrator
+
+def test_preload_on_intent():
+    """Test that by default only diagnosis intent starts the load"""
+    print("Testing preload on diagnosis intent...")
+
+    loads = []
+    release = threading.Event()
+
+    def build():
+        loads.append(1)
+        release.wait(5)
+        return "model manager"
+
+    loader = LazyModelManager(orchestrator_with(build), preload="intent")
+    loader.on_page_rendered()
+    loader.on_page_rendered()
+    assert loads == [] and loader.is_deferred() and not loader.is_ready()
+
+    loader.on_diagnosis_intent()
+    assert not loader.is_deferred() and loader.get_model_manager() is None
+    release.set()
+    assert loader.wait(timeout=5) == "model manager"
+    loader.on_diagnosis_intent()
+    assert loads == [1] and loader.is_ready() and loader.load_seconds is not None
+    print("✅ Chat renders did not load the model, diagnosis did once")
+
+def test_preload_on_startup():
+    """Test that "startup" preloads after the first render"""
+    print("Testing preload at startup...")
+
+    loader = LazyModelManager(orchestrator_with(lambda: "model manager"), preload="startup")
+    assert not loader.is_deferred()
+    loader.on_page_rendered()
+    assert loader.wait(timeout=5) == "model manager"
+    assert loader.get_model_manager() == "model manager"
+    print("✅ Loaded after the first render")
+
+def test_failed_load():
+    """Test that a failed load is reported instead of raised"""
+    print("Testing failed load...")
+
+    def build():
+        raise RuntimeError("no weights")
+
+    loader = LazyModelManager(orchestrator_with(build), preload="intent")
+    loader.on_diagnosis_intent()
+    assert loader.wait(timeout=5) is None
+    assert loader.is_ready() and loader.get_model_manager() is None
+    print("✅ Failure reported as None")
+
+def test_import_is_light():
+    """Test that importing the proxy does not import torch"""
+    print("Testing import cost...")
+
+    result = subprocess.run(
+        [sys.executable, "-c", "import sys, models.lazy_loader; print('torch' in sys.modules)"],
+        cwd=ROOT, capture_output=True, text=True, timeout=120
+    )
+    assert result.stdout.strip() == "False", result.stdout + result.stderr
+    print("✅ torch not imported")
+
+def main():
+    """Run all tests"""
+    print("🧪 LAZY LOADER TESTS")
+    print("=" * 50)
+
+    test_preload_on_intent()
+    test_preload_on_startup()
+    test_failed_load()
+    test_import_is_light()
+
+    print("\n🎉 All tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Test script for the BM25 lexical index
+"""
+import os
+import sys
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.lexical_index import BM25Index, fold_diacritics, name_phrases, reciprocal_rank_fusion, tokenize
+
+DOCUMENTS = [
+    "Bệnh: Psoriasis\nTên khác: Psoriasis, Vảy nến\nĐộ nguy hiểm: Trung bình\n",
+    "Triệu chứng của Psoriasis:\n- Mảng da đỏ có vảy trắng bạc\n- Ngứa",
+    "Bệnh: Pityriasis Rosea\nTên khác: Pityriasis Rosea, Vảy phấn hồng\nĐộ nguy hiểm: Thấp\n",
+    "Bệnh: Impetigo\nTên khác: Impetigo, Chốc lở\nĐộ nguy hiểm: Thấp\n",
+]
+METADATAS = [
+    {"disease_name": "Psoriasis", "chunk_type": "main_info"},
+    {"disease_name": "Psoriasis", "chunk_type": "symptoms"},
+    {"disease_name": "Pityriasis Rosea", "chunk_type": "main_info"},
+    {"disease_name": "Impetigo", "chunk_type": "main_info"},
+]
+
+def test_tokenize():
+    """Test diacritic folding, stopwords and syllable bigrams"""
+    print("Testing tokenization...")
+
+    assert fold_diacritics("Chốc Lở Đỏ") == "choc lo do"
+    assert tokenize("Vảy nến là gì?") == ["vay", "nen", "vay_nen"]
+    assert tokenize("vay nen") == tokenize("VẢY NẾN")
+    print("✅ Folded syllables and bigrams")
+
+def test_search_and_confidence():
+    """Test that a named disease ranks first and is recognized as unambiguous"""
+    print("Testing BM25 search...")
+
+    index = BM25Index(DOCUMENTS, METADATAS)
+    hits = index.search("Bệnh chốc lở có lây không?", 3)
+    assert hits[0][1]["disease_name"] == "Impetigo"
+    assert BM25Index.confident_disease(hits, margin=2.0) == "Impetigo"
+
+    hits = index.search("vay nen", 3)
+    assert hits[0][1]["disease_name"] == "Psoriasis"
+    assert index.search("headache", 3) == []
+    assert BM25Index.confident_disease([], margin=2.0) is None
+    assert BM25Index.confident_disease(hits, margin=2.0, min_score=1000) is None
+    print(f"✅ Top hit score {hits[0][2]:.2f}")
+
+def test_weak_hits_and_name_mentions():
+    """Test the cutoffs on weak hits and that only named diseases count as mentioned"""
+    print("Testing weak hits and disease names...")
+
+    hits = [("a", {}, 12.0), ("b", {}, 7.0), ("c", {}, 5.5), ("d", {}, 3.0)]
+    assert [hit[0] for hit in BM25Index.relevant_hits(hits, 5.0, 0.5)] == ["a", "b"]
+    assert [hit[0] for hit in BM25Index.relevant_hits(hits, 5.0, 0.0)] == ["a", "b", "c"]
+    assert BM25Index.relevant_hits(hits[3:], 5.0, 0.5) == []
+
+    assert name_phrases(["Tinea Corporis", "Nấm da thân mình (hắc lào)"]) == [
+        ("tinea", "corporis"), ("nam", "da", "than", "minh"), ("hac", "lao")
+    ]
+    assert name_phrases(["Darier_s Disease", "Bệnh Darier"]) == [("darier", "s"), ("darier",)]
+
+    index = BM25Index(DOCUMENTS, METADATAS, names={"Psoriasis": ["Psoriasis", "Vảy nến"]})
+    assert index.mentions_disease("Bệnh vảy nến có lây không?", "Psoriasis")
+    assert index.mentions_disease("impetigo treatment", "Impetigo")
+    # Words from the disease's chunks, but not its name
+    assert not index.mentions_disease("Da đỏ có vảy trắng", "Psoriasis")
+    assert not index.mentions_disease("vảy nến", "Unknown")
+    print("✅ Weak hits dropped, names matched as a whole")
+
+def test_reciprocal_rank_fusion():
+    """Test that chunks ranked well by both lists come first"""
+    print("Testing rank fusion...")
+
+    a, b, c = [(doc, meta) for doc, meta in zip(DOCUMENTS[:3], METADATAS[:3])]
+    fused = reciprocal_rank_fusion([[a, b], [b, c]])
+    assert fused == [b, a, c]
+    print("✅ Fused order")
+
+def main():
+    """Run all tests"""
+    print("🧪 LEXICAL INDEX TESTS")
+    print("=" * 50)
+
+    test_tokenize()
+    test_search_and_confidence()
+    test_weak_hits_and_name_mentions()
+    test_reciprocal_rank_fusion()
+
+    print("\n🎉 All tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Test script for the Prometheus metrics registry and endpoint
+"""
+import os
+import sys
+import urllib.request
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.metrics import CONTENT_TYPE, Registry, SessionActivity, cache_samples, start_metrics_server
+
+def test_exposition_format():
+    """Test counters, callback metrics and histograms in the text format"""
+    print("Testing exposition format...")
+
+    registry = Registry()
+    requests = registry.counter("test_requests_total", "Requests", ["intent"])
+    cache = registry.counter("test_cache_requests_total", "Cache lookups", ["cache", "result"])
+    latency = registry.histogram("test_latency_seconds", "Latency", ["route"], buckets=(0.1, 1.0))
+
+    requests.inc(intent="disease")
+    requests.inc(2, intent='say "hi"')
+    cache.set_function(lambda: cache_samples("prediction", {"hits": 3, "misses": 1}))
+    latency.observe(0.05, route="disease")
+    latency.observe(0.5, route="disease")
+    latency.observe(5, route="disease")
+
+    text = registry.render()
+    assert "# TYPE test_requests_total counter" in text
+    assert 'test_requests_total{intent="disease"} 1' in text
+    assert 'test_requests_total{intent="say \\"hi\\""} 2' in text
+    assert 'test_cache_requests_total{cache="prediction",result="hit"} 3' in text
+    assert 'test_latency_seconds_bucket{route="disease",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{route="disease",le="1"} 2' in text
+    assert 'test_latency_seconds_bucket{route="disease",le="+Inf"} 3' in text
+    assert 'test_latency_seconds_count{route="disease"} 3' in text
+    assert 'test_latency_seconds_sum{route="disease"} 5.55' in text
+
+    try:
+        requests.inc(route="disease")
+        assert False, "wrong labels should be rejected"
+    except ValueError:
+        pass
+    print("✅ Counters, callbacks and histograms rendered")
+
+def test_session_activity():
+    """Test that only recently seen sessions count as active"""
+    print("Testing active sessions...")
+
+    activity = SessionActivity(window=60)
+    activity.touch("a")
+    activity.touch("b")
+    activity._last_seen["b"] -= 120
+    assert activity.count() == 1
+    print("✅ Inactive sessions expire")
+
+def test_metrics_endpoint():
+    """Test the side-thread HTTP endpoint"""
+    print("Testing /metrics endpoint...")
+
+    registry = Registry()
+    registry.counter("test_endpoint_total", "Endpoint test").inc()
+    server = start_metrics_server("127.0.0.1", 0, registry=registry)
+    assert server is not None
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            body = response.read().decode("utf-8")
+            assert response.headers["Content-Type"] == CONTENT_TYPE
+        assert "test_endpoint_total 1" in body
+    finally:
+        server.shutdown()
+    print("✅ Metrics served")
+
+def main():
+    """Run all tests"""
+    print("🧪 METRICS TESTS")
+    print("=" * 50)
+
+    test_exposition_format()
+    test_session_activity()
+    test_metrics_endpoint()
+
+    print("\n🎉 All tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Test script for the vision model prediction cache
+"""
+import os
+import sys
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image
+
+from models.prediction_cache import PredictionCache
+
+def test_cache_hit_and_miss():
+    """Test that repeated uploads hit the cache"""
+    print("Testing prediction cache hits and misses...")
+
+    cache = PredictionCache(max_entries=4)
+    cache.set_namespace("model:float32")
+
+    key = PredictionCache.key_from_bytes(b"same upload")
+    assert cache.get(key) is None
+
+    cache.put([key], np.array([0.1, 0.9]))
+    cached = cache.get(PredictionCache.key_from_bytes(b"same upload"))
+    assert cached is not None and cached[1] == 0.9
+
+    stats = cache.stats()
+    print(f"✅ hits={stats['hits']} misses={stats['misses']} hit_rate={stats['hit_rate']:.2f}")
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+def test_pixel_key_matches_identical_images():
+    """Test that decoded pixel hashing ignores re-encoding"""
+    print("Testing pixel-based cache keys...")
+
+    first = Image.new("RGB", (8, 8), color=(200, 10, 10))
+    second = Image.new("RGB", (8, 8), color=(200, 10, 10))
+    other = Image.new("RGB", (8, 8), color=(10, 200, 10))
+
+    assert PredictionCache.key_from_pixels(first) == PredictionCache.key_from_pixels(second)
+    assert PredictionCache.key_from_pixels(first) != PredictionCache.key_from_pixels(other)
+    print("✅ Pixel keys are content-based")
+
+def test_eviction_and_invalidation():
+    """Test LRU eviction and namespace invalidation"""
+    print("Testing eviction and invalidation...")
+
+    cache = PredictionCache(max_entries=2)
+    cache.set_namespace("model:float32")
+    for name in ("a", "b", "c"):
+        cache.put([name], np.zeros(2))
+
+    assert cache.get("a") is None
+    assert cache.get("c") is not None
+
+    # Byte and pixel keys of one image count as a single entry
+    cache.clear()
+    cache.put(["bytes:1", "pixels:1"], np.zeros(2))
+    cache.put(["bytes:2", "pixels:2"], np.ones(2))
+    assert cache.stats()["size"] == 2
+    assert cache.get("pixels:1") is not None and cache.get("bytes:2") is not None
+
+    # Switching precision mode must drop all entries
+    cache.set_namespace("model:bfloat16")
+    assert cache.stats()["size"] == 0
+    print("✅ Oldest entries evicted and cache cleared on model change")
+
+def main():
+    """Run all tests"""
+    print("🧪 PREDICTION CACHE TESTS")
+    print("=" * 50)
+
+    test_cache_hit_and_miss()
+    test_pixel_key_matches_identical_images()
+    test_eviction_and_invalidation()
+
+    print("\n🎉 All tests completed!")
+
+if __name__ == "__main__":
+    main()
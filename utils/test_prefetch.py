@@ -0,0 +1,136 @@
+"""
+Test script for speculative quick-question prefetch
+"""
+import os
+import sys
+import threading
+import time
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from openai import OpenAI
+
+from services.chat_service import ChatService
+from services.prefetch import PrefetchManager
+
+def test_claim_prefetched_answer():
+    """Test that a prefetched answer is served once, for the same prompt only"""
+    print("Testing prefetch claim...")
+
+    manager = PrefetchManager()
+    assert manager.start("session-1", "cho tôi thông tin bệnh A", lambda: ("answer", None))
+    assert manager.claim("session-1", "câu hỏi khác", timeout=1) is None
+    assert manager.claim("session-1", "cho tôi thông tin bệnh A", timeout=1) == ("answer", None)
+    assert manager.claim("session-1", "cho tôi thông tin bệnh A", timeout=1) is None
+    print("✅ Prefetched answer served once")
+
+def test_failed_prefetch_not_served():
+    """Test that a failed prefetch falls back to a normal request"""
+    print("Testing failed prefetch...")
+
+    def fail():
+        raise RuntimeError("429 Too Many Requests")
+
+    manager = PrefetchManager()
+    manager.start("session-1", "q", fail)
+    assert manager.claim("session-1", "q", timeout=1) is None
+    print("✅ Failed prefetch ignored")
+
+def test_throttle_and_in_flight_limit():
+    """Test that prefetches are dropped under rate-limit pressure"""
+    print("Testing prefetch throttling...")
+
+    release = threading.Event()
+    throttled = {"value": False}
+    manager = PrefetchManager(max_workers=1, max_in_flight=1,
+                              should_throttle=lambda: throttled["value"])
+
+    assert manager.start("session-1", "q", release.wait)
+    assert not manager.start("session-2", "q", lambda: "answer")
+
+    throttled["value"] = True
+    assert not manager.start("session-3", "q", lambda: "answer")
+    assert manager.claim("session-1", "q", timeout=0) is None
+    release.set()
+    print(f"✅ {manager.stats()}")
+
+def test_expired_prefetch_dropped():
+    """Test that unclaimed prefetches expire"""
+    print("Testing prefetch expiry...")
+
+    manager = PrefetchManager(ttl=0.05)
+    manager.start("session-1", "q", lambda: "answer")
+    time.sleep(0.1)
+    assert manager.claim("session-1", "q", timeout=1) is None
+    print("✅ Expired prefetch dropped")
+
+def test_shutdown():
+    """Test that shutdown waits for running prefetches and starts no more"""
+    print("Testing prefetch shutdown...")
+
+    finished = []
+
+    def slow():
+        time.sleep(0.1)
+        finished.append(1)
+        return "answer"
+
+    manager = PrefetchManager(max_workers=1)
+    manager.start("session-1", "q", slow)
+    time.sleep(0.02)
+    manager.start("session-2", "q", slow)
+    manager.shutdown()
+
+    assert finished == [1] and manager.stats()["wasted"] == 2
+    assert not manager.start("session-3", "q", slow)
+    assert manager.claim("session-1", "q", timeout=1) is None
+    print("✅ Running prefetch finished, queued one cancelled")
+
+def test_rate_limited_prefetch_cancels_unclaimed():
+    """Test that a 429 on a prefetch throttles prefetching and drops the unclaimed ones"""
+    print("Testing rate limit from a prefetch...")
+
+    service = ChatService(rag_service=object())
+    service.client = OpenAI(
+        base_url="http://llm.test/v1", api_key="test", max_retries=0,
+        http_client=httpx.Client(transport=httpx.MockTransport(
+            lambda request: httpx.Response(429, json={"error": {"message": "Rate limit exceeded"}})
+        ))
+    )
+
+    release = threading.Event()
+    original = ChatService.last_rate_limited_at, list(ChatService.rate_limit_listeners)
+    manager = PrefetchManager(max_workers=2, should_throttle=lambda: ChatService.is_rate_limited(60))
+    ChatService.rate_limit_listeners.append(manager.cancel_unclaimed)
+    try:
+        ChatService.last_rate_limited_at = 0.0
+        assert manager.start("session-1", "q", release.wait)
+        assert manager.start("session-2", "q", service.generate_response, [{"role": "user", "content": "q"}])
+        assert manager.claim("session-2", "q", timeout=5) is None
+
+        assert ChatService.is_rate_limited(60)
+        assert manager.claim("session-1", "q", timeout=0) is None and manager.in_flight() == 0
+        assert not manager.start("session-3", "q", lambda: "answer")
+    finally:
+        release.set()
+        ChatService.last_rate_limited_at, ChatService.rate_limit_listeners[:] = original
+    print(f"✅ {manager.stats()}")
+
+def main():
+    """Run all tests"""
+    print("🧪 PREFETCH TESTS")
+    print("=" * 50)
+
+    test_claim_prefetched_answer()
+    test_failed_prefetch_not_served()
+    test_throttle_and_in_flight_limit()
+    test_expired_prefetch_dropped()
+    test_shutdown()
+    test_rate_limited_prefetch_cancels_unclaimed()
+
+    print("\n🎉 All tests completed!")
+
+if __name__ == "__main__":
+    main()
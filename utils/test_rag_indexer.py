@@ -0,0 +1,119 @@
+"""
+Test script for the knowledge base indexer and its read-only snapshots
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import services.rag_indexer as rag_indexer
+from config.settings import Config
+from services.rag_indexer import (CURRENT_POINTER, _snapshot_name, _switch_current, current_snapshot,
+                                  make_private_replica, publish_snapshot, remove_private_replica)
+
+def test_switch_and_prune():
+    """Test that the CURRENT pointer is switched atomically and old snapshots are pruned"""
+    print("Testing snapshot switch...")
+
+    with tempfile.TemporaryDirectory() as root:
+        assert current_snapshot(root) is None
+
+        names = [f"snapshot-2026010{i}-000000" for i in range(1, 5)]
+        for name in names:
+            os.makedirs(os.path.join(root, name))
+            _switch_current(root, name, keep=2)
+            assert current_snapshot(root) == os.path.join(root, name)
+
+        assert sorted(os.listdir(root)) == [CURRENT_POINTER] + names[-2:]
+
+        # A pointer to a snapshot that is gone is not served
+        with open(os.path.join(root, CURRENT_POINTER), 'w', encoding='utf-8') as f:
+            f.write(names[0])
+        assert current_snapshot(root) is None
+
+    # Snapshots published within the same second get distinct names, in order
+    names = [_snapshot_name() for _ in range(3)]
+    assert len(set(names)) == 3 and names == sorted(names)
+    print("✅ Pointer switched, two snapshots kept")
+
+def test_private_replicas():
+    """Test that replicas are private copies, removed once unused or when their process died"""
+    print("Testing private replicas...")
+
+    original_dir = rag_indexer.REPLICAS_DIR
+    with tempfile.TemporaryDirectory() as directory:
+        rag_indexer.REPLICAS_DIR = os.path.join(directory, "replicas")
+        try:
+            snapshot = os.path.join(directory, "snapshot-20260101-000000")
+            os.makedirs(snapshot)
+            with open(os.path.join(snapshot, "chroma.sqlite3"), 'w', encoding='utf-8') as f:
+                f.write("index")
+
+            # A replica left behind by a process that is no longer running
+            dead = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"],
+                                  capture_output=True, text=True)
+            stale = os.path.join(rag_indexer.REPLICAS_DIR, f"{dead.stdout.strip()}-old")
+            os.makedirs(stale)
+
+            first = make_private_replica(snapshot)
+            second = make_private_replica(snapshot)
+            assert not os.path.exists(stale)
+            assert first != second and os.path.basename(first).startswith(f"{os.getpid()}-")
+            with open(os.path.join(first, "chroma.sqlite3"), 'r', encoding='utf-8') as f:
+                assert f.read() == "index"
+
+            remove_private_replica(first)
+            assert not os.path.exists(first) and first not in rag_indexer._replicas
+            assert os.path.isdir(second)
+            remove_private_replica(second)
+        finally:
+            rag_indexer.REPLICAS_DIR = original_dir
+    print("✅ Replicas copied and removed")
+
+def test_publish_and_follow_snapshot():
+    """Test publishing snapshots and a reader switching to the new one"""
+    print("Testing publish...")
+
+    from services.rag_service import RAGService
+
+    original = (Config.CHROMA_SNAPSHOT_DIR, Config.CHROMA_RECONNECT_INTERVAL)
+    with tempfile.TemporaryDirectory() as root:
+        try:
+            Config.CHROMA_SNAPSHOT_DIR, Config.CHROMA_RECONNECT_INTERVAL = root, 0.0
+            first = publish_snapshot(root, keep=2)
+            assert current_snapshot(root) == first
+            assert not [name for name in os.listdir(root) if name.startswith(".")]
+
+            reader = RAGService(mode="snapshot", vector_backend="chroma")
+            assert reader.health_check()["ok"] and reader.snapshot == first
+            first_replica = reader.replica
+
+            second = publish_snapshot(root, keep=2)
+            assert second != first and reader.health_check()["ok"]
+            assert reader.snapshot == second
+            # The replica of the first snapshot is removed after the switch
+            second_replica = reader.replica
+            assert not os.path.exists(first_replica) and os.path.isdir(second_replica)
+
+            reader.close()
+            assert not os.path.exists(second_replica)
+        finally:
+            Config.CHROMA_SNAPSHOT_DIR, Config.CHROMA_RECONNECT_INTERVAL = original
+    print("✅ Snapshot published, reader switched and cleaned up")
+
+def main():
+    """Run all tests"""
+    print("🧪 RAG INDEXER TESTS")
+    print("=" * 50)
+
+    test_switch_and_prune()
+    test_private_replicas()
+    test_publish_and_follow_snapshot()
+
+    print("\n🎉 All tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Test script for the reference image similarity index
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import torch
+from PIL import Image
+from transformers import BitImageProcessor, Dinov2Config, Dinov2ForImageClassification
+
+from models.reference_index import (IMAGES_DIR, ReferenceImageIndex, _label_from_filename, build_index,
+                                    pop_captured_embedding, register_embedding_hook)
+
+MAPPING_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models",
+                            "disease_mapping.json")
+
+def tiny_model():
+    """Build a tiny randomly initialized classifier and its processor"""
+    torch.manual_seed(0)
+    config = Dinov2Config(hidden_size=32, num_hidden_layers=1, num_attention_heads=2, intermediate_size=64,
+                          image_size=56, patch_size=14, num_labels=3)
+    model = Dinov2ForImageClassification(config).eval()
+    processor = BitImageProcessor(size={"shortest_edge": 56}, crop_size={"height": 56, "width": 56})
+    return processor, model
+
+def test_hook_is_thread_local():
+    """Test that each thread pops the embedding of its own forward pass"""
+    print("Testing embedding hook...")
+
+    processor, model = tiny_model()
+    register_embedding_hook(model)
+    register_embedding_hook(model)
+    assert len(model.classifier._forward_pre_hooks) == 1
+
+    colors = ["red", "green", "blue", "white"]
+    inputs = {color: processor(images=Image.new("RGB", (64, 64), color), return_tensors="pt")["pixel_values"]
+              for color in colors}
+    popped = {}
+    # Every thread runs its forward pass before any of them pops
+    barrier = threading.Barrier(len(colors))
+
+    def run(color):
+        with torch.no_grad():
+            model(pixel_values=inputs[color])
+        barrier.wait()
+        popped[color] = pop_captured_embedding()
+
+    threads = [threading.Thread(target=run, args=(color,)) for color in colors]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for color in colors:
+        with torch.no_grad():
+            model(pixel_values=inputs[color])
+        expected = pop_captured_embedding()
+        assert popped[color].shape == (1, model.classifier.in_features)
+        assert np.allclose(popped[color], expected, atol=1e-6)
+    assert pop_captured_embedding() is None
+    print("✅ Each thread saw its own embedding")
+
+def test_build_and_load():
+    """Test building the memory-mapped index and searching it"""
+    print("Testing index build and load...")
+
+    processor, model = tiny_model()
+    filenames = ["Melanoma_1.jpg", "Melanoma_2.jpg", "Psoriasis_1.jpg", "Psoriasis_2.jpg"]
+    with tempfile.TemporaryDirectory() as directory:
+        images_dir = os.path.join(directory, "images")
+        os.makedirs(images_dir)
+        for name in filenames:
+            shutil.copy(os.path.join(IMAGES_DIR, name), images_dir)
+        matrix_path = os.path.join(directory, "reference_embeddings.npy")
+        metadata_path = os.path.join(directory, "reference_embeddings.json")
+
+        build_index(batch_size=3, images_dir=images_dir, matrix_path=matrix_path, metadata_path=metadata_path,
+                    processor=processor, model=model)
+        index = ReferenceImageIndex.load(matrix_path, metadata_path)
+
+        assert isinstance(index.matrix, np.memmap)
+        assert index.matrix.shape == (len(filenames), model.classifier.in_features)
+        assert np.allclose(np.linalg.norm(index.matrix, axis=1), 1.0, atol=1e-5)
+        assert list(index.labels) == ["Melanoma", "Melanoma", "Psoriasis", "Psoriasis"]
+        assert [os.path.basename(path) for path in index.paths] == filenames
+        assert all(os.path.exists(path) for path in index.paths)
+
+        # An indexed image is its own nearest neighbour, within the requested labels too
+        query = np.asarray(index.matrix[2]) * 5
+        assert index.most_similar(query, k=1) == [index.paths[2]]
+        assert set(index.most_similar(query, k=3, labels=["Melanoma"])) == set(index.paths[:2])
+        assert index.most_similar(np.zeros(index.matrix.shape[1])) == []
+
+        with open(metadata_path, 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+        metadata["model"] = "another/model"
+        with open(metadata_path, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f)
+        assert ReferenceImageIndex.load(matrix_path, metadata_path) is None
+    print("✅ Built, memory-mapped and searched")
+
+def test_labels_match_disease_mapping():
+    """Test that every reference image label is a class of the disease mapping"""
+    print("Testing reference labels...")
+
+    with open(MAPPING_PATH, 'r', encoding='utf-8') as f:
+        mapping = json.load(f)
+    labels = {
+        _label_from_filename(name) for name in os.listdir(IMAGES_DIR)
+        if name.lower().endswith(('.jpg', '.jpeg', '.png'))
+    }
+
+    assert labels and labels <= set(mapping), sorted(labels - set(mapping))
+    print(f"✅ {len(labels)} labels, all in disease_mapping.json")
+
+def main():
+    """Run all tests"""
+    print("🧪 REFERENCE INDEX TESTS")
+    print("=" * 50)
+
+    test_hook_is_thread_local()
+    test_build_and_load()
+    test_labels_match_disease_mapping()
+
+    print("\n🎉 All tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Test script for per-session memory accounting and disk spill
+"""
+import os
+import sys
+import tempfile
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streamlit.testing.v1 import AppTest
+
+from config.settings import Config
+from utils.metrics import REGISTRY
+from utils.session_store import SessionSpillStore, SessionMemoryGauge, estimate_size, get_session_memory_gauge
+
+def test_estimate_size():
+    """Test size accounting for text and encoded images"""
+    print("Testing session size estimation...")
+
+    message = {"role": "user", "content": "Da tôi bị ngứa", "image": b"\xff" * 5000}
+    size = estimate_size([message])
+    print(f"✅ Message with image estimated at {size} bytes")
+    assert size > 5000
+
+def test_spill_and_page_in():
+    """Test that spilled pages come back newest first"""
+    print("Testing spill and page-in...")
+
+    store = SessionSpillStore(tempfile.mkdtemp())
+    store.spill("session-1", [{"role": "user", "content": "turn 1"}])
+    store.spill("session-1", [{"role": "user", "content": "turn 2"}])
+    assert store.spilled_page_count("session-1") == 2
+
+    page = store.page_in("session-1")
+    assert page[0]["content"] == "turn 2"
+    assert store.spilled_page_count("session-1") == 1
+
+    store.clear("session-1")
+    assert store.spilled_page_count("session-1") == 0
+    assert store.page_in("session-1") == []
+    print("✅ Pages spilled and restored in order")
+
+def test_memory_gauge():
+    """Test the process-wide session memory gauge"""
+    print("Testing session memory gauge...")
+
+    gauge = SessionMemoryGauge()
+    gauge.report("a", 1000)
+    gauge.report("b", 3000)
+    gauge.report("a", 2000)
+
+    snapshot = gauge.snapshot()
+    print(f"✅ {snapshot}")
+    assert snapshot == {"total_bytes": 5000, "sessions": 2, "max_session_bytes": 3000}
+
+def test_memory_gauge_exported():
+    """Test that the process-wide gauge is exported with the metrics"""
+    print("Testing session memory metrics...")
+
+    gauge = get_session_memory_gauge()
+    gauge.report("metrics-session", 10 ** 12)
+    try:
+        rendered = REGISTRY.render()
+        assert 'chatbot_session_memory_bytes{scope="largest_session"} 1000000000000' in rendered
+        assert 'chatbot_session_memory_bytes{scope="total"} ' in rendered
+        sessions = gauge.snapshot()["sessions"]
+        assert f"chatbot_session_memory_sessions {sessions}" in rendered
+    finally:
+        gauge.remove("metrics-session")
+    print("✅ Session memory exported")
+
+def budget_script():
+    """App that adds a message or loads older messages, as st.session_state.action says"""
+    import streamlit as st
+    from utils.helpers import SessionManager
+
+    SessionManager.initialize_session()
+    action = st.session_state.get("action")
+    if action == "add":
+        SessionManager.add_message("user", "x" * 1000)
+        SessionManager.enforce_memory_budget()
+    elif action == "load":
+        SessionManager.load_older_messages()
+    elif action == "clear":
+        SessionManager.clear_messages()
+    st.session_state.action = None
+
+def test_paged_in_messages_stay_resident():
+    """Test that messages loaded back are not spilled again by the next turn"""
+    print("Testing paged-in messages...")
+
+    original = Config.SESSION_MEMORY_BUDGET_BYTES, Config.SESSION_MIN_RESIDENT_MESSAGES, Config.SESSION_BACKEND
+    Config.SESSION_MEMORY_BUDGET_BYTES, Config.SESSION_MIN_RESIDENT_MESSAGES, Config.SESSION_BACKEND = 8000, 2, "memory"
+    try:
+        at = AppTest.from_function(budget_script)
+
+        def run(action):
+            at.session_state.action = action
+            at.run()
+            assert not at.exception
+
+        for _ in range(12):
+            run("add")
+        resident = len(at.session_state.messages)
+        assert resident < 12
+
+        run("load")
+        loaded = len(at.session_state.messages)
+        assert loaded > resident
+        run("add")
+        assert len(at.session_state.messages) == loaded + 1
+
+        # Once the session has grown by a full budget, spilling resumes
+        for _ in range(8):
+            run("add")
+        assert len(at.session_state.messages) < loaded + 9
+        print(f"✅ Kept the {loaded - resident} loaded messages until the session grew by a budget")
+        run("clear")
+    finally:
+        Config.SESSION_MEMORY_BUDGET_BYTES, Config.SESSION_MIN_RESIDENT_MESSAGES, Config.SESSION_BACKEND = original
+
+def main():
+    """Run all tests"""
+    print("🧪 SESSION MEMORY BUDGET TESTS")
+    print("=" * 50)
+
+    test_estimate_size()
+    test_spill_and_page_in()
+    test_memory_gauge()
+    test_memory_gauge_exported()
+    test_paged_in_messages_stay_resident()
+
+    print("\n🎉 All tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Test script for the startup orchestrator
+"""
+import os
+import sys
+import time
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.startup import StartupOrchestrator
+
+def slow(value, seconds=0.3):
+    def factory(**dependencies):
+        time.sleep(seconds)
+        return value
+    return factory
+
+def test_independent_resources_overlap():
+    """Test that independent resources are initialized concurrently"""
+    print("Testing concurrent initialization...")
+
+    orchestrator = StartupOrchestrator(max_workers=4)
+    orchestrator.register("vision", slow("model"))
+    orchestrator.register("rag", slow("index"))
+    orchestrator.register("chat", lambda rag: f"chat({rag})", depends_on=("rag",))
+
+    started = time.perf_counter()
+    orchestrator.start()
+    assert orchestrator.get("chat") == "chat(index)"
+    assert orchestrator.get("vision") == "model"
+    elapsed = time.perf_counter() - started
+
+    readiness = orchestrator.readiness()
+    print(f"✅ Ready in {elapsed:.2f}s: {readiness['resources']}")
+    assert readiness["ready"]
+    assert elapsed < 0.5
+    assert readiness["resources"]["vision"]["seconds"] >= 0.3
+
+def test_failure_reported():
+    """Test that failures propagate to dependents and the readiness probe"""
+    print("Testing failed initialization...")
+
+    def fail():
+        raise OSError("chromadb unavailable")
+
+    orchestrator = StartupOrchestrator(retry_interval=60)
+    orchestrator.register("rag", fail)
+    orchestrator.register("chat", lambda rag: "chat", depends_on=("rag",))
+
+    try:
+        orchestrator.get("chat", timeout=5)
+        assert False, "dependent of a failed resource was built"
+    except RuntimeError as e:
+        assert "chromadb unavailable" in str(e)
+
+    readiness = orchestrator.readiness()
+    assert not readiness["ready"]
+    assert readiness["resources"]["rag"]["status"] == "failed"
+    print(f"✅ {readiness['resources']['chat']['error']}")
+
+def test_lazy_start():
+    """Test that resources are only built when started or requested"""
+    print("Testing on-demand initialization...")
+
+    orchestrator = StartupOrchestrator()
+    orchestrator.register("vision", slow("model", seconds=0))
+    orchestrator.start([])
+    assert orchestrator.peek("vision") is None
+    assert not orchestrator.readiness(["vision"])["ready"]
+    assert orchestrator.get("vision", timeout=5) == "model"
+    print("✅ Resource built on first request")
+
+def main():
+    """Run all tests"""
+    print("🧪 STARTUP ORCHESTRATOR TESTS")
+    print("=" * 50)
+
+    test_independent_resources_overlap()
+    test_failure_reported()
+    test_lazy_start()
+
+    print("\n🎉 All tests completed!")
+
+if __name__ == "__main__":
+    main()
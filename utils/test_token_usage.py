@@ -0,0 +1,80 @@
+"""
+Test script for token and cost accounting
+"""
+import os
+import sys
+from types import SimpleNamespace
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.token_usage import UsageLedger, count_tokens, measure_prompt, session_scope
+
+BASE_PROMPT = "Bạn là một chuyên viên da liễu."
+
+def test_prompt_breakdown():
+    """Test that the RAG context and history are measured apart from the system prompt"""
+    print("Testing prompt breakdown...")
+
+    context = "\n\nQUAN TRỌNG: Sử dụng thông tin sau: vảy nến là bệnh viêm da mạn tính."
+    messages = [{"role": "user", "content": "vảy nến là gì?"}]
+    breakdown = measure_prompt(BASE_PROMPT + context, messages, BASE_PROMPT)
+
+    assert breakdown["context"] == count_tokens(context)
+    assert breakdown["system"] > count_tokens(BASE_PROMPT)
+    assert breakdown["history"] > count_tokens(messages[0]["content"])
+    assert measure_prompt(BASE_PROMPT, messages, BASE_PROMPT)["context"] == 0
+    print(f"✅ {breakdown}")
+
+def test_provider_and_local_usage():
+    """Test that provider numbers win and local measurement fills the gaps"""
+    print("Testing usage sources...")
+
+    ledger = UsageLedger(prompt_price=1.0, completion_price=2.0)
+    breakdown = {"system": 10, "context": 20, "history": 30}
+    provider = SimpleNamespace(prompt_tokens=70, completion_tokens=40,
+                               completion_tokens_details=SimpleNamespace(reasoning_tokens=15))
+
+    with session_scope("s1"):
+        reported = ledger.record(breakdown, "câu trả lời", provider_usage=provider, intent="disease")
+    measured = ledger.record(breakdown, "câu trả lời", reasoning_text="suy nghĩ", session_id="s1",
+                             intent="small_talk")
+
+    assert reported["source"] == "provider" and reported["session_id"] == "s1"
+    assert (reported["prompt_tokens"], reported["reasoning_tokens"]) == (70, 15)
+    assert reported["cost"] == (70 * 1.0 + 40 * 2.0) / 1e6
+    assert measured["source"] == "local"
+    assert measured["prompt_tokens"] >= 60
+    assert measured["completion_tokens"] == count_tokens("câu trả lời") + count_tokens("suy nghĩ")
+
+    totals = ledger.session_totals("s1")
+    assert totals["calls"] == 2 and totals["context_tokens"] == 40
+    assert set(ledger.intent_totals()) == {"disease", "small_talk"}
+    assert ledger.recent(limit=1, session_id="s1")[0]["intent"] == "small_talk"
+    print(f"✅ Session totals: {totals}")
+
+def test_budget_guard():
+    """Test that prompts over the budget are flagged"""
+    print("Testing prompt budget...")
+
+    ledger = UsageLedger(prompt_budget=100)
+    small = ledger.record({"system": 10, "context": 10, "history": 10}, session_id="s1")
+    large = ledger.record({"system": 10, "context": 80, "history": 50}, session_id="s1")
+
+    assert not small["over_budget"] and large["over_budget"]
+    assert ledger.session_totals("s1")["over_budget"] == 1
+    print("✅ Oversized prompt flagged")
+
+def main():
+    """Run all tests"""
+    print("🧪 TOKEN USAGE TESTS")
+    print("=" * 50)
+
+    test_prompt_breakdown()
+    test_provider_and_local_usage()
+    test_budget_guard()
+
+    print("\n🎉 All tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Test script for in-process tracing
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.tracing import Tracer
+
+def test_nested_spans_and_threads():
+    """Test that spans nest, also across threads, into one trace"""
+    print("Testing span nesting...")
+
+    tracer = Tracer()
+    with tracer.span("ui.chat_turn", session_id="s1"):
+        with tracer.span("rag.retrieve"):
+            pass
+        with tracer.span("vision.predict"):
+            thread_done = threading.Event()
+
+            def work():
+                with tracer.span("vision.forward"):
+                    pass
+                thread_done.set()
+            threading.Thread(target=tracer.wrap(work)).start()
+            thread_done.wait(1)
+
+    trace = tracer.last_trace(session_id="s1")
+    rows = {row["name"]: row for row in trace.waterfall()}
+    assert rows["ui.chat_turn"]["depth"] == 0
+    assert rows["rag.retrieve"]["depth"] == 1
+    assert rows["vision.forward"]["depth"] == 2
+    assert tracer.last_trace(session_id="other") is None
+    print(f"✅ {[(row['name'], row['depth']) for row in trace.waterfall()]}")
+
+def test_ring_buffer_and_errors():
+    """Test that only recent traces are kept and failures are marked"""
+    print("Testing ring buffer...")
+
+    tracer = Tracer(max_traces=3)
+    for i in range(5):
+        with tracer.span("turn", index=i):
+            pass
+    try:
+        with tracer.span("turn", index=5):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+
+    traces = tracer.recent()
+    assert [trace.attributes["index"] for trace in traces] == [5, 4, 3]
+    assert traces[0].waterfall()[0]["error"] == "ValueError: boom"
+    print("✅ Ring buffer bounded, error recorded")
+
+def test_otlp_export():
+    """Test the OTLP/JSON file export"""
+    print("Testing OTLP export...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "spans.jsonl")
+        tracer = Tracer(export_path=path)
+        with tracer.span("ui.chat_turn", session_id="s1"):
+            with tracer.span("rag.search", n_results=5):
+                pass
+        with open(path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+
+    assert len(lines) == 1
+    spans = json.loads(lines[0])["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    root, child = sorted(spans, key=lambda span: "parentSpanId" in span)
+    assert child["parentSpanId"] == root["spanId"] and child["traceId"] == root["traceId"]
+    assert len(root["traceId"]) == 32 and len(root["spanId"]) == 16
+    assert {"key": "n_results", "value": {"intValue": "5"}} in child["attributes"]
+    print("✅ Spans exported as OTLP/JSON")
+
+def main():
+    """Run all tests"""
+    print("🧪 TRACING TESTS")
+    print("=" * 50)
+
+    test_nested_spans_and_threads()
+    test_ring_buffer_and_errors()
+    test_otlp_export()
+
+    print("\n🎉 All tests completed!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Test script for the NumPy vector store
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+# Add the parent directory to the path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import Config
+from services.rag_service import RAGService
+from services.vector_store import NumpyVectorStore
+
+IDS = ["disease_0_chunk_0", "disease_1_chunk_0", "disease_2_chunk_0"]
+DOCUMENTS = ["Bệnh: Psoriasis", "Bệnh: Impetigo", "Bệnh: Melanoma"]
+METADATAS = [{"disease_name": name} for name in ("Psoriasis", "Impetigo", "Melanoma")]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class KeywordEmbedding:
+    """Embeds a text as its counts of a few keywords, and counts its calls"""
+
+    KEYWORDS = ("psoriasis", "impetigo", "melanoma")
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, input):
+        self.calls += 1
+        return [[text.lower().count(k) + 0.1 for k in self.KEYWORDS] for text in input]
+
+def test_exact_search():
+    """Test that queries return the nearest chunks with cosine distances"""
+    print("Testing exact search...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = NumpyVectorStore.open_or_build(directory, IDS, DOCUMENTS, METADATAS, KeywordEmbedding(), "keywords")
+        results = store.query(query_texts=["melanoma", "impetigo"], n_results=2)
+
+        assert isinstance(store.embeddings, np.memmap) and store.count() == 3
+        assert results["documents"][0][0] == "Bệnh: Melanoma"
+        assert results["metadatas"][1][0]["disease_name"] == "Impetigo"
+        assert results["distances"][0][0] < 0.05 < results["distances"][0][1]
+        assert len(results["ids"][0]) == 2
+        print(f"✅ Distances {results['distances'][0]}")
+
+def test_cache_reuse():
+    """Test that the cached matrix is reused until the chunks change"""
+    print("Testing index cache...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        embedding = KeywordEmbedding()
+        NumpyVectorStore.open_or_build(directory, IDS, DOCUMENTS, METADATAS, embedding, "keywords")
+        NumpyVectorStore.open_or_build(directory, IDS, DOCUMENTS, METADATAS, embedding, "keywords")
+        assert embedding.calls == 1
+
+        changed = NumpyVectorStore.open_or_build(directory, IDS[:2], DOCUMENTS[:2], METADATAS[:2], embedding,
+                                                 "keywords")
+        assert embedding.calls == 2 and changed.count() == 2
+        assert len([name for name in os.listdir(directory) if name.endswith(".npy")]) == 1
+
+        # Same embedding function class, another model
+        NumpyVectorStore.open_or_build(directory, IDS[:2], DOCUMENTS[:2], METADATAS[:2], embedding, "keywords-v2")
+        assert embedding.calls == 3
+        print("✅ Rebuilt only when the chunks or the model changed")
+
+def test_backend_selection():
+    """Test that "auto" switches to Chroma above the size limit or for a Chroma-only mode"""
+    print("Testing backend selection...")
+
+    assert RAGService._select_vector_backend("auto", Config.VECTOR_NUMPY_MAX_CHUNKS) == "numpy"
+    assert RAGService._select_vector_backend("auto", Config.VECTOR_NUMPY_MAX_CHUNKS + 1) == "chroma"
+    assert RAGService._select_vector_backend("chroma", 10) == "chroma"
+    assert RAGService._select_vector_backend("auto", 10, mode="snapshot") == "chroma"
+    assert RAGService._select_vector_backend("auto", 10, mode="http") == "chroma"
+    print("✅ Backend chosen by Chroma mode and corpus size")
+
+def test_import_is_light():
+    """Test that importing the RAG service does not import Chroma"""
+    print("Testing import cost...")
+
+    result = subprocess.run(
+        [sys.executable, "-c", "import sys, services.rag_service; print('chromadb' in sys.modules)"],
+        cwd=ROOT, capture_output=True, text=True, timeout=120
+    )
+    assert result.stdout.strip() == "False", result.stdout + result.stderr
+    print("✅ chromadb not imported")
+
+def main():
+    """Run all tests"""
+    print("🧪 VECTOR STORE TESTS")
+    print("=" * 50)
+
+    test_exact_search()
+    test_cache_reuse()
+    test_backend_selection()
+    test_import_is_light()
+
+    print("\n🎉 All tests completed!")
+
+if __name__ == "__main__":
+    main()
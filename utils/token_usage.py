@@ -0,0 +1,253 @@
+"""
+Token and cost accounting of LLM calls
+
+Every call is recorded with its prompt, completion and reasoning tokens,
+taken from the provider's usage block and measured locally with tiktoken
+when the provider omits them. The prompt is also broken down into the base
+system prompt, the RAG context added to it and the conversation history,
+since prompt size is what drives LLM latency. Calls roll up per session and
+per intent, and a prompt larger than Config.PROMPT_TOKEN_BUDGET is logged
+as a warning.
+
+The session of a call is taken from session_scope(), which the UI, the
+diagnosis job manager and the prefetch manager open around their work.
+"""
+import contextlib
+import contextvars
+import functools
+import logging
+import threading
+from collections import OrderedDict, deque
+
+import tiktoken
+
+from config.settings import Config
+from utils.metrics import LLM_TOKENS, PROMPT_BUDGET_EXCEEDED, PROMPT_TOKENS
+
+logger = logging.getLogger(__name__)
+
+# Chat format overhead: tokens around every message and priming the reply
+MESSAGE_OVERHEAD = 4
+REPLY_OVERHEAD = 3
+
+ANONYMOUS_SESSION = "anonymous"
+
+_current_session = contextvars.ContextVar("usage_session", default=None)
+
+@functools.lru_cache(maxsize=None)
+def get_encoding():
+    """Get the shared tiktoken encoding (None if it cannot be loaded)"""
+    try:
+        return tiktoken.get_encoding(Config.TOKEN_ENCODING)
+    except Exception as e:
+        logger.warning("Estimating token counts, cannot load %s: %s", Config.TOKEN_ENCODING, e)
+        return None
+
+def count_tokens(text):
+    """
+    Count the tokens of a text
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        Token count (estimated from the length if tiktoken is unavailable)
+    """
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def measure_prompt(system_prompt, messages, base_prompt):
+    """
+    Break a prompt down into system prompt, RAG context and history tokens
+
+    Args:
+        system_prompt: Complete system prompt sent
+        messages: Conversation messages sent after the system prompt
+        base_prompt: System prompt without retrieved context
+
+    Returns:
+        Dictionary with "system", "context" and "history" token counts
+    """
+    system_tokens = count_tokens(base_prompt)
+    context_tokens = 0
+    if system_prompt.startswith(base_prompt):
+        context_tokens = count_tokens(system_prompt[len(base_prompt):])
+    else:
+        system_tokens = count_tokens(system_prompt)
+    return {
+        "system": system_tokens + MESSAGE_OVERHEAD,
+        "context": context_tokens,
+        "history": sum(count_tokens(message["content"]) + MESSAGE_OVERHEAD for message in messages),
+    }
+
+@contextlib.contextmanager
+def session_scope(session_id):
+    """
+    Attribute the LLM calls made inside the block to a session
+
+    Args:
+        session_id: Session identifier
+    """
+    token = _current_session.set(session_id)
+    try:
+        yield
+    finally:
+        _current_session.reset(token)
+
+def current_session():
+    """Get the session of the current scope (or None)"""
+    return _current_session.get()
+
+def _empty_totals():
+    return {
+        "calls": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "reasoning_tokens": 0,
+        "system_tokens": 0,
+        "context_tokens": 0,
+        "history_tokens": 0,
+        "max_prompt_tokens": 0,
+        "over_budget": 0,
+        "cost": 0.0,
+    }
+
+class UsageLedger:
+    """Records LLM calls and rolls them up per session and per intent"""
+
+    def __init__(self, prompt_budget=None, prompt_price=0.0, completion_price=0.0,
+                 max_sessions=1000, max_records=200):
+        """
+        Initialize the ledger
+
+        Args:
+            prompt_budget: Prompt tokens per call above which a warning is logged
+            prompt_price: USD per million prompt tokens
+            completion_price: USD per million completion tokens
+            max_sessions: Number of sessions whose totals are kept (least recent dropped)
+            max_records: Number of recent calls kept
+        """
+        self.prompt_budget = prompt_budget
+        self.prompt_price = prompt_price
+        self.completion_price = completion_price
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._intents = {}
+        self._records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    def record(self, breakdown, completion_text="", reasoning_text="", provider_usage=None,
+               intent=None, session_id=None, model=None):
+        """
+        Record one LLM call
+
+        Args:
+            breakdown: Prompt breakdown from measure_prompt()
+            completion_text: Answer text received (for local measurement)
+            reasoning_text: Reasoning text received (for local measurement)
+            provider_usage: The response's usage block, if the provider sent one
+            intent: Intent of the turn, e.g. "disease" or "diagnosis"
+            session_id: Session of the call (default: the current session scope)
+            model: Model name
+
+        Returns:
+            The recorded call as a dictionary
+        """
+        session_id = session_id or current_session() or ANONYMOUS_SESSION
+        reasoning_tokens = count_tokens(reasoning_text)
+        entry = {
+            "session_id": session_id,
+            "intent": intent or "unknown",
+            "model": model,
+            "source": "local",
+            "prompt_tokens": sum(breakdown.values()) + REPLY_OVERHEAD,
+            "completion_tokens": count_tokens(completion_text) + reasoning_tokens,
+            "reasoning_tokens": reasoning_tokens,
+            "breakdown": dict(breakdown),
+            "cost": None,
+        }
+        if provider_usage is not None and getattr(provider_usage, "prompt_tokens", None):
+            entry["source"] = "provider"
+            entry["prompt_tokens"] = provider_usage.prompt_tokens
+            entry["completion_tokens"] = provider_usage.completion_tokens or 0
+            details = getattr(provider_usage, "completion_tokens_details", None)
+            if getattr(details, "reasoning_tokens", None) is not None:
+                entry["reasoning_tokens"] = details.reasoning_tokens
+            entry["cost"] = getattr(provider_usage, "cost", None)
+        if entry["cost"] is None:
+            entry["cost"] = (entry["prompt_tokens"] * self.prompt_price
+                             + entry["completion_tokens"] * self.completion_price) / 1e6
+        entry["over_budget"] = bool(self.prompt_budget) and entry["prompt_tokens"] > self.prompt_budget
+
+        if entry["over_budget"]:
+            logger.warning(
+                "Session %s sent a %d-token prompt, over the budget of %d "
+                "(system %d, context %d, history %d)",
+                session_id, entry["prompt_tokens"], self.prompt_budget,
+                breakdown["system"], breakdown["context"], breakdown["history"]
+            )
+            PROMPT_BUDGET_EXCEEDED.inc(intent=entry["intent"])
+        for part, tokens in breakdown.items():
+            PROMPT_TOKENS.observe(tokens, part=part)
+        LLM_TOKENS.inc(entry["prompt_tokens"], direction="prompt")
+        LLM_TOKENS.inc(entry["completion_tokens"], direction="completion")
+        LLM_TOKENS.inc(entry["reasoning_tokens"], direction="reasoning")
+
+        with self._lock:
+            self._records.append(entry)
+            session_totals = self._sessions.pop(session_id, None) or _empty_totals()
+            self._sessions[session_id] = session_totals
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            for totals in (session_totals, self._intents.setdefault(entry["intent"], _empty_totals())):
+                totals["calls"] += 1
+                totals["prompt_tokens"] += entry["prompt_tokens"]
+                totals["completion_tokens"] += entry["completion_tokens"]
+                totals["reasoning_tokens"] += entry["reasoning_tokens"]
+                totals["system_tokens"] += breakdown["system"]
+                totals["context_tokens"] += breakdown["context"]
+                totals["history_tokens"] += breakdown["history"]
+                totals["max_prompt_tokens"] = max(totals["max_prompt_tokens"], entry["prompt_tokens"])
+                totals["over_budget"] += entry["over_budget"]
+                totals["cost"] += entry["cost"]
+        return entry
+
+    def session_totals(self, session_id):
+        """Get the usage totals of a session (None if it made no calls)"""
+        with self._lock:
+            totals = self._sessions.get(session_id)
+            return dict(totals) if totals is not None else None
+
+    def intent_totals(self):
+        """Get the usage totals of every intent"""
+        with self._lock:
+            return {intent: dict(totals) for intent, totals in self._intents.items()}
+
+    def recent(self, limit=None, session_id=None):
+        """
+        Get recently recorded calls, newest first
+
+        Args:
+            limit: Maximum number of calls
+            session_id: Only calls of this session
+
+        Returns:
+            List of call dictionaries
+        """
+        with self._lock:
+            records = [r for r in reversed(self._records) if session_id is None or r["session_id"] == session_id]
+        return records[:limit] if limit else records
+
+@functools.lru_cache(maxsize=None)
+def get_usage_ledger():
+    """Get the process-wide usage ledger"""
+    return UsageLedger(
+        prompt_budget=Config.PROMPT_TOKEN_BUDGET,
+        prompt_price=Config.LLM_PROMPT_PRICE,
+        completion_price=Config.LLM_COMPLETION_PRICE,
+        max_sessions=Config.USAGE_MAX_SESSIONS
+    )
@@ -0,0 +1,320 @@
+"""
+Lightweight in-process tracing
+
+Spans record how long each stage of a turn takes (query routing, Chroma
+embedding and search, image lookup, vision inference, LLM time to first
+token, rendering). Spans nest through a context variable; a span opened
+without a parent starts a new trace. The most recent traces are kept in a
+bounded ring buffer for the debug panel, and finished spans can be appended
+to a file as OTLP/JSON (one export request per line, the format of the
+OpenTelemetry collector's file exporter).
+
+Work handed to another thread keeps its parent span when the function is
+wrapped with Tracer.wrap().
+"""
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+
+from config.settings import Config
+
+logger = logging.getLogger(__name__)
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+class Span:
+    """One timed operation"""
+
+    def __init__(self, trace, name, parent_id=None, attributes=None, start_ns=None):
+        self.trace = trace
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set_attribute(self, key, value):
+        """Attach an attribute to the span"""
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self):
+        """Duration in milliseconds (None while the span is open)"""
+        return (self.end_ns - self.start_ns) / 1e6 if self.end_ns is not None else None
+
+class _NullSpan:
+    """Span returned while tracing is disabled"""
+
+    def set_attribute(self, key, value):
+        pass
+
+class Trace:
+    """Spans of one turn, rooted at the first span opened without a parent"""
+
+    def __init__(self, root_name, attributes):
+        self.trace_id = uuid.uuid4().hex
+        self.root_name = root_name
+        self.attributes = dict(attributes)
+        self.start_ns = time.time_ns()
+        self.finished = False
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def waterfall(self):
+        """
+        Lay the finished spans out for a waterfall chart
+
+        Returns:
+            List of dictionaries with name, depth, offset_ms, duration_ms,
+            error and attributes, in start order
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start_ns)
+        by_id = {span.span_id: span for span in spans}
+
+        def depth(span):
+            level = 0
+            while span.parent_id in by_id:
+                span = by_id[span.parent_id]
+                level += 1
+            return level
+
+        origin = spans[0].start_ns if spans else self.start_ns
+        return [
+            {
+                "name": span.name,
+                "depth": depth(span),
+                "offset_ms": (span.start_ns - origin) / 1e6,
+                "duration_ms": span.duration_ms,
+                "error": span.error,
+                "attributes": span.attributes,
+            }
+            for span in spans
+        ]
+
+class Tracer:
+    """Creates spans and keeps the most recent traces"""
+
+    def __init__(self, max_traces=50, export_path=None, enabled=True, service_name="medical-chatbot"):
+        """
+        Initialize the tracer
+
+        Args:
+            max_traces: Number of recent traces kept in memory
+            export_path: Optional file finished spans are appended to as OTLP/JSON
+            enabled: Whether spans are recorded at all
+            service_name: service.name resource attribute of exported spans
+        """
+        self.enabled = enabled
+        self.export_path = export_path
+        self.service_name = service_name
+        self._traces = deque(maxlen=max_traces)
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+        """
+        Time a block of code as a span
+
+        Args:
+            name: Span name, e.g. "rag.search"
+            attributes: Span attributes; on a root span they also label the trace
+
+        Yields:
+            The span, to attach attributes found while it runs
+        """
+        if not self.enabled:
+            yield _NullSpan()
+            return
+
+        parent = _current_span.get()
+        if parent is None:
+            trace = Trace(name, attributes)
+            with self._lock:
+                self._traces.append(trace)
+        else:
+            trace = parent.trace
+        span = Span(trace, name, parent.span_id if parent is not None else None, attributes)
+
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            self._finish(span, is_root=parent is None)
+
+    def record_span(self, name, start_ns, end_ns, parent=None, error=None, **attributes):
+        """
+        Record a span whose timing was measured by the caller
+
+        Used where a context manager does not fit, e.g. across the yields of
+        a generator.
+
+        Args:
+            name: Span name
+            start_ns: Start time from time.time_ns()
+            end_ns: End time from time.time_ns()
+            parent: Parent span (default: the current span)
+            error: Error message if the operation failed
+            attributes: Span attributes
+        """
+        if not self.enabled:
+            return
+        parent = parent if parent is not None else _current_span.get()
+        if parent is None:
+            trace = Trace(name, attributes)
+            with self._lock:
+                self._traces.append(trace)
+        else:
+            trace = parent.trace
+        span = Span(trace, name, getattr(parent, "span_id", None), attributes, start_ns=start_ns)
+        span.end_ns = end_ns
+        span.error = error
+        self._finish(span, is_root=parent is None)
+
+    def current_span(self):
+        """Get the innermost open span of this context (or None)"""
+        return _current_span.get()
+
+    def wrap(self, fn):
+        """
+        Bind a function to the current span, for running it on another thread
+
+        Args:
+            fn: Function to wrap
+
+        Returns:
+            Function whose spans are children of the span current now
+        """
+        parent = _current_span.get()
+
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            token = _current_span.set(parent)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _current_span.reset(token)
+        return run
+
+    def recent(self, limit=None, **attributes):
+        """
+        Get recent traces, newest first
+
+        Args:
+            limit: Maximum number of traces
+            attributes: Only traces whose root has these attribute values
+
+        Returns:
+            List of Trace objects
+        """
+        with self._lock:
+            traces = list(reversed(self._traces))
+        traces = [
+            trace for trace in traces
+            if all(trace.attributes.get(key) == value for key, value in attributes.items())
+        ]
+        return traces[:limit] if limit else traces
+
+    def last_trace(self, **attributes):
+        """Get the newest trace whose root has the given attribute values (or None)"""
+        traces = self.recent(limit=1, **attributes)
+        return traces[0] if traces else None
+
+    def _finish(self, span, is_root):
+        if span.end_ns is None:
+            span.end_ns = time.time_ns()
+        trace = span.trace
+        trace.add(span)
+        if is_root:
+            trace.finished = True
+            self._export(list(trace.spans))
+        elif trace.finished:
+            # Background work that outlived its root span
+            self._export([span])
+
+    def _export(self, spans):
+        """Append spans to the export file as one OTLP/JSON request"""
+        if not self.export_path or not spans:
+            return
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes({"service.name": self.service_name})},
+                "scopeSpans": [{
+                    "scope": {"name": __name__},
+                    "spans": [_otlp_span(span) for span in spans],
+                }],
+            }]
+        }
+        try:
+            with self._export_lock, open(self.export_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(payload, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.error("Error exporting spans to %s: %s", self.export_path, e)
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def _otlp_attributes(attributes):
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+def _otlp_span(span):
+    data = {
+        "traceId": span.trace.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": 1,  # SPAN_KIND_INTERNAL
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": _otlp_attributes(span.attributes),
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+    }
+    if span.parent_id:
+        data["parentSpanId"] = span.parent_id
+    return data
+
+@functools.lru_cache(maxsize=None)
+def get_tracer():
+    """Get the process-wide tracer"""
+    return Tracer(
+        max_traces=Config.TRACE_BUFFER_SIZE,
+        export_path=Config.TRACE_EXPORT_PATH or None,
+        enabled=Config.TRACING_ENABLED
+    )
+
+def traced(name):
+    """
+    Decorator that runs a function inside a span
+
+    Args:
+        name: Span name
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with get_tracer().span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator